@@ -1,6 +1,17 @@
-from . import speech_analysis
-from . import SpeechAnalysisObject
-from .speech_analysis import analyze_emotion, analyze_sentiment, analyze_monotone_speech, analyze_speech_rate, evaluate_pronunciation_clarity, detect_filler_words, detect_pauses, extract_keywords, grammar_correction, transcribe_speech
+# Submodules load on first access, so importing scripts.live_pipeline or
+# scripts.llm_client does not pull in torch, transformers and librosa
+_SPEECH_ANALYSIS_EXPORTS = {"analyze_emotion", "analyze_sentiment", "analyze_monotone_speech", "analyze_speech_rate",
+                            "evaluate_pronunciation_clarity", "detect_filler_words", "detect_pauses", "extract_keywords",
+                            "grammar_correction", "transcribe_speech"}
 
 __all__ = ["speech_analysis", "SpeechAnalysisObject", "analyze_emotion", "analyze_sentiment", "analyze_monotone_speech", "analyze_speech_rate",
            "evaluate_pronunciation_clarity", "detect_filler_words", "detect_pauses", "extract_keywords", "grammar_correction", "transcribe_speech", ]
+
+
+def __getattr__(name):
+    from .plugins import load
+    if name in ("speech_analysis", "SpeechAnalysisObject"):
+        return load(f"{__name__}.{name}")
+    if name in _SPEECH_ANALYSIS_EXPORTS:
+        return getattr(load(f"{__name__}.speech_analysis"), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,324 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+import collections
+import multiprocessing
+import concurrent.futures
+from typing import Any, Callable, Deque, Dict, Optional
+
+from scripts.live_pipeline.cancellation import AnalysisCancelled
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Scheduler configuration
+LIVE_ANALYSIS_WORKERS = int(os.getenv("LIVE_ANALYSIS_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+BASE_FEEDBACK_INTERVAL = 10.0   # seconds between analyses for an unloaded server
+MAX_FEEDBACK_INTERVAL = 30.0    # never sample a session less often than this
+ANALYSIS_TIMEOUT = 5.0          # per-analysis budget used by periodic_feedback
+LATENCY_SMOOTHING = 0.2         # EWMA weight for new latency samples
+
+
+def _preload_worker_models():
+    """Process-pool initializer: load the face/audio/ASR/LLM stack once per worker"""
+    try:
+        from scripts.live_pipeline import face_analysis, audio_analysis, live_gemini, streaming_asr  # noqa: F401
+        face_analysis.warm_up()
+        streaming_asr.load_model()
+        logger.info(f"Live analysis worker {os.getpid()} preloaded models")
+    except Exception as e:
+        # A worker without warm models is still usable, it just pays the load on first job
+        logger.error(f"Failed to preload models in worker {os.getpid()}: {e}")
+
+
+class _Job:
+    """A single unit of work waiting for a worker slot"""
+
+    __slots__ = ("session_id", "kind", "fn", "args", "future", "submitted_at", "deadline")
+
+    def __init__(self, session_id: str, kind: str, fn: Callable, args: tuple, future: asyncio.Future,
+                 deadline: Optional[float] = None):
+        self.session_id = session_id
+        self.kind = kind
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.submitted_at = time.monotonic()
+        # Wall clock so that worker processes can compare against it
+        self.deadline = deadline
+
+
+class LiveAnalysisScheduler:
+    """
+    Schedules live analyses onto a dedicated process pool.
+
+    Every session has a queue depth of one per kind of job (e.g. face, audio):
+    submitting while a job of that kind is still waiting replaces it, so a slow
+    session never builds a backlog of stale frames. Waiting sessions are served
+    round-robin, one job per turn, and there is exactly one
+    dispatcher per worker process so the pool never holds a hidden queue of its own.
+    Under load the recommended sampling interval is stretched before analyses start
+    missing their timeout.
+
+    Jobs carry a deadline. Stale jobs are dropped before they reach a worker, and
+    running jobs receive the deadline as a keyword argument so they can stop at the
+    next stage boundary. Everything thrown away this way is counted in "abandoned".
+    """
+
+    def __init__(self, max_workers: int = LIVE_ANALYSIS_WORKERS,
+                 base_interval: float = BASE_FEEDBACK_INTERVAL,
+                 max_interval: float = MAX_FEEDBACK_INTERVAL,
+                 timeout: float = ANALYSIS_TIMEOUT):
+        self.max_workers = max(1, max_workers)
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+
+        self._executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._pending: Dict[str, Dict[str, _Job]] = {}
+        self._ready: Deque[str] = collections.deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatchers = []
+        self._in_flight = 0
+        self._latency_ewma: Optional[float] = None
+
+        self.metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "superseded": 0,
+            "timed_out": 0,
+        }
+        # Work discarded after a timeout, keyed by where it was stopped
+        self.abandoned = {
+            "queued": 0,     # never reached a worker
+            "decode": 0,     # stopped by the worker at a stage boundary
+            "face": 0,
+            "audio": 0,
+            "llm": 0,
+            "asr": 0,
+            "overrun": 0,    # finished, but after the caller had given up
+        }
+        self.abandoned_seconds = 0.0
+
+    # -------------------
+    # Lifecycle
+    # -------------------
+    def _ensure_started(self):
+        """Create the process pool and dispatchers on first use"""
+        if self._executor is not None:
+            return
+        # spawn keeps dlib/TensorFlow state out of the parent's forked threads
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_preload_worker_models,
+        )
+        self._wakeup = asyncio.Event()
+        self._dispatchers = [
+            asyncio.create_task(self._dispatch_loop(i)) for i in range(self.max_workers)
+        ]
+        logger.info(f"Started live analysis scheduler with {self.max_workers} workers")
+
+    async def warm_up(self):
+        """Start the pool and let the workers load their models before the first session arrives"""
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, os.getpid) for _ in range(self.max_workers)))
+
+    async def shutdown(self):
+        """Cancel dispatchers, fail waiting jobs and stop the pool"""
+        for task in self._dispatchers:
+            task.cancel()
+        for task in self._dispatchers:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._dispatchers = []
+
+        for jobs in self._pending.values():
+            for job in jobs.values():
+                if not job.future.done():
+                    job.future.cancel()
+        self._pending.clear()
+        self._ready.clear()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info("Live analysis scheduler stopped")
+
+    # -------------------
+    # Submission
+    # -------------------
+    async def submit(self, session_id: str, fn: Callable, *args, timeout: Optional[float] = None,
+                     kind: str = "analysis") -> Any:
+        """
+        Run fn(*args, deadline=...) in the process pool on behalf of a session.
+
+        Returns the function result, or None if a newer submission of the same
+        kind for the same session replaced this one before it reached a worker.
+        Raises asyncio.TimeoutError once timeout seconds have passed.
+        """
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        deadline = time.time() + timeout if timeout is not None else None
+        job = _Job(session_id, kind, fn, args, loop.create_future(), deadline)
+        self.metrics["submitted"] += 1
+
+        jobs = self._pending.get(session_id)
+        if not jobs:
+            jobs = self._pending[session_id] = {}
+            if session_id not in self._ready:
+                self._ready.append(session_id)
+        previous = jobs.pop(kind, None)
+        if previous is not None and not previous.future.done():
+            # Queue depth of one: the newest frame wins
+            previous.future.set_result(None)
+            self.metrics["superseded"] += 1
+        jobs[kind] = job
+        self._wakeup.set()
+
+        try:
+            return await asyncio.wait_for(job.future, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # Caller gave up; drop the job if it never started, otherwise the
+            # worker sees the expired deadline at its next stage boundary
+            if self._discard(job):
+                self.abandoned["queued"] += 1
+            if isinstance(e, asyncio.TimeoutError):
+                self.metrics["timed_out"] += 1
+            raise
+
+    def release(self, session_id: str):
+        """Forget a session's waiting jobs when the session ends"""
+        for job in self._pending.pop(session_id, {}).values():
+            if not job.future.done():
+                job.future.set_result(None)
+
+    def _discard(self, job: _Job) -> bool:
+        """Remove a job that has not started yet; returns False if it already left the queue"""
+        jobs = self._pending.get(job.session_id)
+        if not jobs or jobs.get(job.kind) is not job:
+            return False
+        del jobs[job.kind]
+        if not jobs:
+            del self._pending[job.session_id]
+        return True
+
+    def _next_job(self) -> Optional[_Job]:
+        """Pop the next waiting job in round-robin order across sessions"""
+        while self._ready:
+            session_id = self._ready.popleft()
+            jobs = self._pending.get(session_id)
+            if not jobs:
+                self._pending.pop(session_id, None)
+                continue
+            # Oldest kind first; the session goes to the back of the line if it has more
+            job = jobs.pop(next(iter(jobs)))
+            if jobs:
+                self._ready.append(session_id)
+            else:
+                del self._pending[session_id]
+            if job.future.done():
+                continue
+            if job.deadline is not None and time.time() >= job.deadline:
+                # Stale before it could start; nobody will use the result
+                self.abandoned["queued"] += 1
+                job.future.set_exception(asyncio.TimeoutError())
+                continue
+            return job
+        return None
+
+    async def _dispatch_loop(self, worker_index: int):
+        """One dispatcher per worker slot: take the next job and run it to completion"""
+        loop = asyncio.get_running_loop()
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            self._in_flight += 1
+            started = time.monotonic()
+            call = functools.partial(job.fn, *job.args, deadline=job.deadline)
+            try:
+                result = await loop.run_in_executor(self._executor, call)
+                self.metrics["completed"] += 1
+                if job.future.done():
+                    self.abandoned["overrun"] += 1
+                    self.abandoned_seconds += time.monotonic() - started
+                else:
+                    job.future.set_result(result)
+            except asyncio.CancelledError:
+                raise
+            except AnalysisCancelled as e:
+                self.abandoned[e.stage] = self.abandoned.get(e.stage, 0) + 1
+                self.abandoned_seconds += time.monotonic() - started
+                if not job.future.done():
+                    job.future.set_exception(asyncio.TimeoutError())
+            except Exception as e:
+                self.metrics["failed"] += 1
+                logger.error(f"Live analysis failed for session {job.session_id}: {e}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._in_flight -= 1
+                self._record_latency(time.monotonic() - job.submitted_at)
+                logger.debug(f"Worker {worker_index} ran job for session {job.session_id} "
+                             f"in {time.monotonic() - started:.2f}s")
+
+    # -------------------
+    # Admission control
+    # -------------------
+    def _record_latency(self, seconds: float):
+        """Track queue + run time of completed jobs as an EWMA"""
+        if self._latency_ewma is None:
+            self._latency_ewma = seconds
+        else:
+            self._latency_ewma += LATENCY_SMOOTHING * (seconds - self._latency_ewma)
+
+    def load_factor(self) -> float:
+        """How far past its comfortable operating point the pool is (1.0 = at capacity)"""
+        waiting = sum(len(jobs) for jobs in self._pending.values())
+        backlog = (self._in_flight + waiting) / self.max_workers
+        latency = (self._latency_ewma or 0.0) / (0.6 * self.timeout)
+        return max(backlog, latency)
+
+    def next_interval(self, session_id: str) -> float:
+        """
+        Recommended delay before a session's next analysis.
+
+        Sampling is stretched in proportion to the load factor, so sessions get
+        fewer updates instead of timed-out ones once the pool saturates.
+        """
+        load = self.load_factor()
+        if load <= 1.0:
+            return self.base_interval
+        return min(self.max_interval, self.base_interval * load)
+
+    def stats(self) -> dict:
+        """Snapshot of scheduler state for the metrics endpoint"""
+        return {
+            **self.metrics,
+            "abandoned": dict(self.abandoned),
+            "abandoned_seconds": round(self.abandoned_seconds, 3),
+            "workers": self.max_workers,
+            "in_flight": self._in_flight,
+            "waiting_sessions": len(self._pending),
+            "latency_ewma": round(self._latency_ewma, 3) if self._latency_ewma is not None else None,
+            "load_factor": round(self.load_factor(), 3),
+        }
+
+
+# Create global instance
+scheduler = LiveAnalysisScheduler()
+
+
+def warm_up():
+    """Plugin warm-up hook for the live feature"""
+    return scheduler.warm_up()
@@ -0,0 +1,236 @@
+import re
+import base64
+import asyncio
+import logging
+import threading
+import numpy as np
+
+from scripts.live_pipeline.vad import StreamingVAD
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+RING_SECONDS = 30            # audio history kept per session
+INPUT_GAIN = 5.0             # same boost record_audio applies to microphone input
+MAX_PENDING_CHUNKS = 8       # encoded blobs waiting for ffmpeg before we start dropping
+READ_SIZE = 4096 * 4         # bytes per stdout read (4096 float32 samples)
+
+# EBML magic that starts every webm/matroska stream
+WEBM_HEADER = b"\x1a\x45\xdf\xa3"
+
+# ffmpeg demuxer for the MIME types the frontend MediaRecorder may pick
+DEMUXERS = {
+    "audio/webm": "matroska",
+    "audio/ogg": "ogg",
+}
+
+
+class AudioRingBuffer:
+    """Fixed-size float32 ring buffer of mono PCM samples"""
+
+    def __init__(self, seconds: float = RING_SECONDS, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.capacity = int(seconds * sample_rate)
+        self._buffer = np.zeros(self.capacity, dtype=np.float32)
+        self._lock = threading.Lock()
+        # Total samples ever written; doubles as the stream clock
+        self.total_written = 0
+
+    def write(self, samples: np.ndarray):
+        """Append samples, overwriting the oldest ones when full"""
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        if samples.size == 0:
+            return
+        if samples.size > self.capacity:
+            samples = samples[-self.capacity:]
+        with self._lock:
+            start = self.total_written % self.capacity
+            end = start + samples.size
+            if end <= self.capacity:
+                self._buffer[start:end] = samples
+            else:
+                split = self.capacity - start
+                self._buffer[start:] = samples[:split]
+                self._buffer[:end - self.capacity] = samples[split:]
+            self.total_written += samples.size
+
+    def read_last(self, seconds: float) -> np.ndarray:
+        """Copy of the most recent audio, up to the requested duration"""
+        with self._lock:
+            count = min(int(seconds * self.sample_rate), self.total_written, self.capacity)
+            if count == 0:
+                return np.zeros(0, dtype=np.float32)
+            end = self.total_written % self.capacity
+            start = end - count
+            if start >= 0:
+                return self._buffer[start:end].copy()
+            return np.concatenate((self._buffer[start:], self._buffer[:end]))
+
+    def read_range(self, start: float, end: float) -> np.ndarray:
+        """Copy of the audio between two stream-clock times, clipped to what is still held"""
+        with self._lock:
+            oldest = max(0, self.total_written - self.capacity)
+            first = max(int(start * self.sample_rate), oldest)
+            last = min(int(end * self.sample_rate), self.total_written)
+            if last <= first:
+                return np.zeros(0, dtype=np.float32)
+            first_idx = first % self.capacity
+            last_idx = first_idx + (last - first)
+            if last_idx <= self.capacity:
+                return self._buffer[first_idx:last_idx].copy()
+            return np.concatenate((self._buffer[first_idx:], self._buffer[:last_idx - self.capacity]))
+
+    @property
+    def seconds_available(self) -> float:
+        return min(self.total_written, self.capacity) / self.sample_rate
+
+
+def decode_data_url(data):
+    """Split a data:audio/...;base64 URL into (mime type, raw bytes)"""
+    if isinstance(data, (bytes, bytearray)):
+        return None, bytes(data)
+    match = re.match(r"^data:([^;,]+)[^,]*;base64,", data)
+    if not match:
+        raise ValueError("Audio chunk is not a base64 data URL")
+    return match.group(1), base64.b64decode(data[match.end():])
+
+
+class AudioIngest:
+    """
+    Per-session audio ingest stage.
+
+    Encoded blobs from the browser (a continuous webm/opus MediaRecorder stream)
+    are piped into one long-lived ffmpeg process, which writes 16 kHz mono float32
+    PCM into a ring buffer. feed() only enqueues, and latest() only copies from the
+    ring buffer, so neither ever blocks the WebSocket receive loop or an analysis.
+    Decoded samples also pass through a streaming VAD as they arrive, so speaking
+    ratio and pauses are always current without re-analysing the buffer.
+    """
+
+    def __init__(self, session_id: str, seconds: float = RING_SECONDS):
+        self.session_id = session_id
+        self.ring = AudioRingBuffer(seconds)
+        self.vad = StreamingVAD(SAMPLE_RATE)
+        self._process = None
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDING_CHUNKS)
+        self._writer_task = None
+        self._reader_task = None
+        self._mime_type = None
+        self.available = True
+        self.dropped_chunks = 0
+
+    async def _start_decoder(self, mime_type):
+        """Launch ffmpeg reading the encoded stream on stdin and writing PCM to stdout"""
+        await self._stop_decoder()
+        args = ["ffmpeg", "-hide_banner", "-loglevel", "error",
+                "-fflags", "nobuffer", "-probesize", "4096", "-analyzeduration", "0"]
+        demuxer = DEMUXERS.get(mime_type)
+        if demuxer:
+            args += ["-f", demuxer]
+        args += ["-i", "pipe:0", "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"]
+        try:
+            self._process = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            logger.error("ffmpeg not found; live audio analysis is disabled")
+            self.available = False
+            return
+        self._mime_type = mime_type
+        self._reader_task = asyncio.create_task(self._read_loop(self._process))
+        logger.info(f"Started audio decoder for session {self.session_id} ({mime_type})")
+
+    async def _stop_decoder(self):
+        """Close ffmpeg's stdin and wait for it to flush its last samples"""
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            if process.stdin and not process.stdin.is_closing():
+                process.stdin.close()
+            await asyncio.wait_for(process.wait(), timeout=2)
+        except (asyncio.TimeoutError, ProcessLookupError):
+            process.kill()
+        if self._reader_task:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+            self._reader_task = None
+
+    async def _read_loop(self, process):
+        """Move decoded PCM from ffmpeg's stdout into the ring buffer"""
+        remainder = b""
+        while True:
+            chunk = await process.stdout.read(READ_SIZE)
+            if not chunk:
+                break
+            chunk = remainder + chunk
+            usable = len(chunk) - len(chunk) % 4
+            remainder = chunk[usable:]
+            samples = np.frombuffer(chunk[:usable], dtype=np.float32)
+            self.ring.write(samples)
+            try:
+                self.vad.process(samples)
+            except Exception as e:
+                logger.warning(f"VAD failed for session {self.session_id}: {e}")
+
+    async def _write_loop(self):
+        """Feed queued blobs to ffmpeg, restarting it when a new stream begins"""
+        while True:
+            mime_type, data = await self._queue.get()
+            try:
+                new_stream = data.startswith(WEBM_HEADER) and self._process is not None
+                exited = self._process is not None and self._process.returncode is not None
+                if self._process is None or new_stream or exited or mime_type != self._mime_type:
+                    await self._start_decoder(mime_type)
+                if self._process is None:
+                    continue
+                self._process.stdin.write(data)
+                await self._process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError) as e:
+                logger.warning(f"Audio decoder for session {self.session_id} closed its input: {e}")
+                await self._stop_decoder()
+            except Exception as e:
+                logger.error(f"Error decoding audio for session {self.session_id}: {e}")
+
+    def feed(self, data):
+        """Queue an encoded chunk (data URL or bytes) for decoding without waiting"""
+        if not self.available:
+            return
+        try:
+            mime_type, payload = decode_data_url(data)
+        except Exception as e:
+            logger.warning(f"Ignoring audio chunk for session {self.session_id}: {e}")
+            return
+        # Strip codec parameters, e.g. "audio/webm;codecs=opus"
+        mime_type = (mime_type or self._mime_type or "audio/webm").split(";")[0]
+        if self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._write_loop())
+        try:
+            self._queue.put_nowait((mime_type, payload))
+        except asyncio.QueueFull:
+            # ffmpeg is behind; dropping a chunk costs a gap, blocking would cost the session
+            self.dropped_chunks += 1
+            logger.warning(f"Audio decoder backlog for session {self.session_id}, dropped a chunk")
+
+    def latest(self, seconds: float, gain: float = INPUT_GAIN):
+        """The last `seconds` of decoded audio, or None if nothing has been decoded yet"""
+        audio = self.ring.read_last(seconds)
+        if audio.size == 0:
+            return None
+        if gain != 1.0:
+            audio = np.clip(audio * gain, -1.0, 1.0)
+        return audio
+
+    def activity(self, seconds: float) -> dict:
+        """Speaking ratio and pauses over the last `seconds` of decoded audio"""
+        return self.vad.activity(seconds)
+
+    async def close(self):
+        """Stop the writer and the decoder process"""
+        if self._writer_task:
+            self._writer_task.cancel()
+            await asyncio.gather(self._writer_task, return_exceptions=True)
+            self._writer_task = None
+        await self._stop_decoder()
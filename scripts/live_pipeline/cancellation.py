@@ -0,0 +1,15 @@
+import time
+
+
+class AnalysisCancelled(Exception):
+    """Raised between stages when an analysis has outlived its deadline"""
+
+    def __init__(self, stage):
+        super().__init__(stage)
+        self.stage = stage
+
+
+def check_deadline(deadline, stage):
+    """Abort before starting a stage if the caller has already given up on the result"""
+    if deadline is not None and time.time() >= deadline:
+        raise AnalysisCancelled(stage)
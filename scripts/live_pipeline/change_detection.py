@@ -0,0 +1,188 @@
+import re
+import time
+import base64
+import logging
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Cadence configuration
+CHECK_INTERVAL = 2.5          # seconds between cheap change checks
+MIN_FEEDBACK_INTERVAL = 5.0   # never run full analyses closer together than this
+BASE_FEEDBACK_INTERVAL = 10.0
+MAX_STATIC_INTERVAL = 30.0    # a static scene is still re-analysed this often
+STATIC_BACKOFF = 1.5          # interval growth after each analysis of an unchanged scene
+
+# A signal at its threshold scores 1.0; any signal reaching 1.0 triggers an analysis
+FRAME_DIFF_THRESHOLD = 0.08   # mean absolute thumbnail difference (0-1)
+AUDIO_DELTA_THRESHOLD = 6.0   # dB change in short-term level
+SPEECH_DELTA_THRESHOLD = 0.5  # change in speaking ratio (started/stopped talking)
+FACE_MOVE_THRESHOLD = 0.15    # face centre shift as a fraction of frame width
+
+THUMBNAIL_SIZE = (64, 48)
+SILENCE_DBFS = -100.0
+
+_face_cascade = None
+
+
+def _get_face_cascade():
+    global _face_cascade
+    if _face_cascade is None:
+        _face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    return _face_cascade
+
+
+def decode_reduced_gray(frame) -> Optional[np.ndarray]:
+    """Decode a data:image frame at quarter resolution in grayscale (much cheaper than a full decode)"""
+    if not isinstance(frame, str) or not frame.startswith('data:image'):
+        return None
+    try:
+        img_data = base64.b64decode(re.sub('^data:image/.+;base64,', '', frame))
+        return cv2.imdecode(np.frombuffer(img_data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    except Exception as e:
+        logger.debug(f"Could not decode frame for change detection: {e}")
+        return None
+
+
+def find_face(gray: np.ndarray) -> Optional[Tuple[float, float, float]]:
+    """Largest face as (centre x, centre y, width), normalized to the image size"""
+    faces = _get_face_cascade().detectMultiScale(gray, 1.2, 4, minSize=(20, 20))
+    if len(faces) == 0:
+        return None
+    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+    height, width = gray.shape[:2]
+    return (x + w / 2) / width, (y + h / 2) / height, w / width
+
+
+@dataclass
+class Snapshot:
+    """Cheap description of the scene at one point in time"""
+    thumbnail: Optional[np.ndarray] = None
+    face: Optional[Tuple[float, float, float]] = None
+    level_dbfs: float = SILENCE_DBFS
+    speech_ratio: float = 0.0
+
+
+@dataclass
+class ChangeSignals:
+    frame_diff: float = 0.0
+    audio_delta: float = 0.0
+    speech_delta: float = 0.0
+    face_move: float = 0.0
+    score: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return {k: round(v, 3) for k, v in asdict(self).items()}
+
+
+def take_snapshot(frame, ingest=None, speech_ratio: float = 0.0) -> Snapshot:
+    """
+    Reduced frame, face box and short-term audio level of the session right now.
+
+    Safe to run in a worker thread: the audio ring is locked, while the speech
+    ratio comes from VAD state the event loop mutates, so the caller computes it
+    on the loop and passes it in.
+    """
+    snapshot = Snapshot(speech_ratio=speech_ratio)
+    gray = decode_reduced_gray(frame)
+    if gray is not None and gray.size:
+        snapshot.thumbnail = cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+        snapshot.face = find_face(gray)
+    if ingest is not None:
+        recent = ingest.ring.read_last(1.0)
+        if recent.size:
+            rms = float(np.sqrt(np.mean(np.square(recent, dtype=np.float64))))
+            snapshot.level_dbfs = max(SILENCE_DBFS, 20.0 * np.log10(max(rms, 1e-10)))
+    return snapshot
+
+
+def compare(previous: Optional[Snapshot], current: Snapshot) -> ChangeSignals:
+    """Score how far the scene has moved from the previous snapshot"""
+    if previous is None:
+        return ChangeSignals(score=float("inf"))
+    signals = ChangeSignals()
+    if previous.thumbnail is not None and current.thumbnail is not None:
+        signals.frame_diff = float(np.mean(np.abs(current.thumbnail - previous.thumbnail)))
+    signals.audio_delta = abs(current.level_dbfs - previous.level_dbfs)
+    signals.speech_delta = abs(current.speech_ratio - previous.speech_ratio)
+    if (previous.face is None) != (current.face is None):
+        # Face appeared or left the frame
+        signals.face_move = FACE_MOVE_THRESHOLD
+    elif previous.face is not None:
+        (px, py, pw), (cx, cy, cw) = previous.face, current.face
+        signals.face_move = max(float(np.hypot(cx - px, cy - py)), abs(cw - pw))
+    signals.score = max(
+        signals.frame_diff / FRAME_DIFF_THRESHOLD,
+        signals.audio_delta / AUDIO_DELTA_THRESHOLD,
+        signals.speech_delta / SPEECH_DELTA_THRESHOLD,
+        signals.face_move / FACE_MOVE_THRESHOLD,
+    )
+    return signals
+
+
+class AdaptiveCadence:
+    """
+    Decides, every CHECK_INTERVAL, whether a session needs a full analysis.
+
+    The scene is compared with the snapshot taken at the last full analysis, so
+    slow drift adds up. A significant change triggers an analysis as soon as
+    MIN_FEEDBACK_INTERVAL allows. While nothing changes the interval grows by
+    STATIC_BACKOFF per analysis up to MAX_STATIC_INTERVAL, and it drops back to
+    the minimum when an analysis reports different results from the previous one.
+    """
+
+    def __init__(self, base_interval: float = BASE_FEEDBACK_INTERVAL):
+        self.base_interval = base_interval
+        self.interval = base_interval
+        self._baseline: Optional[Snapshot] = None
+        self._last_analysis = 0.0
+        self._last_result: Optional[Tuple] = None
+        self.last_signals = ChangeSignals()
+        self.metrics = {
+            "checks": 0,
+            "analyses": 0,
+            "skipped": 0,
+            "triggered_by_change": 0,
+            "triggered_by_timer": 0,
+        }
+
+    def should_analyze(self, snapshot: Snapshot, min_interval: float = MIN_FEEDBACK_INTERVAL) -> bool:
+        """Whether to run a full analysis now; min_interval can be raised by the scheduler under load"""
+        self.metrics["checks"] += 1
+        self.last_signals = compare(self._baseline, snapshot)
+        elapsed = time.monotonic() - self._last_analysis
+        changed = self.last_signals.score >= 1.0
+
+        if elapsed >= max(min_interval, MIN_FEEDBACK_INTERVAL) and changed:
+            self.metrics["triggered_by_change"] += 1
+            self.interval = self.base_interval
+        elif elapsed >= max(min_interval, self.interval):
+            self.metrics["triggered_by_timer"] += 1
+            # Nothing moved since the last analysis; look less often
+            self.interval = min(MAX_STATIC_INTERVAL, self.interval * STATIC_BACKOFF)
+        else:
+            self.metrics["skipped"] += 1
+            return False
+
+        self.metrics["analyses"] += 1
+        self._baseline = snapshot
+        self._last_analysis = time.monotonic()
+        return True
+
+    def on_result(self, result: Dict):
+        """Tighten the cadence when the analysis outcome shifted"""
+        outcome = tuple(result.get(k) for k in ("emotion", "eye_contact", "posture", "audio_quality"))
+        if self._last_result is not None and outcome != self._last_result:
+            self.interval = MIN_FEEDBACK_INTERVAL
+        self._last_result = outcome
+
+    def stats(self) -> Dict:
+        return {
+            **self.metrics,
+            "interval": round(self.interval, 1),
+            "signals": self.last_signals.to_dict() if self.last_signals.score != float("inf") else None,
+        }
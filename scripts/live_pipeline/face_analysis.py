@@ -26,6 +26,13 @@ except Exception as e:
     logger.error(f"Error loading shape predictor: {e}")
     predictor = None
 
+def warm_up():
+    """Run the detectors once on a blank frame so DeepFace builds its emotion model up front"""
+    blank = np.zeros((224, 224, 3), dtype=np.uint8)
+    detect_emotion(blank)
+    detector(cv2.cvtColor(blank, cv2.COLOR_BGR2GRAY), 0)
+    logger.info("[FACE] Models warmed up")
+
 def analyze_face(frame):
     # Check if frame is valid
     if frame is None or not isinstance(frame, np.ndarray) or frame.size == 0:
@@ -0,0 +1,363 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+import collections
+import concurrent.futures
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from scripts.llm_client import llm_client
+from scripts.live_pipeline.audio_analysis import AudioMetrics
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Service configuration
+FEEDBACK_CACHE_TTL = float(os.getenv("LIVE_FEEDBACK_CACHE_TTL", "60"))
+FEEDBACK_CACHE_SIZE = 512
+FEEDBACK_MAX_QPS = float(os.getenv("LIVE_FEEDBACK_MAX_QPS", "2"))
+FEEDBACK_BURST = 4
+FEEDBACK_TOKENS_PER_MINUTE = int(os.getenv("LIVE_FEEDBACK_TOKENS_PER_MINUTE", "60000"))
+EXPECTED_RESPONSE_TOKENS = 150
+TRANSCRIPT_WORDS = 25          # only the tail of the transcript goes into the prompt
+LOW_SNR_DB = 10.0              # below this the room counts as noisy
+
+# Voice coaching for each AudioMetrics quality tier
+VOICE_FEEDBACK = {
+    "none": "Speak louder to ensure your audience can hear you clearly.",
+    "low": "Project your voice more to reach the back of the room.",
+    "good": "Good volume. Maintain this level of projection.",
+    "excellent": "Excellent voice projection. Your audience can hear you clearly.",
+    "too_loud": "Ease off the volume slightly so your voice stays comfortable to hear.",
+}
+DEFAULT_VOICE_FEEDBACK = "Speak clearly with varied tone and appropriate volume."
+
+EXPRESSION_FEEDBACK = {
+    "happy": "Your smile projects confidence and warmth. Maintain this positive energy.",
+    "sad": "Your expression appears downcast. Lift your face and try to project more enthusiasm.",
+    "angry": "Your expression appears tense. Relax your facial muscles and soften your look.",
+    "fear": "You appear nervous. Take a deep breath and relax your facial muscles.",
+    "surprise": "Your surprised expression shows engagement. Use this to emphasize key points.",
+    "disgust": "Your expression may appear negative. Aim for a more neutral or positive look.",
+}
+EYE_CONTACT_FEEDBACK = {
+    "yes": "Excellent eye contact! You're connecting well with your audience.",
+    "limited": "Try looking directly at the camera lens more consistently. Position yourself so your eyes are level with the camera.",
+}
+POSTURE_FEEDBACK = {
+    "good": "Your posture is excellent. You appear confident and engaged.",
+    "poor": "Stand taller with shoulders back and chin up to project confidence.",
+}
+
+
+def normalize_transcript(transcript: Optional[str]) -> str:
+    """Lowercase, strip punctuation and keep the last few words"""
+    words = re.sub(r"[^a-z0-9' ]+", " ", (transcript or "").lower()).split()
+    return " ".join(words[-TRANSCRIPT_WORDS:])
+
+
+@dataclass(frozen=True)
+class FeedbackRequest:
+    """
+    Normalized inputs of one coaching request.
+
+    Continuous measurements are bucketed so that near-identical ticks share a
+    signature. The transcript tail changes on every speaking tick, so it is
+    prompt context only and not part of the signature: a cached response built
+    with a slightly older transcript is reused for the rest of its TTL.
+    """
+    emotion: str
+    eye_contact: str
+    posture: str
+    audio_quality: Optional[str] = None
+    speech_share: float = 0.0      # speech ratio rounded to quarters
+    noisy: bool = False
+    transcript: str = field(default="", compare=False)   # excluded from equality and hash
+
+    @classmethod
+    def from_inputs(cls, emotion, eye_contact, posture, audio: Optional[AudioMetrics] = None,
+                    transcript: str = "") -> "FeedbackRequest":
+        return cls(
+            emotion=emotion or "unknown",
+            eye_contact=eye_contact or "unknown",
+            posture=posture or "unknown",
+            audio_quality=audio.quality if audio else None,
+            speech_share=round(audio.speech_ratio * 4) / 4 if audio else 0.0,
+            noisy=bool(audio and audio.has_speech and audio.snr_db < LOW_SNR_DB),
+            transcript=normalize_transcript(transcript),
+        )
+
+    @property
+    def has_speech(self) -> bool:
+        return self.audio_quality not in (None, "none")
+
+
+def template_feedback(request: FeedbackRequest) -> Dict:
+    """Rule-based coaching used when the LLM is skipped, over budget or failing"""
+    return {
+        "posture_feedback": POSTURE_FEEDBACK.get(
+            request.posture, "Stand tall with shoulders back and chin parallel to the floor."),
+        "expression_feedback": EXPRESSION_FEEDBACK.get(
+            request.emotion, "Try to vary your expressions to engage your audience better."),
+        "eye_contact_feedback": EYE_CONTACT_FEEDBACK.get(
+            request.eye_contact, "Try to maintain consistent eye contact with the camera lens."),
+        "voice_feedback": VOICE_FEEDBACK.get(request.audio_quality, DEFAULT_VOICE_FEEDBACK),
+        "overall_suggestion": "Focus on connecting with your audience through expressions and eye contact.",
+    }
+
+
+def build_prompt(request: FeedbackRequest) -> str:
+    """Coaching prompt for a normalized request"""
+    voice = (f"{request.audio_quality} volume, speaking about {request.speech_share:.0%} of the time"
+             f"{', noisy room' if request.noisy else ''}")
+    speech = f'"{request.transcript}"' if request.transcript else "(no transcript available)"
+    return f"""
+You are an expert speech coach providing BRIEF, CONCISE feedback. Keep each feedback point to 1-2 short sentences maximum.
+
+Analyze this 10-second segment:
+- Facial emotion: {request.emotion}
+- Eye contact: {request.eye_contact}
+- Posture: {request.posture}
+- Voice: {voice}
+- Speech: {speech}
+
+Be direct and actionable. For posture, assume the speaker is standing and suggest "Stand with shoulders back, spine straight."
+
+Provide your feedback in JSON format with the following structure:
+{{
+  "posture_feedback": "Very brief feedback about posture (max 15 words)",
+  "expression_feedback": "Very brief feedback about facial expressions (max 15 words)",
+  "eye_contact_feedback": "Very brief feedback about eye contact (max 15 words)",
+  "voice_feedback": "Very brief feedback about voice (max 15 words)",
+  "overall_suggestion": "One concise improvement tip (max 20 words)"
+}}
+
+Remember: Be extremely concise. No explanations needed.
+"""
+
+
+def parse_feedback(response_text: str) -> Dict:
+    """Parse the JSON feedback, also when it is wrapped in a markdown code block"""
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError:
+        if "```json" in response_text and "```" in response_text:
+            return json.loads(response_text.split("```json")[1].split("```")[0].strip())
+        raise ValueError("Could not extract JSON from response")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+class GeminiLLM:
+    """Gemini through the shared LLM client: generate(prompt, timeout) -> (text, tokens used)"""
+
+    def __init__(self, model_name: str = "gemini-1.5-flash"):
+        self.model_name = model_name
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> Tuple[str, int]:
+        response = llm_client.generate_sync(prompt, model=self.model_name, timeout=timeout, caller="live_feedback")
+        return response.text, response.total_tokens or estimate_tokens(prompt) + EXPECTED_RESPONSE_TOKENS
+
+
+class StubLLM:
+    """Offline stand-in for the LLM with canned answers, an optional delay and failure switch"""
+
+    RESPONSE = {
+        "posture_feedback": "Stand with shoulders back, spine straight.",
+        "expression_feedback": "Smile at key points to engage listeners.",
+        "eye_contact_feedback": "Keep your eyes on the camera lens.",
+        "voice_feedback": "Vary your pitch to stress key ideas.",
+        "overall_suggestion": "Slow down slightly and pause after each main point.",
+    }
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> Tuple[str, int]:
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("Stub LLM failure")
+        text = json.dumps(self.RESPONSE)
+        return text, estimate_tokens(prompt) + estimate_tokens(text)
+
+
+class RateGovernor:
+    """Global request-rate (token bucket) and token-per-minute budget"""
+
+    def __init__(self, qps: float = FEEDBACK_MAX_QPS, burst: int = FEEDBACK_BURST,
+                 tokens_per_minute: int = FEEDBACK_TOKENS_PER_MINUTE):
+        self.qps = qps
+        self.burst = burst
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._allowance = float(burst)
+        self._last = time.monotonic()
+        self._spent: collections.deque = collections.deque()   # (time, tokens)
+        self._spent_total = 0
+
+    def _expire(self, now: float):
+        while self._spent and now - self._spent[0][0] > 60:
+            self._spent_total -= self._spent.popleft()[1]
+
+    def try_acquire(self, estimated_tokens: int) -> bool:
+        """Reserve one request and its estimated tokens, or refuse without waiting"""
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.burst, self._allowance + (now - self._last) * self.qps)
+            self._last = now
+            self._expire(now)
+            if self._allowance < 1 or self._spent_total + estimated_tokens > self.tokens_per_minute:
+                return False
+            self._allowance -= 1
+            self._spent.append((now, estimated_tokens))
+            self._spent_total += estimated_tokens
+            return True
+
+    def record(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the reservation once the real usage is known"""
+        with self._lock:
+            self._spent.append((time.monotonic(), actual_tokens - estimated_tokens))
+            self._spent_total += actual_tokens - estimated_tokens
+
+    @property
+    def tokens_last_minute(self) -> int:
+        with self._lock:
+            self._expire(time.monotonic())
+            return self._spent_total
+
+
+class FeedbackService:
+    """
+    Coaching feedback shared by all live sessions.
+
+    Responses are cached per normalized FeedbackRequest for a TTL, and concurrent
+    identical requests wait for the one call already in flight. Calls that would
+    exceed the global rate or token budget, requests without speech and LLM
+    failures are answered with templated feedback instead.
+    """
+
+    def __init__(self, llm=None, governor: Optional[RateGovernor] = None,
+                 ttl: float = FEEDBACK_CACHE_TTL, max_entries: int = FEEDBACK_CACHE_SIZE):
+        self.llm = llm or GeminiLLM()
+        self.governor = governor or RateGovernor()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._cache: "collections.OrderedDict[FeedbackRequest, Tuple[float, Dict]]" = collections.OrderedDict()
+        self._in_flight: Dict[FeedbackRequest, concurrent.futures.Future] = {}
+        self.metrics = {
+            "requests": 0,
+            "hits": 0,
+            "coalesced": 0,
+            "llm_calls": 0,
+            "no_speech": 0,
+            "throttled": 0,
+            "errors": 0,
+            "tokens": 0,
+        }
+
+    def get_feedback(self, request: FeedbackRequest, timeout: Optional[float] = None) -> Dict:
+        """Coaching feedback for a request, from cache, a shared call or the LLM"""
+        with self._lock:
+            self.metrics["requests"] += 1
+            if not request.has_speech:
+                # Nothing for the LLM to add over the rules
+                self.metrics["no_speech"] += 1
+                return template_feedback(request)
+
+            entry = self._cache.get(request)
+            if entry and entry[0] > time.monotonic():
+                self._cache.move_to_end(request)
+                self.metrics["hits"] += 1
+                return dict(entry[1])
+
+            pending = self._in_flight.get(request)
+            owner = pending is None
+            if owner:
+                pending = self._in_flight[request] = concurrent.futures.Future()
+            else:
+                self.metrics["coalesced"] += 1
+
+        if not owner:
+            try:
+                return dict(pending.result(timeout=timeout))
+            except Exception:
+                return template_feedback(request)
+
+        try:
+            result = self._generate(request, timeout)
+            pending.set_result(result)
+            return dict(result)
+        finally:
+            if not pending.done():
+                pending.set_result(template_feedback(request))
+            with self._lock:
+                self._in_flight.pop(request, None)
+
+    def _generate(self, request: FeedbackRequest, timeout: Optional[float]) -> Dict:
+        """Call the LLM within budget, caching successful responses"""
+        prompt = build_prompt(request)
+        estimated = estimate_tokens(prompt) + EXPECTED_RESPONSE_TOKENS
+        if not self.governor.try_acquire(estimated):
+            logger.info("[FEEDBACK] LLM budget exhausted, serving templated feedback")
+            with self._lock:
+                self.metrics["throttled"] += 1
+            return template_feedback(request)
+
+        try:
+            logger.info("[FEEDBACK] Sending request to LLM...")
+            text, tokens = self.llm.generate(prompt, timeout=timeout)
+            # Keep the response shape stable even if the model leaves a field out
+            result = {**template_feedback(request), **parse_feedback(text)}
+        except Exception as e:
+            logger.error(f"[FEEDBACK] Failed to get LLM response: {e}")
+            self.governor.record(estimated, 0)
+            with self._lock:
+                self.metrics["errors"] += 1
+            return template_feedback(request)
+
+        self.governor.record(estimated, tokens)
+        with self._lock:
+            self.metrics["llm_calls"] += 1
+            self.metrics["tokens"] += tokens
+            self._cache[request] = (time.monotonic() + self.ttl, result)
+            self._cache.move_to_end(request)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    def stats(self) -> Dict:
+        """Snapshot of cache and budget state for the metrics endpoint"""
+        with self._lock:
+            metrics = dict(self.metrics)
+            cached = len(self._cache)
+            in_flight = len(self._in_flight)
+        lookups = metrics["requests"] - metrics["no_speech"]
+        return {
+            **metrics,
+            "hit_rate": round((metrics["hits"] + metrics["coalesced"]) / lookups, 3) if lookups else None,
+            "cached": cached,
+            "in_flight": in_flight,
+            "tokens_last_minute": self.governor.tokens_last_minute,
+        }
+
+
+def _default_llm():
+    """LIVE_FEEDBACK_LLM=stub runs the service offline"""
+    if os.getenv("LIVE_FEEDBACK_LLM", "gemini").lower() == "stub":
+        return StubLLM()
+    return GeminiLLM()
+
+
+# Create global instance
+feedback_service = FeedbackService(llm=_default_llm())
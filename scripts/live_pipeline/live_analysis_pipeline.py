@@ -1,17 +1,22 @@
 import time
+import asyncio
 import cv2
 import json
 import threading
 import logging
 import numpy as np
-from scripts.live_pipeline.face_analysis import analyze_face
-from scripts.live_pipeline.audio_analysis import record_audio, transcribe_audio
+from scripts.plugins import lazy_attr
+from scripts.live_pipeline.audio_analysis import record_audio, transcribe_audio, analyze_audio, AudioMetrics
 from scripts.live_pipeline.live_gemini import get_gemini_feedback
+from scripts.live_pipeline.cancellation import AnalysisCancelled, check_deadline
 from datetime import datetime
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
+# dlib and DeepFace (TensorFlow) load in the worker that runs the first face stage
+analyze_face = lazy_attr("scripts.live_pipeline.face_analysis", "analyze_face")
+
 # Shared results
 face_result = {}
 audio_result = {}
@@ -33,143 +38,217 @@ def run_audio_analysis():
     transcript = transcribe_audio(audio)
     audio_result = {"transcript": transcript}
 
-def run_analysis_once(frame, audio_data=None):
-    """Run analysis on a single frame and optional audio data"""
-    try:
-        logger.info(f"Running analysis for frame and audio data")
-        
-        # Default values in case analysis fails
-        emotion = "neutral"
-        eye_contact = "limited"
-        posture = "unknown"
-        transcript = "No speech detected"
-        audio_quality = "unknown"
-        
-        # Process frame if available
-        if frame is not None:
-            # Debug frame data type and size
-            if isinstance(frame, str):
-                logger.info(f"Frame is a string, length: {len(frame)}")
-            elif isinstance(frame, np.ndarray):
-                logger.info(f"Frame is numpy array, shape: {frame.shape}")
-            else:
-                logger.info(f"Frame is type: {type(frame)}")
+def decode_frame(frame):
+    """Convert a data:image base64 string to a BGR numpy array"""
+    # Debug frame data type and size
+    if isinstance(frame, str):
+        logger.info(f"Frame is a string, length: {len(frame)}")
+    elif isinstance(frame, np.ndarray):
+        logger.info(f"Frame is numpy array, shape: {frame.shape}")
+    else:
+        logger.info(f"Frame is type: {type(frame)}")
+    
+    # Convert base64 string to numpy array if needed
+    if isinstance(frame, str) and frame.startswith('data:image'):
+        try:
+            # Extract the base64 part
+            import base64
+            import re
             
-            # Convert base64 string to numpy array if needed
-            if isinstance(frame, str) and frame.startswith('data:image'):
-                try:
-                    # Extract the base64 part
-                    import base64
-                    from io import BytesIO
-                    import re
-                    
-                    base64_data = re.sub('^data:image/.+;base64,', '', frame)
-                    img_data = base64.b64decode(base64_data)
-                    
-                    # Convert to numpy array
-                    nparr = np.frombuffer(img_data, np.uint8)
-                    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                    logger.info(f"Successfully converted base64 image to numpy array, shape: {frame.shape}")
-                except Exception as e:
-                    logger.error(f"Error converting base64 image: {e}")
-                    frame = None
+            base64_data = re.sub('^data:image/.+;base64,', '', frame)
+            img_data = base64.b64decode(base64_data)
             
-            # Run face analysis if we have a valid frame
-            if frame is not None and isinstance(frame, np.ndarray) and frame.size > 0:
-                emotion, eye_contact, posture = analyze_face(frame)
-                logger.info(f"Face analysis results: emotion={emotion}, eye_contact={eye_contact}, posture={posture}")
-            else:
-                logger.warning("Invalid frame for face analysis")
+            # Convert to numpy array
+            nparr = np.frombuffer(img_data, np.uint8)
+            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            logger.info(f"Successfully converted base64 image to numpy array, shape: {frame.shape}")
+        except Exception as e:
+            logger.error(f"Error converting base64 image: {e}")
+            frame = None
+    
+    if frame is not None and isinstance(frame, np.ndarray) and frame.size > 0:
+        return frame
+    return None
+
+
+def audio_stage_result(metrics):
+    """Stage result for an AudioMetrics record (None when the audio was unreadable)"""
+    if metrics is None:
+        return {"transcript": "Error processing audio", "audio_quality": "unknown", "audio_metrics": None}
+    return {"transcript": metrics.status, "audio_quality": metrics.quality, "audio_metrics": metrics.to_dict()}
+
+
+# Values reported when a stage has no usable input or fails
+FACE_DEFAULTS = {"emotion": "neutral", "eye_contact": "limited", "posture": "unknown"}
+AUDIO_DEFAULTS = {"transcript": "No speech detected", "audio_quality": "unknown", "audio_metrics": None}
+FALLBACK_COACHING = {
+    "posture_feedback": "Stand straight with shoulders back.",
+    "expression_feedback": "Add more expression to engage your audience.",
+    "eye_contact_feedback": "Look directly at the camera.",
+    "voice_feedback": "Speak clearly and project your voice.",
+    "overall_suggestion": "Continue practicing with more energy and expression."
+}
+
+
+def run_face_stage(frame, deadline=None):
+    """Decode the frame and run face analysis (emotion, eye contact, posture)"""
+    if frame is None:
+        logger.warning("No frame provided for analysis")
+        return dict(FACE_DEFAULTS)
+    
+    check_deadline(deadline, "decode")
+    frame = decode_frame(frame)
+    if frame is None:
+        logger.warning("Invalid frame for face analysis")
+        return dict(FACE_DEFAULTS)
+    
+    check_deadline(deadline, "face")
+    emotion, eye_contact, posture = analyze_face(frame)
+    logger.info(f"Face analysis results: emotion={emotion}, eye_contact={eye_contact}, posture={posture}")
+    return {"emotion": emotion, "eye_contact": eye_contact, "posture": posture}
+
+
+def run_audio_stage(audio_data, allow_device_capture=True, deadline=None):
+    """
+    Measure the latest audio and grade its quality.
+
+    Without audio_data, the local microphone is recorded for 3 seconds only when
+    allow_device_capture is set; that makes sense for the CLI loop, never for a
+    server handling remote sessions.
+    """
+    check_deadline(deadline, "audio")
+    
+    # Process audio if available
+    if audio_data is not None:
+        # Debug audio data type
+        if isinstance(audio_data, str):
+            logger.info(f"Audio data is a string, length: {len(audio_data)}")
+        elif isinstance(audio_data, np.ndarray):
+            logger.info(f"Audio data is numpy array, shape: {audio_data.shape}")
         else:
-            logger.warning("No frame provided for analysis")
-        
-        # Process audio if available
-        if audio_data is not None:
-            # Debug audio data type
-            if isinstance(audio_data, str):
-                logger.info(f"Audio data is a string, length: {len(audio_data)}")
-            elif isinstance(audio_data, np.ndarray):
-                logger.info(f"Audio data is numpy array, shape: {audio_data.shape}")
-            else:
-                logger.info(f"Audio data is type: {type(audio_data)}")
-                
-            # Transcribe audio
-            transcript = transcribe_audio(audio_data)
-            logger.info(f"Audio transcription: {transcript}")
+            logger.info(f"Audio data is type: {type(audio_data)}")
             
-            # Extract audio quality from transcript
-            if "volume is low" in transcript:
-                audio_quality = "low"
-            elif "No speech detected" in transcript:
-                audio_quality = "none"
-            elif "Good volume" in transcript:
-                audio_quality = "good"
-            elif "Excellent" in transcript:
-                audio_quality = "excellent"
-            elif "too loud" in transcript:
-                audio_quality = "too_loud"
-            else:
-                audio_quality = "moderate"
-        else:
-            logger.warning("No audio data provided for analysis")
-            # Try to record audio directly if no audio data provided
-            try:
-                from scripts.live_pipeline.audio_analysis import record_audio
-                logger.info("Attempting to record audio directly")
-                audio_data = record_audio(3)  # Record 3 seconds
-                if audio_data is not None:
-                    transcript = transcribe_audio(audio_data)
-                    logger.info(f"Recorded audio transcription: {transcript}")
-                    
-                    # Extract audio quality from transcript
-                    if "volume is low" in transcript:
-                        audio_quality = "low"
-                    elif "No speech detected" in transcript:
-                        audio_quality = "none"
-                    elif "Good volume" in transcript:
-                        audio_quality = "good"
-                    elif "Excellent" in transcript:
-                        audio_quality = "excellent"
-                    elif "too loud" in transcript:
-                        audio_quality = "too_loud"
-                    else:
-                        audio_quality = "moderate"
-            except Exception as e:
-                logger.error(f"Error recording audio: {e}")
-                transcript = "No speech detected"
-                audio_quality = "unknown"
-        
-        # Get Gemini feedback with posture information
-        gemini_feedback = get_gemini_feedback(emotion, eye_contact, posture, transcript)
+        return audio_stage_result(analyze_audio(audio_data))
+    
+    logger.warning("No audio data provided for analysis")
+    if not allow_device_capture:
+        return dict(AUDIO_DEFAULTS)
+    
+    # Try to record audio directly if no audio data provided
+    try:
+        logger.info("Attempting to record audio directly")
+        audio_data = record_audio(3)  # Record 3 seconds
+        if audio_data is not None:
+            return audio_stage_result(analyze_audio(audio_data))
+    except Exception as e:
+        logger.error(f"Error recording audio: {e}")
+    return dict(AUDIO_DEFAULTS)
+
+
+def run_llm_stage(face, audio, deadline=None):
+    """Ask Gemini for coaching text, bounded by what is left of the deadline"""
+    check_deadline(deadline, "llm")
+    timeout = max(0.5, deadline - time.time()) if deadline is not None else None
+    speech = audio.get("speech_activity") or {}
+    return get_gemini_feedback(face["emotion"], face["eye_contact"], face["posture"],
+                               AudioMetrics.from_dict(audio.get("audio_metrics")),
+                               transcript=speech.get("recent_text", ""), timeout=timeout)
+
+
+def run_analysis_once(frame, audio_data=None, deadline=None):
+    """
+    Run analysis on a single frame and optional audio data.
+
+    The work is split into decode, face, audio and llm stages. When a wall-clock
+    deadline is given, AnalysisCancelled is raised at the next stage boundary once
+    it has passed, so a timed-out analysis stops consuming its worker.
+    """
+    try:
+        logger.info(f"Running analysis for frame and audio data")
+        face = run_face_stage(frame, deadline=deadline)
+        audio = run_audio_stage(audio_data, deadline=deadline)
+        gemini_feedback = run_llm_stage(face, audio, deadline=deadline)
         
         return {
-            "emotion": emotion,
-            "eye_contact": eye_contact,
-            "posture": posture,
-            "transcript": transcript,
-            "audio_quality": audio_quality,
+            **face,
+            **audio,
             "gemini_feedback": gemini_feedback,
             "timestamp": datetime.now().isoformat()
         }
+    except AnalysisCancelled as e:
+        logger.info(f"Analysis abandoned before the {e.stage} stage: deadline passed")
+        raise
     except Exception as e:
         logger.error(f"Error in run_analysis_once: {e}", exc_info=True)
         # Return fallback data in case of error
         return {
-            "emotion": "neutral",
-            "eye_contact": "limited",
-            "posture": "unknown",
+            **FACE_DEFAULTS,
             "transcript": "Analysis in progress...",
             "audio_quality": "unknown",
-            "gemini_feedback": {
-                "posture_feedback": "Stand straight with shoulders back.",
-                "expression_feedback": "Add more expression to engage your audience.",
-                "eye_contact_feedback": "Look directly at the camera.",
-                "voice_feedback": "Speak clearly and project your voice.",
-                "overall_suggestion": "Continue practicing with more energy and expression."
-            },
+            "gemini_feedback": dict(FALLBACK_COACHING),
             "timestamp": datetime.now().isoformat()
         }
 
+
+async def run_analysis_pipeline(frame, audio_data, run_stage, emit, speech_activity=None):
+    """
+    Run one analysis tick as an async pipeline with partial results.
+
+    The face and audio stages run concurrently and emit(stage, data) is awaited as
+    soon as each finishes; the LLM stage starts once both are in and is emitted last
+    with the combined result. Audio must be supplied by the caller (e.g. from the
+    session's AudioIngest); the server's own microphone is never used here.
+
+    run_stage(stage, fn, *args) decides where each stage function executes (process
+    pool, thread, ...) and may return None when the work was superseded. A stage
+    that fails falls back to its defaults. If the face or audio stage times out,
+    coaching is skipped rather than built on defaults, and asyncio.TimeoutError is
+    raised after the other stage's partial result was emitted. speech_activity
+    (speaking ratio and pauses from the session's streaming VAD) is attached to the
+    audio result as-is, since it is already computed per chunk.
+    """
+    timed_out = []
+
+    async def guarded(stage, fn, *args):
+        try:
+            return stage, await run_stage(stage, fn, *args)
+        except (asyncio.TimeoutError, AnalysisCancelled):
+            logger.warning(f"The {stage} stage timed out")
+            timed_out.append(stage)
+        except Exception as e:
+            logger.error(f"The {stage} stage failed: {e}")
+        return stage, None
+    
+    result = {**FACE_DEFAULTS, **AUDIO_DEFAULTS}
+    parts = {"face": dict(FACE_DEFAULTS), "audio": dict(AUDIO_DEFAULTS)}
+    if speech_activity is not None:
+        result["speech_activity"] = speech_activity
+    tasks = [
+        asyncio.create_task(guarded("face", run_face_stage, frame)),
+        asyncio.create_task(guarded("audio", run_audio_stage, audio_data, False)),
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            stage, data = await next_done
+            if data is None:
+                continue
+            if stage == "audio" and speech_activity is not None:
+                data = {**data, "speech_activity": speech_activity}
+            parts[stage] = data
+            result.update(data)
+            await emit(stage, {**data, "timestamp": datetime.now().isoformat()})
+    finally:
+        for task in tasks:
+            task.cancel()
+    if timed_out:
+        raise asyncio.TimeoutError(f"{' and '.join(timed_out)} analysis timed out")
+    
+    _, gemini_feedback = await guarded("coaching", run_llm_stage, parts["face"], parts["audio"])
+    result["gemini_feedback"] = gemini_feedback or dict(FALLBACK_COACHING)
+    result["timestamp"] = datetime.now().isoformat()
+    await emit("coaching", result)
+    return result
+
 def run_loop():
     cam = cv2.VideoCapture(0)
     print(" Starting 10-second live feedback loop...\n")
@@ -0,0 +1,166 @@
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Rows kept per session; at one row per analysis this covers several hours
+TIMELINE_CAPACITY = 2048
+ARCHIVE_ENCODING = "zlib-float32"
+
+COLUMNS = ("timestamp", "eye_contact", "emotion", "posture", "voice", "loudness", "snr_db", "wpm")
+COLUMN_INDEX = {name: i for i, name in enumerate(COLUMNS)}
+
+# Categorical results are coded as numbers; unknown labels become NaN instead of new keys
+EYE_CONTACT_CODES = {"yes": 1.0, "limited": 0.0}
+POSTURE_CODES = {"good": 1.0, "poor": 0.0}
+VOICE_CODES = {"excellent": 1.0, "good": 1.0, "moderate": 0.0, "low": 0.0, "none": 0.0, "too_loud": 0.0}
+EMOTIONS = ("neutral", "happy", "sad", "angry", "surprise", "fear", "disgust")
+EMOTION_CODES = {label: float(code) for code, label in enumerate(EMOTIONS)}
+
+# Columns reported as means; each contributes a running sum and a count of present values
+AVERAGED = ("eye_contact", "posture", "voice", "loudness", "snr_db", "wpm")
+_AVERAGED_INDEX = [COLUMN_INDEX[name] for name in AVERAGED]
+_SUMS = 2 * len(AVERAGED) + len(EMOTIONS)
+
+
+def _number(value) -> float:
+    return float(value) if isinstance(value, (int, float)) else np.nan
+
+
+class SessionTimeline:
+    """
+    Fixed-size numeric time series of one live session.
+
+    Each analysis appends a row to a preallocated ring buffer. Running totals of
+    the averaged columns and the emotion counts are kept alongside, together with
+    the totals as they were before each row, so the aggregate over any recent
+    window is one subtraction rather than a pass over the rows. Session-wide
+    aggregates keep counting after old rows are overwritten.
+    """
+
+    def __init__(self, capacity: int = TIMELINE_CAPACITY):
+        self.capacity = capacity
+        self._rows = np.full((capacity, len(COLUMNS)), np.nan)
+        self._before = np.zeros((capacity, _SUMS))
+        self._total = np.zeros(_SUMS)
+        self._next = 0
+        self.count = 0
+        self.started_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def record(self, face: Optional[Dict] = None, audio: Optional[Dict] = None,
+               wpm: Optional[float] = None, timestamp: Optional[float] = None):
+        """Append one analysis; stages that produced no result are left as NaN"""
+        row = np.full(len(COLUMNS), np.nan)
+        row[0] = timestamp if timestamp is not None else time.time()
+        if face:
+            row[COLUMN_INDEX["eye_contact"]] = EYE_CONTACT_CODES.get(face.get("eye_contact"), np.nan)
+            row[COLUMN_INDEX["emotion"]] = EMOTION_CODES.get(face.get("emotion"), np.nan)
+            row[COLUMN_INDEX["posture"]] = POSTURE_CODES.get(face.get("posture"), np.nan)
+        if audio:
+            row[COLUMN_INDEX["voice"]] = VOICE_CODES.get(audio.get("audio_quality"), np.nan)
+            levels = audio.get("audio_metrics") or {}
+            row[COLUMN_INDEX["loudness"]] = _number(levels.get("rms_dbfs"))
+            row[COLUMN_INDEX["snr_db"]] = _number(levels.get("snr_db"))
+        row[COLUMN_INDEX["wpm"]] = _number(wpm)
+
+        if self.started_at is None:
+            self.started_at = row[0]
+        self._rows[self._next] = row
+        self._before[self._next] = self._total
+        self._total = self._total + self._contribution(row)
+        self._next = (self._next + 1) % self.capacity
+        self.count += 1
+
+    @staticmethod
+    def _contribution(row: np.ndarray) -> np.ndarray:
+        values = row[_AVERAGED_INDEX]
+        present = ~np.isnan(values)
+        emotions = np.zeros(len(EMOTIONS))
+        code = row[COLUMN_INDEX["emotion"]]
+        if not np.isnan(code):
+            emotions[int(code)] = 1.0
+        return np.concatenate([np.where(present, values, 0.0), present, emotions])
+
+    def _physical(self, i: int) -> int:
+        """Buffer index of the i-th oldest retained row"""
+        return (self._next - len(self) + i) % self.capacity
+
+    def _first_since(self, since: float) -> int:
+        """Oldest retained row at or after since (binary search over the ring)"""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._rows[self._physical(mid), 0] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def aggregate(self, window: Optional[float] = None) -> Dict:
+        """Means and emotion shares over the last window seconds, or the whole session"""
+        if window is None or self.count == 0:
+            sums, samples = self._total, self.count
+        else:
+            # Windows reaching past the retained rows start at the oldest one
+            start = self._first_since(time.time() - window)
+            samples = len(self) - start
+            sums = self._total - self._before[self._physical(start)] if samples else np.zeros(_SUMS)
+
+        n = len(AVERAGED)
+        values, counts, emotions = sums[:n], sums[n:2 * n], sums[2 * n:]
+        result = {
+            "samples": int(samples),
+            "window": window,
+            "duration": round(time.time() - self.started_at, 1) if self.started_at else 0.0,
+        }
+        for name, total, present in zip(AVERAGED, values, counts):
+            result[name] = round(float(total / present), 3) if present else None
+        emotion_total = emotions.sum()
+        result["emotions"] = ({label: round(float(c / emotion_total), 3) for label, c in zip(EMOTIONS, emotions) if c}
+                              if emotion_total else {})
+        return result
+
+    def rows(self, window: Optional[float] = None, max_points: Optional[int] = None) -> List[List]:
+        """Retained rows oldest first, with labels decoded, NaN as None and evenly thinned to max_points"""
+        start = self._first_since(time.time() - window) if window is not None else 0
+        order = [self._physical(i) for i in range(start, len(self))]
+        if max_points and len(order) > max_points:
+            order = [order[int(i * len(order) / max_points)] for i in range(max_points)]
+        data = self._rows[order]
+        emotion_col = COLUMN_INDEX["emotion"]
+        rows = []
+        for row in data.tolist():
+            row = [None if value != value else round(value, 3) for value in row]
+            if row[emotion_col] is not None:
+                row[emotion_col] = EMOTIONS[int(row[emotion_col])]
+            rows.append(row)
+        return rows
+
+    def compressed(self) -> Dict:
+        """Retained rows as zlib-compressed float32, timestamps as seconds from the first row"""
+        order = [self._physical(i) for i in range(len(self))]
+        data = self._rows[order]
+        start = float(data[0, 0]) if len(data) else self.started_at
+        if len(data):
+            data[:, 0] -= start
+        return {
+            "encoding": ARCHIVE_ENCODING,
+            "columns": list(COLUMNS),
+            "emotions": list(EMOTIONS),
+            "shape": list(data.shape),
+            "start": start,
+            "data": zlib.compress(data.astype(np.float32).tobytes()),
+        }
+
+    @staticmethod
+    def decompress(archived: Dict) -> np.ndarray:
+        """Rows of a compressed() timeline with absolute timestamps"""
+        data = np.frombuffer(zlib.decompress(archived["data"]), dtype=np.float32)
+        data = data.reshape(archived["shape"]).astype(np.float64)
+        if len(data):
+            data[:, 0] += archived["start"]
+        return data
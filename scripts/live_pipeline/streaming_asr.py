@@ -0,0 +1,199 @@
+import os
+import asyncio
+import logging
+import functools
+import collections
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+import numpy as np
+
+from scripts.live_pipeline.cancellation import check_deadline
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+# Small CTC model: no decoder loop, so cost grows linearly with the audio window
+ASR_MODEL = os.getenv("LIVE_ASR_MODEL", "facebook/wav2vec2-base-960h")
+ASR_TIMEOUT = 3.0             # budget for decoding one window
+PARTIAL_INTERVAL = 2.0        # seconds of new speech between partial hypotheses
+MIN_SEGMENT_SECONDS = 0.3     # shorter bursts (coughs, clicks) are not transcribed
+MAX_SEGMENT_SECONDS = 10.0    # long stretches of speech are finalized in pieces
+WPM_WINDOW = 60.0             # speaking rate is measured over the last minute
+
+# Same vocabulary as speech_analysis.detect_filler_words
+FILLER_WORDS = {"uh", "um", "like", "so", "actually", "basically"}
+FILLER_PHRASES = {("you", "know")}
+
+
+@functools.lru_cache(maxsize=1)
+def load_model():
+    """Load the CTC processor and model once per process"""
+    from transformers import Wav2Vec2Processor, Wav2Vec2ForCTC
+
+    logger.info(f"Loading streaming ASR model {ASR_MODEL}...")
+    processor = Wav2Vec2Processor.from_pretrained(ASR_MODEL)
+    model = Wav2Vec2ForCTC.from_pretrained(ASR_MODEL)
+    model.eval()
+    logger.info("Streaming ASR model loaded")
+    return processor, model
+
+
+def _ctc_words(ids: np.ndarray, tokenizer, frame_seconds: float) -> List[Dict]:
+    """Greedy CTC decode of frame-level token ids into words with time offsets"""
+    # Collapse repeats and drop blanks, keeping the frame each token was emitted on
+    changed = np.concatenate(([True], ids[1:] != ids[:-1]))
+    positions = np.flatnonzero(changed & (ids != tokenizer.pad_token_id))
+    tokens = tokenizer.convert_ids_to_tokens(ids[positions].tolist())
+
+    words, chars, start, last = [], [], 0, 0
+    for position, token in zip(positions, tokens):
+        if token == tokenizer.word_delimiter_token:
+            if chars:
+                words.append({"word": "".join(chars).lower(), "start": start * frame_seconds,
+                              "end": (last + 1) * frame_seconds})
+                chars = []
+            continue
+        if not chars:
+            start = position
+        chars.append(token)
+        last = position
+    if chars:
+        words.append({"word": "".join(chars).lower(), "start": start * frame_seconds,
+                      "end": (last + 1) * frame_seconds})
+    return words
+
+
+def transcribe_window(samples: np.ndarray, deadline=None) -> Dict:
+    """Transcribe one window of 16 kHz mono audio; word times are relative to its start"""
+    check_deadline(deadline, "asr")
+    if samples is None or samples.size < int(MIN_SEGMENT_SECONDS * SAMPLE_RATE):
+        return {"text": "", "words": []}
+
+    import torch
+
+    processor, model = load_model()
+    inputs = processor(samples, sampling_rate=SAMPLE_RATE, return_tensors="pt")
+    with torch.inference_mode():
+        logits = model(inputs.input_values).logits[0]
+    ids = logits.argmax(dim=-1).numpy()
+    frame_seconds = samples.size / SAMPLE_RATE / max(1, ids.size)
+
+    words = _ctc_words(ids, processor.tokenizer, frame_seconds)
+    return {"text": " ".join(w["word"] for w in words), "words": words}
+
+
+def count_fillers(words: List[str]) -> collections.Counter:
+    """Count filler words and phrases in a list of lowercase words"""
+    counts = collections.Counter(w for w in words if w in FILLER_WORDS)
+    for pair in zip(words, words[1:]):
+        if pair in FILLER_PHRASES:
+            counts[" ".join(pair)] += 1
+    return counts
+
+
+class StreamingTranscriber:
+    """
+    Incremental transcription of one live session.
+
+    Works off the session's AudioIngest: the streaming VAD decides what to decode
+    and the ring buffer supplies the samples. Each step finalizes speech segments
+    the VAD has closed since the last step and re-decodes the segment still in
+    progress as a partial hypothesis. Segments are capped at MAX_SEGMENT_SECONDS
+    and every decode has a timeout, so the latency of a step is bounded no matter
+    how long the speaker talks. Timestamps are on the ingest stream clock.
+    """
+
+    def __init__(self, session_id: str, ingest, history: int = 200):
+        self.session_id = session_id
+        self.ingest = ingest
+        self.segments: Deque[Dict] = collections.deque(maxlen=history)
+        self._words: Deque[Dict] = collections.deque(maxlen=history * 20)
+        self._final_until = 0.0
+        self._partial_until = 0.0
+        self.word_count = 0
+        self.fillers = collections.Counter()
+        self.dropped_segments = 0
+
+    async def _transcribe(self, run, start: float, end: float) -> Optional[Dict]:
+        """Decode a stretch of the ring buffer; None if it could not be done in time"""
+        audio = self.ingest.ring.read_range(start, end)
+        if audio.size == 0:
+            return None
+        try:
+            return await run(transcribe_window, audio)
+        except asyncio.TimeoutError:
+            logger.warning(f"Transcription timed out for session {self.session_id}")
+        except Exception as e:
+            logger.error(f"Transcription failed for session {self.session_id}: {e}")
+        return None
+
+    def _segment(self, result: Dict, start: float, end: float, final: bool) -> Dict:
+        """Shift word times onto the stream clock and package a transcript segment"""
+        words = [{**w, "start": round(start + w["start"], 2), "end": round(start + w["end"], 2)}
+                 for w in result["words"]]
+        return {"text": result["text"], "start": round(start, 2), "end": round(end, 2),
+                "final": final, "words": words}
+
+    def _finalize(self, result: Optional[Dict], start: float, end: float) -> Optional[Dict]:
+        """Commit text up to `end`; returns the segment to publish, if any"""
+        self._final_until = self._partial_until = end
+        if result is None:
+            # Dropping the segment keeps later text on time
+            self.dropped_segments += 1
+            return None
+        if not result["text"]:
+            return None
+        segment = self._segment(result, start, end, final=True)
+        self.segments.append(segment)
+        self._words.extend(segment["words"])
+        self.word_count += len(segment["words"])
+        self.fillers.update(count_fillers([w["word"] for w in segment["words"]]))
+        return segment
+
+    async def step(self, run: Callable[..., Awaitable]) -> List[Dict]:
+        """
+        Transcribe whatever is new since the last step.
+
+        run(fn, audio) executes transcribe_window (e.g. on the analysis scheduler)
+        and returns its result. Returns the final and partial segments to publish.
+        """
+        vad = self.ingest.vad
+        published = []
+
+        for closed in vad.closed_segments(since=self._final_until):
+            start = max(closed.start, self._final_until)
+            if closed.end - start < MIN_SEGMENT_SECONDS:
+                self._final_until = closed.end
+                continue
+            segment = self._finalize(await self._transcribe(run, start, closed.end), start, closed.end)
+            if segment:
+                published.append(segment)
+
+        if vad.in_speech:
+            start = max(vad.open_segment_start, self._final_until)
+            end = vad.now
+            if end - start >= MAX_SEGMENT_SECONDS:
+                segment = self._finalize(await self._transcribe(run, start, end), start, end)
+                if segment:
+                    published.append(segment)
+            elif end - start >= MIN_SEGMENT_SECONDS and end - self._partial_until >= PARTIAL_INTERVAL:
+                self._partial_until = end
+                result = await self._transcribe(run, start, end)
+                if result and result["text"]:
+                    published.append(self._segment(result, start, end, final=False))
+
+        return published
+
+    def stats(self, window: float = WPM_WINDOW) -> Dict:
+        """Speaking rate, filler counts and recent text from finalized segments"""
+        now = self.ingest.vad.now
+        since = max(0.0, now - window)
+        recent = sum(1 for w in self._words if w["start"] >= since)
+        elapsed = now - since
+        return {
+            "word_count": self.word_count,
+            "wpm": round(recent / elapsed * 60, 1) if elapsed >= 5 else 0.0,
+            "filler_words": dict(self.fillers),
+            "filler_total": sum(self.fillers.values()),
+            "recent_text": " ".join(s["text"] for s in self.segments if s["end"] >= since),
+        }
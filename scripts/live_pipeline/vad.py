@@ -0,0 +1,205 @@
+import collections
+import logging
+from dataclasses import dataclass, field
+from typing import Deque, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20            # analysis window
+HOP_MS = 10              # window step; frames overlap by half
+HANGOVER_MS = 200        # keep a segment open across short dips (plosives, breaths)
+MIN_PAUSE_SECONDS = 0.5  # gaps shorter than this are not reported as pauses
+ENERGY_MARGIN_DB = 9.0   # speech must sit this far above the noise floor
+ABSOLUTE_MIN_DBFS = -55.0
+EPS = 1e-10
+
+
+def to_dbfs(value):
+    """Convert a linear amplitude (or array of them) to dB relative to full scale"""
+    return 20.0 * np.log10(np.maximum(value, EPS))
+
+
+SILENCE_DBFS = float(to_dbfs(0.0))
+
+
+@dataclass
+class SpeechSegment:
+    start: float          # seconds on the stream clock
+    end: float
+    closed: bool = True   # False while the speaker is still talking
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class VADResult:
+    """Speech activity and loudness statistics for one chunk of audio"""
+    segments: List[SpeechSegment] = field(default_factory=list)
+    frame_count: int = 0
+    speech_ratio: float = 0.0
+    rms_dbfs: float = SILENCE_DBFS
+    peak: float = 0.0
+    speech_dbfs: Optional[float] = None     # energy-average level of speech frames
+    noise_floor_dbfs: float = SILENCE_DBFS
+    spectral_centroid: float = 0.0         # Hz, averaged over speech frames
+    zero_crossing_rate: float = 0.0
+
+    @property
+    def is_speech(self) -> bool:
+        return bool(self.segments)
+
+    @property
+    def peak_dbfs(self) -> float:
+        return float(to_dbfs(self.peak))
+
+
+class StreamingVAD:
+    """
+    Frame-based voice activity detector that runs over consecutive audio chunks.
+
+    Each call frames the chunk with a strided view (20 ms windows, 10 ms hop) and
+    computes energy, zero-crossing rate and spectral centroid for every frame in a
+    single vectorized pass. Partial frames, the adaptive noise floor, the hangover
+    history and any segment still open are carried over to the next chunk, so
+    segment boundaries are continuous on the stream clock.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, frame_ms: int = FRAME_MS, hop_ms: int = HOP_MS,
+                 hangover_ms: int = HANGOVER_MS, history: int = 256):
+        self.sample_rate = sample_rate
+        self.frame_len = int(sample_rate * frame_ms / 1000)
+        self.hop = int(sample_rate * hop_ms / 1000)
+        self.hangover = max(1, int(hangover_ms / hop_ms))
+
+        self._window = np.hanning(self.frame_len).astype(np.float32)
+        self._freqs = np.fft.rfftfreq(self.frame_len, d=1.0 / sample_rate)
+
+        # State carried between chunks
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._recent = np.zeros(self.hangover - 1, dtype=bool)
+        self._noise_floor: Optional[float] = None
+        self._frames_seen = 0
+        self._in_speech = False
+        self._segment_start = 0.0
+        self._segments: Deque[SpeechSegment] = collections.deque(maxlen=history)
+
+    def _frame_time(self, index):
+        """Stream-clock time of the start of a frame"""
+        return (self._frames_seen + index) * self.hop / self.sample_rate
+
+    @property
+    def now(self) -> float:
+        """Stream-clock time up to which audio has been analysed"""
+        return self._frame_time(0)
+
+    @property
+    def in_speech(self) -> bool:
+        return self._in_speech
+
+    @property
+    def open_segment_start(self) -> Optional[float]:
+        """Start of the segment still in progress, if the speaker is talking"""
+        return self._segment_start if self._in_speech else None
+
+    def closed_segments(self, since: float = 0.0) -> List[SpeechSegment]:
+        """Finished segments that end after `since` (oldest first)"""
+        return [s for s in self._segments if s.end > since]
+
+    def _update_noise_floor(self, frame_db: np.ndarray) -> float:
+        """Follow quiet stretches quickly and loud ones slowly"""
+        chunk_floor = float(np.percentile(frame_db, 10))
+        if self._noise_floor is None or chunk_floor < self._noise_floor:
+            self._noise_floor = chunk_floor
+        else:
+            self._noise_floor += 0.05 * (chunk_floor - self._noise_floor)
+        self._noise_floor = max(self._noise_floor, SILENCE_DBFS / 2)
+        return self._noise_floor
+
+    def _segments_from(self, speech: np.ndarray) -> List[SpeechSegment]:
+        """Turn per-frame decisions into segments, continuing any open one"""
+        states = np.concatenate(([self._in_speech], speech)).astype(np.int8)
+        edges = np.diff(states)
+        segments = []
+        for index in np.flatnonzero(edges):
+            if edges[index] > 0:
+                self._segment_start = self._frame_time(index)
+            else:
+                segment = SpeechSegment(self._segment_start, self._frame_time(index))
+                segments.append(segment)
+                self._segments.append(segment)
+        self._in_speech = bool(speech[-1])
+        if self._in_speech:
+            segments.append(SpeechSegment(self._segment_start, self._frame_time(len(speech)), closed=False))
+        return segments
+
+    def process(self, samples) -> VADResult:
+        """Analyse the next chunk of mono float audio"""
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        buffer = np.concatenate((self._tail, samples)) if self._tail.size else samples
+        if buffer.size < self.frame_len:
+            self._tail = buffer
+            return VADResult(noise_floor_dbfs=self._noise_floor if self._noise_floor is not None else SILENCE_DBFS)
+
+        # (n_frames, frame_len) view over the buffer without copying
+        frames = sliding_window_view(buffer, self.frame_len)[::self.hop]
+        n_frames = frames.shape[0]
+        self._tail = buffer[n_frames * self.hop:].copy()
+
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+        frame_db = to_dbfs(rms)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_len - 1)
+        power = np.square(np.abs(np.fft.rfft(frames * self._window, axis=1)))
+        total_power = power.sum(axis=1)
+        centroid = (power @ self._freqs) / np.maximum(total_power, EPS)
+
+        noise_floor = self._update_noise_floor(frame_db)
+        threshold = max(noise_floor + ENERGY_MARGIN_DB, ABSOLUTE_MIN_DBFS)
+        raw = (frame_db > threshold) & (zcr < 0.6) & (centroid > 150) & (centroid < 4500)
+
+        # Hangover: a frame counts as speech if any of the last `hangover` raw frames did
+        padded = np.concatenate((self._recent, raw))
+        speech = sliding_window_view(padded, self.hangover).any(axis=1)
+        self._recent = padded[len(padded) - (self.hangover - 1):]
+
+        segments = self._segments_from(speech)
+        self._frames_seen += n_frames
+
+        speech_count = int(np.count_nonzero(speech))
+        return VADResult(
+            segments=segments,
+            frame_count=n_frames,
+            speech_ratio=speech_count / n_frames,
+            rms_dbfs=float(to_dbfs(np.sqrt(np.mean(np.square(samples, dtype=np.float64))))) if samples.size else SILENCE_DBFS,
+            peak=float(np.max(np.abs(samples))) if samples.size else 0.0,
+            speech_dbfs=float(to_dbfs(np.sqrt(np.mean(np.square(rms[speech]))))) if speech_count else None,
+            noise_floor_dbfs=float(noise_floor),
+            spectral_centroid=float(np.mean(centroid[speech])) if speech_count else float(np.mean(centroid)),
+            zero_crossing_rate=float(np.mean(zcr)),
+        )
+
+    def activity(self, seconds: float) -> dict:
+        """Speaking ratio and pauses over the last `seconds` of the stream"""
+        end = self.now
+        start = max(0.0, end - seconds)
+        spans: List[Tuple[float, float]] = [
+            (max(s.start, start), s.end) for s in self._segments if s.end > start
+        ]
+        if self._in_speech:
+            spans.append((max(self._segment_start, start), end))
+
+        speaking = sum(e - s for s, e in spans)
+        gaps = [b[0] - a[1] for a, b in zip(spans, spans[1:])]
+        pauses = [g for g in gaps if g >= MIN_PAUSE_SECONDS]
+        window = end - start
+        return {
+            "speech_ratio": round(speaking / window, 3) if window > 0 else 0.0,
+            "pause_count": len(pauses),
+            "longest_pause": round(max(pauses), 2) if pauses else 0.0,
+        }
@@ -0,0 +1,334 @@
+""" Shared LLM client used by every Gemini call site """
+
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+import collections
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=".env.development")
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Client configuration
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BASE_DELAY = 0.5            # first backoff step in seconds
+LLM_MAX_DELAY = 8.0
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))    # default budget of a call, retries included
+DEFAULT_MODEL = "gemini-2.0-flash-001"
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+Contents = Union[str, Sequence[Any]]
+
+
+class LLMError(Exception):
+    """Raised when a request still fails after all retries"""
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    model: str
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    latency: float = 0.0
+    attempts: int = 1
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.output_tokens
+
+
+# -------------------
+# Backends
+# -------------------
+class GeminiBackend:
+    """google-genai async backend; one Client keeps its HTTP connections open across calls"""
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("GOOGLE_GEMINI_API_KEY")
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    async def generate(self, model: str, contents: Contents, system_instruction: Optional[str] = None,
+                       json_response: bool = False, stop_sequences: Optional[List[str]] = None) -> LLMResponse:
+        from google.genai import types
+
+        config = types.GenerateContentConfig(
+            system_instruction=system_instruction,
+            response_mime_type="application/json" if json_response else None,
+            stop_sequences=stop_sequences,
+        )
+        response = await self._get_client().aio.models.generate_content(
+            model=model,
+            contents=contents if not isinstance(contents, str) else [contents],
+            config=config,
+        )
+        usage = response.usage_metadata
+        return LLMResponse(
+            text=response.text or "",
+            model=model,
+            prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+        )
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        code = getattr(error, "code", None) or getattr(error, "status_code", None)
+        return code in RETRYABLE_STATUS
+
+
+class FakeBackend:
+    """
+    Offline backend for tests and local runs.
+
+    responder(model, contents) supplies the text (an empty JSON object by default);
+    latency and a number of leading failures can be injected.
+    """
+
+    def __init__(self, responder: Optional[Callable[[str, Contents], str]] = None,
+                 latency: float = 0.0, fail_times: int = 0):
+        self.responder = responder or (lambda model, contents: json.dumps({}))
+        self.latency = latency
+        self.fail_times = fail_times
+        self.calls = 0
+
+    async def generate(self, model: str, contents: Contents, system_instruction: Optional[str] = None,
+                       json_response: bool = False, stop_sequences: Optional[List[str]] = None) -> LLMResponse:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise ConnectionError("Fake backend failure")
+        text = self.responder(model, contents)
+        prompt = contents if isinstance(contents, str) else " ".join(str(c) for c in contents)
+        return LLMResponse(text=text, model=model, prompt_tokens=len(prompt) // 4 + 1,
+                           output_tokens=len(text) // 4 + 1)
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        return isinstance(error, ConnectionError)
+
+
+# -------------------
+# Client
+# -------------------
+class LLMClient:
+    """
+    Async LLM client shared by all call sites.
+
+    Requests run on one background event loop so the backend's HTTP connections,
+    the concurrency semaphore and in-flight bookkeeping are shared by async
+    handlers and synchronous scripts alike. Each call is bounded by the semaphore,
+    retried with full-jitter exponential backoff on transient errors, and coalesced
+    with an identical text-only request that is already in flight. A timeout is
+    the budget for the whole call, retries included; calls without one get
+    default_timeout.
+    """
+
+    def __init__(self, backend=None, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 max_retries: int = LLM_MAX_RETRIES, base_delay: float = LLM_BASE_DELAY,
+                 max_delay: float = LLM_MAX_DELAY, default_timeout: float = LLM_TIMEOUT):
+        self.backend = backend or GeminiBackend()
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.default_timeout = default_timeout
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+        self.metrics = collections.Counter()
+        self._latencies: Dict[str, collections.deque] = collections.defaultdict(
+            lambda: collections.deque(maxlen=200))
+
+    # -------------------
+    # Lifecycle
+    # -------------------
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Start the background loop thread on first use"""
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+                self._thread.start()
+                logger.info(f"Started LLM client loop ({type(self.backend).__name__}, "
+                            f"max {self.max_concurrency} concurrent requests)")
+            return self._loop
+
+    def close(self):
+        """Stop the background loop"""
+        with self._start_lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(timeout=5)
+                self._loop = None
+                self._thread = None
+                # Both belong to the stopped loop; a restarted loop creates its own
+                self._semaphore = None
+                self._in_flight = {}
+
+    # -------------------
+    # Public API
+    # -------------------
+    async def generate(self, contents: Contents, model: str = DEFAULT_MODEL, *,
+                       system_instruction: Optional[str] = None, json_response: bool = False,
+                       stop_sequences: Optional[List[str]] = None, timeout: Optional[float] = None,
+                       caller: str = "default") -> LLMResponse:
+        """Generate content from any event loop; timeout defaults to the client's default_timeout"""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(
+            self._generate(contents, model, system_instruction, json_response, stop_sequences, timeout, caller),
+            loop,
+        )
+        return await asyncio.wrap_future(future)
+
+    def generate_sync(self, contents: Contents, model: str = DEFAULT_MODEL, *,
+                      system_instruction: Optional[str] = None, json_response: bool = False,
+                      stop_sequences: Optional[List[str]] = None, timeout: Optional[float] = None,
+                      caller: str = "default") -> LLMResponse:
+        """Blocking variant for synchronous code; must not be called on the client's own loop"""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(
+            self._generate(contents, model, system_instruction, json_response, stop_sequences, timeout, caller),
+            loop,
+        )
+        return future.result()
+
+    # -------------------
+    # Internals (run on the client loop)
+    # -------------------
+    @staticmethod
+    def _request_key(contents, model, system_instruction, json_response, stop_sequences) -> Optional[str]:
+        """Key for coalescing; only plain-text requests are coalesced"""
+        parts = [contents] if isinstance(contents, str) else list(contents)
+        if not all(isinstance(part, str) for part in parts):
+            return None
+        raw = json.dumps([model, system_instruction, json_response, stop_sequences, parts])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def _generate(self, contents, model, system_instruction, json_response, stop_sequences,
+                        timeout, caller) -> LLMResponse:
+        if timeout is None:
+            timeout = self.default_timeout
+        key = self._request_key(contents, model, system_instruction, json_response, stop_sequences)
+        if key is not None and key in self._in_flight:
+            self.metrics["coalesced"] += 1
+            # The shared call runs on its owner's budget; this caller still waits no longer than its own
+            try:
+                return await asyncio.wait_for(asyncio.shield(self._in_flight[key]), timeout)
+            except asyncio.TimeoutError as e:
+                self.metrics["failures"] += 1
+                self.metrics[f"failures.{caller}"] += 1
+                raise LLMError(f"LLM call for {caller} timed out waiting for an identical request") from e
+
+        task = asyncio.ensure_future(
+            self._call_with_retries(contents, model, system_instruction, json_response, stop_sequences,
+                                    timeout, caller))
+        if key is not None:
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def _call_with_retries(self, contents, model, system_instruction, json_response, stop_sequences,
+                                 timeout, caller) -> LLMResponse:
+        """Call the backend until it succeeds, the error is permanent or the timeout budget is spent"""
+        if self._semaphore is None:
+            # Created here so it belongs to the client loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            try:
+                async with self._semaphore:
+                    self.metrics["calls"] += 1
+                    response = await asyncio.wait_for(
+                        self.backend.generate(model, contents, system_instruction=system_instruction,
+                                              json_response=json_response, stop_sequences=stop_sequences),
+                        remaining,
+                    )
+            except Exception as e:
+                last_error = e
+                retryable = isinstance(e, (asyncio.TimeoutError, ConnectionError)) or self.backend.is_retryable(e)
+                delay = self._backoff(attempt)
+                out_of_time = deadline is not None and time.monotonic() + delay >= deadline
+                if not retryable or attempt == self.max_retries or out_of_time:
+                    break
+                self.metrics["retries"] += 1
+                logger.warning(f"LLM call for {caller} failed ({e!r}); retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            response.latency = time.monotonic() - started
+            response.attempts = attempt + 1
+            self._record(caller, response)
+            return response
+
+        self.metrics["failures"] += 1
+        self.metrics[f"failures.{caller}"] += 1
+        raise LLMError(f"LLM call for {caller} failed: {last_error!r}") from last_error
+
+    def _record(self, caller: str, response: LLMResponse):
+        self.metrics["succeeded"] += 1
+        self.metrics["prompt_tokens"] += response.prompt_tokens
+        self.metrics["output_tokens"] += response.output_tokens
+        self.metrics[f"tokens.{caller}"] += response.total_tokens
+        self._latencies[caller].append(response.latency)
+        logger.info(f"LLM call for {caller} took {response.latency:.2f}s "
+                    f"({response.prompt_tokens} prompt + {response.output_tokens} output tokens)")
+
+    def stats(self) -> dict:
+        """Counters plus recent latency percentiles per caller"""
+        latency = {}
+        for caller, samples in list(self._latencies.items()):
+            ordered = sorted(samples)
+            if ordered:
+                latency[caller] = {
+                    "p50": round(ordered[len(ordered) // 2], 3),
+                    "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+                    "count": len(ordered),
+                }
+        return {
+            **dict(self.metrics),
+            "backend": type(self.backend).__name__,
+            "in_flight": len(self._in_flight),
+            "latency": latency,
+        }
+
+
+def _default_backend():
+    """LLM_BACKEND=fake runs every call site offline"""
+    if LLM_BACKEND.lower() == "fake":
+        return FakeBackend()
+    return GeminiBackend()
+
+
+# Create global instance
+llm_client = LLMClient(backend=_default_backend())
@@ -0,0 +1,211 @@
+""" Lazy loading of the ML stacks, so a worker only pays for the features it serves """
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import importlib
+import contextlib
+import importlib.abc
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated plugin names warmed up in the background at startup, e.g. "live,speech"
+WARMUP_PLUGINS = os.getenv("WARMUP_PLUGINS", "")
+
+# Seconds each module took on its first import through load() or timed_imports()
+_import_times: Dict[str, float] = {}
+_warmup_times: Dict[str, float] = {}
+_ready_after: Optional[float] = None
+
+
+def load(module_name: str) -> ModuleType:
+    """Import a module on first use, recording how long the import took"""
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    _import_times[module_name] = time.perf_counter() - started
+    logger.info(f"Loaded {module_name} in {_import_times[module_name]:.2f}s")
+    return module
+
+
+class _TimedLoader:
+    """Wraps a module's loader to record how long executing the module took"""
+
+    def __init__(self, loader, name: str, timer: "_ImportTimer"):
+        self._loader = loader
+        self._name = name
+        self._timer = timer
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        nested = self._timer.nested
+        nested.append(0.0)
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - started
+            # Timed modules imported from this one are reported on their own
+            _import_times[self._name] = elapsed - nested.pop()
+            if nested:
+                nested[-1] += elapsed
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """Finds modules through the other finders and times those whose source is under root"""
+
+    def __init__(self, root: str):
+        self.root = os.path.join(os.path.abspath(root), "")
+        self.nested = []    # per module being executed, seconds spent in timed imports it made
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.origin and spec.origin.startswith(self.root) and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, name, self)
+        return spec
+
+
+@contextlib.contextmanager
+def timed_imports(root: str):
+    """
+    Time every module under root first imported inside the block.
+
+    Each module is charged for its own code and the third-party packages it pulls
+    in, but not for the modules under root it imports, which get their own entry.
+    """
+    timer = _ImportTimer(root)
+    sys.meta_path.insert(0, timer)
+    try:
+        yield
+    finally:
+        sys.meta_path.remove(timer)
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access"""
+
+    def __init__(self, module_name: str):
+        self._module_name = module_name
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return getattr(load(self._module_name), attr)
+
+
+class LazyAttribute:
+    """Stands in for a module-level function or class, importing its module on first call"""
+
+    def __init__(self, module_name: str, attr: str):
+        self._module_name = module_name
+        self._attr = attr
+
+    def resolve(self):
+        return getattr(load(self._module_name), self._attr)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return getattr(self.resolve(), attr)
+
+
+def lazy(module_name: str) -> LazyModule:
+    return LazyModule(module_name)
+
+
+def lazy_attr(module_name: str, attr: str) -> LazyAttribute:
+    return LazyAttribute(module_name, attr)
+
+
+@dataclass(frozen=True)
+class Plugin:
+    """A feature's heavy modules, plus an optional "module:function" that loads its models"""
+    modules: Tuple[str, ...]
+    warmup: Optional[str] = None
+
+
+PLUGINS: Dict[str, Plugin] = {
+    # Recorded video analysis: torch, transformers, librosa, keybert
+    "speech": Plugin(("scripts.speech_analysis", "scripts.SpeechAnalysisObject")),
+    # Live face/audio/ASR models live in the scheduler's worker processes
+    "live": Plugin(("scripts.live_pipeline.analysis_scheduler",),
+                   warmup="scripts.live_pipeline.analysis_scheduler:warm_up"),
+    "presentations": Plugin(("scripts.powerpoint_analysis.pptx_analysis",)),
+}
+
+
+def _resolve(path: str):
+    module_name, attr = path.split(":")
+    return getattr(load(module_name), attr)
+
+
+async def warm_up(names: Iterable[str]) -> Dict[str, float]:
+    """Import the named plugins and load their models ahead of the first request"""
+    for name in names:
+        plugin = PLUGINS.get(name)
+        if plugin is None:
+            logger.warning(f"Unknown plugin {name!r}; known plugins are {sorted(PLUGINS)}")
+            continue
+        started = time.perf_counter()
+        try:
+            for module_name in plugin.modules:
+                await asyncio.to_thread(load, module_name)
+            if plugin.warmup:
+                fn = _resolve(plugin.warmup)
+                result = fn()
+                if asyncio.iscoroutine(result):
+                    await result
+            _warmup_times[name] = time.perf_counter() - started
+            logger.info(f"Warmed up plugin {name} in {_warmup_times[name]:.2f}s")
+        except Exception as e:
+            logger.error(f"Failed to warm up plugin {name}: {e}", exc_info=True)
+    return dict(_warmup_times)
+
+
+def configured_warmups() -> Tuple[str, ...]:
+    return tuple(name.strip() for name in WARMUP_PLUGINS.split(",") if name.strip())
+
+
+def mark_ready(started: float):
+    """Record how long the process took to serve requests, from a time.perf_counter() start"""
+    global _ready_after
+    _ready_after = time.perf_counter() - started
+    logger.info(f"Server ready after {_ready_after:.2f}s")
+
+
+def startup_report() -> Dict:
+    """Startup time, per-module import times and which plugins are loaded"""
+    return {
+        "ready_after": round(_ready_after, 3) if _ready_after is not None else None,
+        "imports": {name: round(seconds, 3)
+                    for name, seconds in sorted(_import_times.items(), key=lambda item: -item[1])},
+        "plugins": {
+            name: {
+                "loaded": all(module in sys.modules for module in plugin.modules),
+                "warmup": round(_warmup_times[name], 3) if name in _warmup_times else None,
+            }
+            for name, plugin in PLUGINS.items()
+        },
+    }
@@ -1,13 +1,13 @@
-import os
 import json
+import asyncio
 import io
 import base64
 import re
 import logging
 from pptx import Presentation
 from dotenv import load_dotenv
-import google.generativeai as genai
 from PIL import Image
+from scripts.llm_client import llm_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,10 +16,9 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv(dotenv_path=".env.development")
 
-# Configure Gemini
-gemini_api_key = os.getenv("GOOGLE_GEMINI_API_KEY")
-genai.configure(api_key=gemini_api_key)
-model = genai.GenerativeModel("gemini-1.5-pro-latest") 
+# Gemini model used for slide analysis (requests go through the shared LLM client)
+PPTX_ANALYSIS_MODEL = "gemini-1.5-pro-latest"
+PPTX_ANALYSIS_TIMEOUT = 120.0   # seconds for the whole multimodal call, retries included
 
 def extract_presentation_content(file_path):
     """Extract text and image content from a PowerPoint presentation."""
@@ -52,7 +51,7 @@ def extract_presentation_content(file_path):
     logger.info(f"Extracted content from {len(slides_content)} slides.")
     return slides_content
 
-def analyze_presentation_with_gemini(slides_content):
+async def analyze_presentation_with_gemini(slides_content):
     #Send slide content and images to Gemini for analysis.
     logger.info("Preparing multimodal prompt for Gemini")
 
@@ -83,7 +82,8 @@ Respond in the following JSON format:
 
     try:
         logger.info("Sending multimodal request to Gemini...")
-        response = model.generate_content(input_parts)
+        response = await llm_client.generate(input_parts, model=PPTX_ANALYSIS_MODEL,
+                                             timeout=PPTX_ANALYSIS_TIMEOUT, caller="pptx_analysis")
         response_text = response.text
 
         # Extract JSON from markdown formatting if needed
@@ -102,10 +102,11 @@ Respond in the following JSON format:
         logger.exception("Gemini Vision analysis failed.")
         return {"error": str(e)}
 
-def analyze_presentation(file_path):
+async def analyze_presentation(file_path):
     """Main function to analyze a PowerPoint presentation."""
-    slides_content = extract_presentation_content(file_path)
-    analysis_result = analyze_presentation_with_gemini(slides_content)
+    # Parsing the deck and decoding its images is blocking work; keep it off the event loop
+    slides_content = await asyncio.to_thread(extract_presentation_content, file_path)
+    analysis_result = await analyze_presentation_with_gemini(slides_content)
     return analysis_result
 
 # Example usage
@@ -113,7 +114,7 @@ if __name__ == "__main__":
     '''presentation_file = "path/to/your/ppt.pptx"
     if os.path.exists(presentation_file):
         logger.info(f"Analyzing presentation: {presentation_file}")
-        result = analyze_presentation(presentation_file)
+        result = asyncio.run(analyze_presentation(presentation_file))
         print(json.dumps(result, indent=4))
     else:
         logger.error(f"Presentation file not found: {presentation_file}")'''
@@ -7,8 +7,7 @@ import librosa
 from transformers import pipeline, WhisperProcessor, WhisperForConditionalGeneration, WhisperConfig 
 from keybert import KeyBERT
 from scipy.signal import find_peaks
-import google.generativeai as genai
-from google.genai import types
+from .llm_client import llm_client
 from dotenv import load_dotenv
 import json
 import logging
@@ -260,17 +259,13 @@ def generate_smart_report(transcript, sentiment, filler_words, emotion, keywords
     
     Provide actionable insights and suggestions for improvement.
     """
-    google_gemini_api_key = os.environ.get("GOOGLE_GEMINI_API_KEY")
-    client = genai.Client(api_key=google_gemini_api_key)
-
-    response = client.models.generate_content(
+    response = llm_client.generate_sync(
+        prompt,
         model="gemini-2.0-flash-001",
-        contents=[prompt],
-        config=types.GenerateContentConfig(
-            system_instruction="You are an expert speech coach. Provide a detailed feedback report based on the following analysis",
-            response_mime_type="application/json",
-            stop_sequences=["\n\n"],)
-
+        system_instruction="You are an expert speech coach. Provide a detailed feedback report based on the following analysis",
+        json_response=True,
+        stop_sequences=["\n\n"],
+        caller="smart_report",
     )
     print(response)
     return response.text
@@ -0,0 +1,136 @@
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from scripts.live_pipeline.feedback_service import (
+    FeedbackRequest,
+    FeedbackService,
+    RateGovernor,
+    StubLLM,
+    template_feedback,
+)
+
+SPEAKING = FeedbackRequest(emotion="happy", eye_contact="yes", posture="good",
+                           audio_quality="good", speech_share=0.5, transcript="so today we will")
+SILENT = FeedbackRequest(emotion="happy", eye_contact="yes", posture="good")
+
+
+def _service(llm=None, **kwargs):
+    governor = kwargs.pop("governor", None) or RateGovernor(qps=1000, burst=1000, tokens_per_minute=10 ** 6)
+    return FeedbackService(llm=llm or StubLLM(), governor=governor, **kwargs)
+
+
+def test_repeated_request_is_served_from_cache():
+    llm = StubLLM()
+    service = _service(llm)
+    first = service.get_feedback(SPEAKING)
+    second = service.get_feedback(SPEAKING)
+    assert first == second == StubLLM.RESPONSE
+    assert llm.calls == 1
+    assert service.stats()["hits"] == 1
+
+
+def test_ticks_with_different_transcripts_share_the_cache():
+    llm = StubLLM()
+    service = _service(llm)
+    later = FeedbackRequest(emotion="happy", eye_contact="yes", posture="good",
+                            audio_quality="good", speech_share=0.5, transcript="we will look at the results")
+    assert later == SPEAKING
+    service.get_feedback(SPEAKING)
+    assert service.get_feedback(later) == StubLLM.RESPONSE
+    assert llm.calls == 1
+    assert service.stats()["hits"] == 1
+
+
+def test_cached_response_is_a_copy():
+    service = _service()
+    service.get_feedback(SPEAKING)["voice_feedback"] = "changed"
+    assert service.get_feedback(SPEAKING)["voice_feedback"] == StubLLM.RESPONSE["voice_feedback"]
+
+
+def test_expired_entry_calls_the_llm_again():
+    llm = StubLLM()
+    service = _service(llm, ttl=0.05)
+    service.get_feedback(SPEAKING)
+    time.sleep(0.1)
+    service.get_feedback(SPEAKING)
+    assert llm.calls == 2
+
+
+def test_cache_keeps_the_most_recent_entries():
+    llm = StubLLM()
+    service = _service(llm, max_entries=1)
+    other = FeedbackRequest(emotion="sad", eye_contact="yes", posture="good", audio_quality="good")
+    service.get_feedback(SPEAKING)
+    service.get_feedback(other)
+    service.get_feedback(SPEAKING)
+    assert llm.calls == 3
+    assert service.stats()["cached"] == 1
+
+
+def test_concurrent_identical_requests_share_one_call():
+    llm = StubLLM(delay=0.2)
+    service = _service(llm)
+    start = threading.Barrier(5)
+
+    def request():
+        start.wait()
+        return service.get_feedback(SPEAKING)
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(lambda _: request(), range(5)))
+
+    assert llm.calls == 1
+    assert all(result == StubLLM.RESPONSE for result in results)
+    stats = service.stats()
+    assert stats["coalesced"] + stats["hits"] == 4
+    assert stats["in_flight"] == 0
+
+
+def test_requests_without_speech_skip_the_llm():
+    llm = StubLLM()
+    service = _service(llm)
+    assert service.get_feedback(SILENT) == template_feedback(SILENT)
+    assert llm.calls == 0
+    assert service.stats()["no_speech"] == 1
+
+
+def test_rate_limit_falls_back_to_templates():
+    llm = StubLLM()
+    service = _service(llm, governor=RateGovernor(qps=0.001, burst=1, tokens_per_minute=10 ** 6))
+    other = FeedbackRequest(emotion="sad", eye_contact="limited", posture="poor", audio_quality="low")
+    assert service.get_feedback(SPEAKING) == StubLLM.RESPONSE
+    assert service.get_feedback(other) == template_feedback(other)
+    assert llm.calls == 1
+    assert service.stats()["throttled"] == 1
+
+
+def test_token_budget_falls_back_to_templates():
+    llm = StubLLM()
+    service = _service(llm, governor=RateGovernor(qps=1000, burst=1000, tokens_per_minute=10))
+    assert service.get_feedback(SPEAKING) == template_feedback(SPEAKING)
+    assert llm.calls == 0
+    assert service.stats()["throttled"] == 1
+
+
+def test_llm_failure_falls_back_and_is_not_cached():
+    llm = StubLLM(fail=True)
+    service = _service(llm)
+    assert service.get_feedback(SPEAKING) == template_feedback(SPEAKING)
+    assert service.get_feedback(SPEAKING) == template_feedback(SPEAKING)
+    assert llm.calls == 2
+    stats = service.stats()
+    assert stats["errors"] == 2
+    assert stats["cached"] == 0
+
+
+def test_governor_corrects_the_reservation():
+    governor = RateGovernor(qps=1000, burst=1000, tokens_per_minute=1000)
+    assert governor.try_acquire(600)
+    governor.record(600, 200)
+    assert governor.tokens_last_minute == 200
+    assert governor.try_acquire(700)
+    assert not governor.try_acquire(200)
@@ -0,0 +1,151 @@
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from scripts import llm_client as llm_module
+from scripts.llm_client import FakeBackend, LLMClient, LLMError
+
+
+def _client(backend, **kwargs):
+    # Tiny backoff steps keep the retry tests fast
+    options = dict(base_delay=0.001, max_delay=0.01)
+    options.update(kwargs)
+    return LLMClient(backend=backend, **options)
+
+
+@pytest.fixture
+def make_client():
+    clients = []
+
+    def make(backend, **kwargs):
+        clients.append(_client(backend, **kwargs))
+        return clients[-1]
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def test_generate_sync_returns_backend_text(make_client):
+    backend = FakeBackend(responder=lambda model, contents: '{"ok": true}')
+    client = make_client(backend)
+    response = client.generate_sync("hello", caller="test")
+    assert response.text == '{"ok": true}'
+    assert response.attempts == 1
+    assert response.total_tokens > 0
+    stats = client.stats()
+    assert stats["succeeded"] == 1
+    assert stats["tokens.test"] == response.total_tokens
+
+
+def test_transient_failures_are_retried(make_client):
+    backend = FakeBackend(fail_times=2)
+    client = make_client(backend, max_retries=3)
+    response = client.generate_sync("hello")
+    assert response.attempts == 3
+    assert backend.calls == 3
+    assert client.stats()["retries"] == 2
+
+
+def test_gives_up_after_max_retries(make_client):
+    backend = FakeBackend(fail_times=10)
+    client = make_client(backend, max_retries=2)
+    with pytest.raises(LLMError):
+        client.generate_sync("hello", caller="test")
+    assert backend.calls == 3
+    assert client.stats()["failures.test"] == 1
+
+
+def test_permanent_errors_are_not_retried(make_client):
+    def responder(model, contents):
+        raise ValueError("bad request")
+
+    backend = FakeBackend(responder=responder)
+    client = make_client(backend, max_retries=3)
+    with pytest.raises(LLMError):
+        client.generate_sync("hello")
+    assert backend.calls == 1
+
+
+def test_timeout_is_the_budget_for_all_attempts(make_client):
+    client = make_client(FakeBackend(latency=1.0), max_retries=5)
+    started = time.monotonic()
+    with pytest.raises(LLMError):
+        client.generate_sync("hello", timeout=0.1)
+    assert time.monotonic() - started < 0.5
+
+
+def test_backoff_is_full_jitter_with_a_cap(monkeypatch):
+    client = LLMClient(backend=FakeBackend(), base_delay=0.5, max_delay=8.0)
+    bounds = []
+    monkeypatch.setattr(llm_module.random, "uniform", lambda low, high: bounds.append((low, high)) or high)
+    delays = [client._backoff(attempt) for attempt in range(6)]
+    assert bounds == [(0, 0.5), (0, 1.0), (0, 2.0), (0, 4.0), (0, 8.0), (0, 8.0)]
+    assert delays == [high for _, high in bounds]
+
+
+def test_identical_requests_in_flight_are_coalesced(make_client):
+    backend = FakeBackend(latency=0.2)
+    client = make_client(backend)
+
+    async def burst():
+        return await asyncio.gather(*(client.generate("same prompt") for _ in range(3)),
+                                    client.generate("other prompt"))
+
+    responses = asyncio.run(burst())
+    assert backend.calls == 2
+    assert client.stats()["coalesced"] == 2
+    assert len({id(r) for r in responses[:3]}) == 1
+
+
+def test_non_text_requests_are_not_coalesced(make_client):
+    backend = FakeBackend(latency=0.1)
+    client = make_client(backend)
+    image = object()
+
+    async def burst():
+        return await asyncio.gather(*(client.generate(["describe", image]) for _ in range(2)))
+
+    asyncio.run(burst())
+    assert backend.calls == 2
+    assert client.stats().get("coalesced", 0) == 0
+
+
+def test_coalesced_waiter_keeps_its_own_timeout(make_client):
+    backend = FakeBackend(latency=0.5)
+    client = make_client(backend)
+
+    async def burst():
+        owner = asyncio.ensure_future(client.generate("same prompt", timeout=2.0))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        with pytest.raises(LLMError):
+            await client.generate("same prompt", timeout=0.1)
+        waited = time.monotonic() - started
+        await owner
+        return waited
+
+    assert asyncio.run(burst()) < 0.4
+    assert backend.calls == 1
+
+
+def test_calls_without_timeout_get_the_default(make_client):
+    client = make_client(FakeBackend(latency=1.0), default_timeout=0.1, max_retries=0)
+    started = time.monotonic()
+    with pytest.raises(LLMError):
+        client.generate_sync("hello")
+    assert time.monotonic() - started < 0.5
+
+
+def test_client_restarts_after_close():
+    client = _client(FakeBackend())
+    client.generate_sync("hello")
+    client.close()
+    try:
+        assert client.generate_sync("hello again").text == "{}"
+    finally:
+        client.close()
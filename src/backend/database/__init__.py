@@ -1,2 +1,10 @@
-from . import cloud_db_controller
-__all__ = ["cloud_db_controller"]
\ No newline at end of file
+import importlib
+
+__all__ = ["cloud_db_controller"]
+
+
+def __getattr__(name):
+    # Submodules are imported on first access so the package import stays cheap
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,321 @@
+from datetime import datetime
+from typing import Optional
+from pymongo import AsyncMongoClient
+from pymongo.results import InsertOneResult, UpdateResult
+from bson.objectid import ObjectId
+
+from .mongo_pool import create_async_client, mongo_uri
+from .cloud_db_controller import build_user_session, summarize_sessions, token_digest
+from .pagination import encode_cursor, keyset_query
+
+# Fields of a presentation shown in list views; the transcript, keywords and
+# suggestions stay in the database until the detail endpoint asks for them
+PRESENTATION_SUMMARY = {
+    "title": 1,
+    "date": 1,
+    "created_at": 1,
+    "score": 1,
+    "summary": 1,
+    "video_id": 1,
+    # Scalars the progress charts are drawn from
+    "feedback_data.speech_rate.wpm": 1,
+    "feedback_data.speech_rate.assessment": 1,
+    "feedback_data.clarity.score": 1,
+    "feedback_data.sentiment.label": 1,
+    "feedback_data.sentiment.score": 1,
+    "feedback_data.filler_words.total": 1,
+    "feedback_data.grammar.score": 1,
+    "feedback_data.engagement.score": 1,
+}
+
+
+class AsyncCloudDBController:
+    """
+    Asyncio counterpart of CloudDBController for request handlers.
+
+    Methods mirror the synchronous controller's names and arguments but are awaited,
+    so a handler waiting on MongoDB yields the event loop to other requests and the
+    live WebSockets instead of blocking it.
+    """
+
+    def __init__(self, client: Optional[AsyncMongoClient] = None):
+        self.uri = mongo_uri()
+        self._client = client
+
+    @property
+    def client(self) -> AsyncMongoClient:
+        """Pooled client, created on first use inside the running event loop"""
+        if self._client is None:
+            self._client = create_async_client(self.uri)
+        return self._client
+
+    async def connect(self):
+        """Open the pooled client once and check the deployment answers"""
+        try:
+            await self.client.admin.command('ping')
+            print("Pinged your deployment. You successfully connected to MongoDB!")
+        except Exception as e:
+            print(f"Connection failed: {e}")
+        return self.client
+
+    async def close(self):
+        """Close the pooled client; only done when the application shuts down"""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def get_database(self, db_name):
+        """ Get a database from the client """
+        return self.client[db_name]
+
+    def get_collection(self, db_name, collection_name):
+        """ Get a collection from the database """
+        return self.client[db_name][collection_name]
+
+    async def add_document(self, db_name, collection_name, document) -> InsertOneResult:
+        """Add a document to the collection"""
+        return await self.client[db_name][collection_name].insert_one(document)
+
+    async def update_document(self, db_name, collection_name, filter_dict, update_dict) -> UpdateResult:
+        """Update a document in the collection based on filter criteria"""
+        return await self.client[db_name][collection_name].update_one(filter_dict, {"$set": update_dict})
+
+    async def delete_document(self, db_name, collection_name, filter_dict):
+        """Delete a document from the collection based on filter criteria"""
+        return await self.client[db_name][collection_name].delete_one(filter_dict)
+
+    async def find_document(self, db_name, collection_name, filter_dict):
+        """Find a single document in the collection based on filter criteria"""
+        return await self.client[db_name][collection_name].find_one(filter_dict)
+
+    async def find_documents(self, db_name, collection_name, filter_dict=None, projection=None, limit=0):
+        """Find multiple documents in the collection based on filter criteria"""
+        cursor = self.client[db_name][collection_name].find(filter_dict or {}, projection, limit=limit)
+        return await cursor.to_list()
+
+    async def find_latest_by_owner(self, db_name, collection_name, user_id, sort_field="upload_date", projection=None):
+        """Newest document of a user by sort_field; served by the (user_id, sort_field desc) index"""
+        return await self.client[db_name][collection_name].find_one(
+            {"user_id": user_id}, projection, sort=[(sort_field, -1)]
+        )
+
+    async def count_documents(self, db_name, collection_name, filter_dict=None):
+        """Count documents matching the filter criteria"""
+        return await self.client[db_name][collection_name].count_documents(filter_dict or {})
+
+    # -------------------
+    # Refresh Tokens
+    # -------------------
+    async def save_refresh_token(self, db_name, token_data):
+        """Save a refresh token to the database"""
+        return await self.client[db_name]["refresh_tokens"].insert_one(token_data)
+
+    async def get_refresh_token(self, db_name, token_hash):
+        """Retrieve a refresh token by its hash"""
+        return await self.client[db_name]["refresh_tokens"].find_one({"token_hash": token_hash})
+
+    async def delete_refresh_token(self, db_name, token_hash):
+        """Delete a specific refresh token"""
+        return await self.client[db_name]["refresh_tokens"].delete_one({"token_hash": token_hash})
+
+    # -------------------
+    # Revocation and Blacklisting
+    # -------------------
+    async def revoke_token(self, db_name, token, expires_at, reason=None):
+        """Revoke a token by adding its digest to the revoked_tokens collection"""
+        return await self.client[db_name]["revoked_tokens"].insert_one({
+            "token_hash": token_digest(token),
+            "expires_at": expires_at,
+            "reason": reason,
+            "revoked_at": datetime.utcnow(),
+            "type": "revoked"
+        })
+
+    async def is_token_revoked(self, db_name, token):
+        """Check if a token has been revoked"""
+        # Entries written before tokens were stored by digest expire with the tokens themselves
+        return await self.client[db_name]["revoked_tokens"].find_one(
+            {"$or": [{"token_hash": token_digest(token)}, {"token": token}]}
+        )
+
+    async def find_revocations(self, db_name, since_id=None):
+        """Digests of tokens revoked at or after the ObjectId since_id, or of all revoked tokens"""
+        filter_dict = {"_id": {"$gte": since_id}} if since_id is not None else {}
+        entries = await self.client[db_name]["revoked_tokens"].find(
+            filter_dict, {"token_hash": 1, "token": 1}
+        ).to_list()
+        return [(entry["_id"], entry.get("token_hash") or token_digest(entry["token"]))
+                for entry in entries if entry.get("token_hash") or entry.get("token")]
+
+    async def blacklist_token(self, db_name, token, expires_at, reason="blacklisted"):
+        """Blacklist a token with a specific reason"""
+        return await self.client[db_name]["revoked_tokens"].insert_one({
+            "token_hash": token_digest(token),
+            "expires_at": expires_at,
+            "reason": reason,
+            "revoked_at": datetime.utcnow(),
+            "type": "blacklist"
+        })
+
+    async def revoke_all_user_tokens(self, db_name, user_id, reason="password_change"):
+        """Revoke all refresh tokens for a user (cascade revocation)"""
+        try:
+            db = self.client[db_name]
+            now = datetime.now()
+            revoked = [{
+                "token_hash": token_doc["token_hash"],
+                "user_id": user_id,
+                "revoked_at": now,
+                "expires_at": token_doc["expires_at"],
+                "reason": reason
+            } async for token_doc in db["refresh_tokens"].find(
+                {"user_id": user_id}, {"token_hash": 1, "expires_at": 1}
+            ) if token_doc.get("token_hash") and token_doc.get("expires_at")]
+            if revoked:
+                await db["revoked_tokens"].insert_many(revoked)
+
+            # Delete all refresh tokens for the user and terminate all sessions
+            result = await db["refresh_tokens"].delete_many({"user_id": user_id})
+            await db["sessions"].delete_many({"user_id": user_id})
+
+            return result.deleted_count
+        except Exception as e:
+            print(f"Error revoking all user tokens: {str(e)}")
+            return 0
+
+    # -------------------
+    # Session Management
+    # -------------------
+    async def create_session(self, db_name, session_data):
+        """Create a new user session"""
+        return await self.client[db_name]["sessions"].insert_one(session_data)
+
+    async def get_sessions_for_user(self, db_name, user_id):
+        """Get all active sessions for a user"""
+        return await self.client[db_name]["sessions"].find({"user_id": user_id}).to_list()
+
+    async def delete_session(self, db_name, session_id):
+        """Delete a specific session"""
+        return await self.client[db_name]["sessions"].delete_one({"session_id": session_id})
+
+    async def delete_all_sessions_for_user(self, db_name, user_id):
+        """Delete all sessions for a specific user"""
+        return await self.client[db_name]["sessions"].delete_many({"user_id": user_id})
+
+    async def create_user_session(self, db_name, user_id, ip_address, device_info, location=None):
+        """Create a new user session with enhanced analytics"""
+        try:
+            session = build_user_session(user_id, ip_address, device_info, location)
+            await self.client[db_name]["sessions"].insert_one(session)
+            return session["session_id"]
+        except Exception as e:
+            print(f"Error creating user session: {str(e)}")
+            return None
+
+    async def get_user_session_analytics(self, db_name, user_id):
+        """Get detailed session analytics for a user"""
+        try:
+            sessions = await self.client[db_name]["sessions"].find(
+                {"user_id": user_id},
+                sort=[("created_at", -1)]
+            ).to_list()
+            return summarize_sessions(sessions)
+        except Exception as e:
+            print(f"Error getting user session analytics: {str(e)}")
+            return {}
+
+    async def get_user_recent_sessions(self, db_name, user_id, limit=5):
+        """Get the most recent sessions for a user"""
+        try:
+            return await self.client[db_name]["sessions"].find(
+                {"user_id": user_id},
+                sort=[("created_at", -1)],
+                limit=limit
+            ).to_list()
+        except Exception as e:
+            print(f"Error getting recent user sessions: {str(e)}")
+            return []
+
+    async def record_security_event(self, db_name, event_data):
+        """Record a security event for auditing and monitoring"""
+        try:
+            # The collection and its index are created at startup by database.indexes
+            if "timestamp" not in event_data:
+                event_data["timestamp"] = datetime.now()
+
+            result = await self.client[db_name]["security_events"].insert_one(event_data)
+            return result.inserted_id
+        except Exception as e:
+            print(f"Error recording security event: {str(e)}")
+            return None
+
+    async def record_security_events(self, db_name, events):
+        """Record a batch of security events with one insert_many; returns the number written"""
+        if not events:
+            return 0
+        for event in events:
+            event.setdefault("timestamp", datetime.now())
+        result = await self.client[db_name]["security_events"].insert_many(events, ordered=False)
+        return len(result.inserted_ids)
+
+    # -------------------
+    # Presentations Management
+    # -------------------
+    async def get_user_presentations(self, db_name, user_id, limit=0, skip=0, sort_by=None):
+        """Get all presentations for a specific user with pagination and sorting"""
+        try:
+            sort_options = [("created_at", -1)]  # Default sort by creation date, newest first
+            if sort_by:
+                sort_options = [sort_by]
+
+            cursor = self.client[db_name]["presentations"].find(
+                {"user_id": user_id}
+            ).sort(sort_options)
+
+            if skip:
+                cursor = cursor.skip(skip)
+            if limit:
+                cursor = cursor.limit(limit)
+
+            return await cursor.to_list()
+        except Exception as e:
+            print(f"Error getting user presentations: {str(e)}")
+            return []
+
+    async def list_user_presentations(self, db_name, user_id, limit=10, sort_by=("created_at", -1),
+                                      cursor=None, projection=PRESENTATION_SUMMARY):
+        """
+        One page of a user's presentations as summaries, and the cursor of the next page.
+
+        Pages continue after the previous page's last (sort value, _id) instead of
+        skipping, so every page costs the same index range scan. A limit of 0 returns
+        everything with no cursor. Raises ValueError for a cursor from another sort.
+        """
+        field, direction = sort_by
+        filter_dict, sort = keyset_query({"user_id": user_id}, field, direction, cursor)
+        presentations = await self.client[db_name]["presentations"].find(
+            filter_dict, projection, sort=sort, limit=limit + 1 if limit else 0
+        ).to_list()
+
+        next_cursor = None
+        if limit and len(presentations) > limit:
+            presentations = presentations[:limit]
+            next_cursor = encode_cursor(presentations[-1], field, direction)
+        return presentations, next_cursor
+
+    async def get_presentation_by_id(self, db_name, presentation_id):
+        """Get a specific presentation by ID"""
+        try:
+            return await self.client[db_name]["presentations"].find_one({"_id": ObjectId(presentation_id)})
+        except Exception as e:
+            print(f"Error getting presentation: {str(e)}")
+            return None
+
+
+# Create global instance
+async_db_controller = AsyncCloudDBController()
+
+
+def get_async_db() -> AsyncCloudDBController:
+    """FastAPI dependency returning the application's asyncio database controller"""
+    return async_db_controller
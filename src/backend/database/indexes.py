@@ -0,0 +1,112 @@
+import os
+import logging
+from typing import Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+DB_NAME = "JagCoaching"
+# Set to "false" to skip index creation at startup, e.g. when a migration job owns the schema
+ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "true").lower() == "true"
+
+# Every index the application's queries rely on. create_indexes is a no-op for
+# indexes that already exist with the same spec, so this runs on every startup.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("username", ASCENDING)], name="username"),
+    ],
+    "revoked_tokens": [
+        IndexModel([("token", ASCENDING)], name="token"),
+        IndexModel([("token_hash", ASCENDING)], name="token_hash"),
+        # Revocations only matter until the token itself expires
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "refresh_tokens": [
+        IndexModel([("token_hash", ASCENDING)], name="token_hash"),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "sessions": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_created"),
+        IndexModel([("session_id", ASCENDING)], name="session_id"),
+    ],
+    "security_events": [
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)], name="user_timestamp"),
+    ],
+    # _id is the keyset tie-breaker of the list pages, so it is part of the sort
+    "presentations": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_created_id"),
+        IndexModel([("user_id", ASCENDING), ("score", DESCENDING), ("_id", DESCENDING)], name="user_score_id"),
+    ],
+    "presentations_analysis": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_created"),
+    ],
+    # Latest upload of a user, when the analysis request names a file that is gone
+    "videos": [
+        IndexModel([("user_id", ASCENDING), ("upload_date", DESCENDING)], name="user_uploaded"),
+    ],
+    "presentations_files": [
+        IndexModel([("user_id", ASCENDING), ("upload_date", DESCENDING)], name="user_uploaded"),
+    ],
+}
+
+# (collection, filter, sort) of the queries on the request path; each must be served by an index
+HOT_QUERIES: List[Tuple[str, Dict, List]] = [
+    ("users", {"username": "user@example.com"}, []),
+    ("users", {"email": "user@example.com"}, []),
+    ("revoked_tokens", {"$or": [{"token_hash": "hash"}, {"token": "token"}]}, []),
+    ("revoked_tokens", {"_id": {"$gte": "watermark"}}, []),
+    ("refresh_tokens", {"token_hash": "hash"}, []),
+    ("refresh_tokens", {"user_id": "user"}, []),
+    ("sessions", {"user_id": "user"}, [("created_at", DESCENDING)]),
+    ("sessions", {"session_id": "session"}, []),
+    ("presentations", {"user_id": "user"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("presentations", {"user_id": "user"}, [("created_at", ASCENDING), ("_id", ASCENDING)]),
+    ("presentations", {"user_id": "user"}, [("score", DESCENDING), ("_id", DESCENDING)]),
+    ("presentations", {"user_id": "user"}, [("score", ASCENDING), ("_id", ASCENDING)]),
+    ("presentations_analysis", {"user_id": "user"}, [("created_at", DESCENDING)]),
+    ("videos", {"user_id": "user"}, [("upload_date", DESCENDING)]),
+    ("presentations_files", {"user_id": "user"}, [("upload_date", DESCENDING)]),
+]
+
+
+async def ensure_indexes(database) -> Dict[str, List[str]]:
+    """Create any missing indexes on an async database handle; returns index names per collection"""
+    created = {}
+    for collection, models in INDEXES.items():
+        try:
+            created[collection] = await database[collection].create_indexes(models)
+        except OperationFailure as e:
+            # An existing index with the same keys but other options; leave it for a manual migration
+            logger.error(f"Could not create indexes on {collection}: {e}")
+    logger.info(f"Ensured MongoDB indexes on {len(created)} collections")
+    return created
+
+
+def plan_stages(plan: Dict) -> List[str]:
+    """Every stage name in an explain() query plan, depth first"""
+    stages = [plan["stage"]] if "stage" in plan else []
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages.extend(plan_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(plan_stages(child))
+    return stages
+
+
+async def collection_scans(database) -> List[Tuple[str, Dict, List]]:
+    """The hot queries whose winning plan scans a whole collection"""
+    scans = []
+    for collection, filter_dict, sort in HOT_QUERIES:
+        cursor = database[collection].find(filter_dict).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        if "COLLSCAN" in plan_stages(explanation["queryPlanner"]["winningPlan"]):
+            scans.append((collection, filter_dict, sort))
+    for collection, filter_dict, sort in scans:
+        logger.warning(f"Query on {collection} {filter_dict} sorted by {sort} does a COLLSCAN")
+    return scans
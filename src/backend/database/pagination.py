@@ -0,0 +1,49 @@
+""" Keyset pagination: pages continue from the last (sort value, _id) seen instead of skipping rows """
+
+import base64
+from typing import Dict, List, Optional, Tuple
+
+from bson import json_util
+
+
+def encode_cursor(document: Dict, field: str, direction: int) -> str:
+    """Opaque token for the page after document; records the sort so it can't be reused with another"""
+    payload = json_util.dumps([field, direction, document.get(field), document["_id"]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, field: str, direction: int) -> Tuple:
+    """(sort value, _id) of a cursor from encode_cursor; raises ValueError if it is malformed or for another sort"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_field, cursor_direction, value, last_id = json_util.loads(base64.urlsafe_b64decode(padded))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}") from e
+    if (cursor_field, cursor_direction) != (field, direction):
+        raise ValueError("Cursor was issued for a different sort order")
+    return value, last_id
+
+
+def keyset_query(filter_dict: Dict, field: str, direction: int,
+                 cursor: Optional[str] = None) -> Tuple[Dict, List]:
+    """
+    Filter and sort for the page after cursor, ordered by field then _id.
+
+    Documents without the field sort as null, which MongoDB places before every
+    value ascending and after every value descending; range operators never match
+    null, so those documents are added back explicitly.
+    """
+    sort = [(field, direction), ("_id", direction)]
+    if cursor is None:
+        return filter_dict, sort
+
+    value, last_id = decode_cursor(cursor, field, direction)
+    beyond = "$gt" if direction > 0 else "$lt"
+    same_value = {field: value, "_id": {beyond: last_id}}
+    if value is None:
+        after = [same_value, {field: {"$ne": None}}] if direction > 0 else [same_value]
+    else:
+        after = [{field: {beyond: value}}, same_value]
+        if direction < 0:
+            after.append({field: None})
+    return {**filter_dict, "$or": after}, sort
@@ -0,0 +1,146 @@
+import os
+import time
+import asyncio
+import logging
+import collections
+from typing import Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from .cloud_db_controller import CloudDBController
+
+logger = logging.getLogger(__name__)
+
+# Archive configuration
+ARCHIVE_DB = "JagCoaching"
+ARCHIVE_COLLECTION = "live_sessions"
+ARCHIVE_BATCH_SIZE = int(os.getenv("LIVE_ARCHIVE_BATCH_SIZE", "100"))
+ARCHIVE_FLUSH_INTERVAL = 2.0    # seconds a partial batch waits for more sessions
+ARCHIVE_QUEUE_SIZE = 5000       # sessions held in memory before new ones are dropped
+ARCHIVE_MAX_ATTEMPTS = 3
+DUPLICATE_KEY = 11000
+
+
+class SessionArchiver:
+    """
+    Buffered writer for finished live sessions.
+
+    archive() only enqueues; a single background task collects documents until a
+    batch is full or the flush interval has passed and writes them with one
+    unordered insert_many. Many sessions ending together therefore cost a few bulk
+    inserts. Only the documents a failed write did not store are retried, and a
+    duplicate key on retry means an earlier attempt already stored the document.
+    """
+
+    def __init__(self, db: Optional[CloudDBController] = None, batch_size: int = ARCHIVE_BATCH_SIZE,
+                 flush_interval: float = ARCHIVE_FLUSH_INTERVAL, queue_size: int = ARCHIVE_QUEUE_SIZE):
+        self._db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = collections.Counter()
+
+    @property
+    def db(self) -> CloudDBController:
+        if self._db is None:
+            self._db = CloudDBController()
+        return self._db
+
+    async def start(self, db: Optional[CloudDBController] = None):
+        if db is not None:
+            self._db = db
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._run())
+
+    def archive(self, document: Dict) -> bool:
+        """Queue a finished session for writing; returns False if it had to be dropped"""
+        if self._queue is None:
+            logger.warning(f"Session archiver not started; dropping session {document.get('session_id')}")
+            self.metrics["dropped"] += 1
+            return False
+        try:
+            self._queue.put_nowait(document)
+            self.metrics["queued"] += 1
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Archive queue full; dropping session {document.get('session_id')}")
+            self.metrics["dropped"] += 1
+            return False
+
+    async def _next_batch(self) -> List[Dict]:
+        """Wait for one document, then gather more until the batch is full or the interval ends"""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: List[Dict]):
+        pending = batch
+        for attempt in range(1, ARCHIVE_MAX_ATTEMPTS + 1):
+            started = time.monotonic()
+            try:
+                await asyncio.to_thread(self.db.bulk_insert, ARCHIVE_DB, ARCHIVE_COLLECTION, pending, False)
+                written, remaining = len(pending), []
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                retry = sorted(error["index"] for error in errors if error.get("code") != DUPLICATE_KEY)
+                written, remaining = e.details.get("nInserted", 0), [pending[i] for i in retry]
+                self.metrics["duplicates"] += len(errors) - len(retry)
+                logger.error(f"Archiving {len(pending)} live sessions left {len(retry)} unwritten (attempt {attempt})")
+            except Exception as e:
+                written, remaining = 0, pending
+                logger.error(f"Archiving {len(pending)} live sessions failed (attempt {attempt}): {e}")
+            if written:
+                self.metrics["batches"] += 1
+                self.metrics["written"] += written
+                logger.info(f"Archived {written} live sessions in {time.monotonic() - started:.2f}s")
+            pending = remaining
+            if not pending:
+                return
+            if attempt < ARCHIVE_MAX_ATTEMPTS:
+                await asyncio.sleep(attempt)
+        self.metrics["failed"] += len(pending)
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def close(self, timeout: float = 10.0):
+        """Flush queued sessions, then stop the writer"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopped archiving with {self._queue.qsize()} live sessions unwritten")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            **dict(self.metrics),
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+# Create global instance
+session_archiver = SessionArchiver()
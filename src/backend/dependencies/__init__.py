@@ -2,17 +2,11 @@
 Dependencies module for JagCoaching backend.
 
 This module contains dependency functions used across the application,
-primarily for authentication and user verification.
+primarily for authentication and user verification. They are imported from
+.auth on first access, so importing the package stays cheap.
 """
 
-from .auth import (
-    get_current_user,
-    get_password_hash,
-    verify_password,
-    create_access_token,
-    authenticate_user
-    
-)
+import importlib
 
 __all__ = [
     "get_current_user",
@@ -20,4 +14,10 @@ __all__ = [
     "verify_password",
     "create_access_token",
     "authenticate_user"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return getattr(importlib.import_module(".auth", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,19 +1,22 @@
 from datetime import datetime, timedelta, timezone
 import os
-from typing import Annotated, Optional
-from fastapi import Depends, HTTPException, status, APIRouter, Request  # Added Request
+from typing import Annotated, Optional, Tuple
+from fastapi import Depends, Header, HTTPException, status, APIRouter, Request  # Added Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 import bcrypt
 bcrypt.__about__ = bcrypt # some bug with passlib and bcrypt
-from passlib.context import CryptContext
 from dotenv import load_dotenv
-from database.cloud_db_controller import CloudDBController
+from database.async_db_controller import AsyncCloudDBController, async_db_controller, get_async_db
 from models.user_models import TokenData, UserLogin, UserResponse, User
+from .auth_cache import auth_cache
+from .revocation_filter import revocation_filter
+from .security_events import security_monitor
+from .rate_limiter import rate_limiter
+from .password_hasher import PasswordHasherBusy, password_hasher
 import secrets
 import hashlib
 from uuid import uuid4  # Added for session IDs
-import time  # Added for rate limiting
 import logging
 import json  # For logging
 from bson import ObjectId
@@ -33,34 +36,71 @@ SECRET_KEY = os.getenv("SECRET_KEY","8aff34e1-d330-4eb8-b4be-5d35f5885451")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 14  # 2 weeks for refresh tokens
+INTERNAL_METRICS_TOKEN = os.getenv("INTERNAL_METRICS_TOKEN")  # unset disables the metrics endpoints
 
-# Rate limiting configuration
-MAX_FAILED_ATTEMPTS = 5
-RATE_LIMIT_WINDOW = 15 * 60  # 15 minutes in seconds
-failed_attempts = {}  # IP -> {count: int, first_attempt: timestamp}
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt runs on the password hasher's own thread pool, never on the event loop
+pwd_context = password_hasher.context
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token",auto_error=False)
 
 
 router = APIRouter()
 
-DB_CONNECTION = CloudDBController()
+# The application's pooled controller, also handed to handlers through get_async_db
+DB_CONNECTION = async_db_controller
 
 # PHASE 4: MAX SESSION LIMIT
 MAX_SESSIONS_PER_USER = 5
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in requests. Please try again shortly.",
+        headers={"Retry-After": "1"}
+    )
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy as e:
+        raise _hasher_busy() from e
     except Exception as e:
         print(f"Password verification error: {str(e)}")
         return False
 
-def get_password_hash(password):
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """ Verify a password; the second value is a new hash when the stored one uses an outdated cost."""
+    try:
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
+    except PasswordHasherBusy as e:
+        raise _hasher_busy() from e
+    except Exception as e:
+        print(f"Password verification error: {str(e)}")
+        return False, None
+
+async def get_password_hash(password):
     """ Hash the given password."""
-    return pwd_context.hash(password)
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy as e:
+        raise _hasher_busy() from e
+
+async def upgrade_password_hash(db: AsyncCloudDBController, user: dict, new_hash: Optional[str]):
+    """ Replace a user's outdated password hash after a successful login."""
+    if not new_hash:
+        return
+    try:
+        # Matching the old hash leaves a password changed in the meantime alone
+        await db.update_document(
+            "JagCoaching",
+            "users",
+            {"_id": user["_id"], "password": user.get("password")},
+            {"password": new_hash}
+        )
+        user["password"] = new_hash
+        logger.info(f"Upgraded password hash of user {user['_id']}")
+    except Exception as e:
+        logger.error(f"Failed to upgrade password hash of user {user['_id']}: {e}")
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -83,11 +123,11 @@ def hash_refresh_token(token: str):
     """Hash a refresh token for secure storage"""
     return hashlib.sha256(token.encode()).hexdigest()
 
-def save_refresh_token_to_db(user_id: str, refresh_token: str, device_info: Optional[dict] = None):
+async def save_refresh_token_to_db(user_id: str, refresh_token: str, device_info: Optional[dict] = None):
     """Save a refresh token to the database"""
     token_hash = hash_refresh_token(refresh_token)
     expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    DB_CONNECTION.save_refresh_token("JagCoaching", {
+    await DB_CONNECTION.save_refresh_token("JagCoaching", {
         "user_id": user_id,
         "token_hash": token_hash,
         "expires_at": expires_at,
@@ -96,18 +136,18 @@ def save_refresh_token_to_db(user_id: str, refresh_token: str, device_info: Opti
     })
 
 # Phase 4: Enforce Max Sessions Per User
-def enforce_max_sessions(user_id: str):
+async def enforce_max_sessions(user_id: str):
     """Ensure user doesn't exceed maximum allowed sessions"""
-    sessions = DB_CONNECTION.get_sessions_for_user("JagCoaching", user_id)
+    sessions = await DB_CONNECTION.get_sessions_for_user("JagCoaching", user_id)
     if len(sessions) >= MAX_SESSIONS_PER_USER:
         sessions_sorted = sorted(sessions, key=lambda x: x.get("created_at"))
         for old_session in sessions_sorted[:len(sessions) - MAX_SESSIONS_PER_USER + 1]:
-            DB_CONNECTION.delete_session("JagCoaching", old_session["session_id"])
+            await DB_CONNECTION.delete_session("JagCoaching", old_session["session_id"])
 
 # Phase 4: Enhanced Session Helpers
-def create_user_session(user_id: str, ip_address: Optional[str] = None, device_info: Optional[dict] = None):
+async def create_user_session(user_id: str, ip_address: Optional[str] = None, device_info: Optional[dict] = None):
     """Create a new user session with tracking information"""
-    enforce_max_sessions(user_id)  # enforce before session creation
+    await enforce_max_sessions(user_id)  # enforce before session creation
     session_data = {
         "session_id": str(uuid4()),
         "user_id": user_id,
@@ -116,23 +156,24 @@ def create_user_session(user_id: str, ip_address: Optional[str] = None, device_i
         "created_at": datetime.utcnow(),
         "last_active": datetime.utcnow()
     }
-    DB_CONNECTION.create_session("JagCoaching", session_data)
+    await DB_CONNECTION.create_session("JagCoaching", session_data)
     return session_data["session_id"]
 
-def get_user_sessions(user_id: str):
+async def get_user_sessions(user_id: str):
     """Get all active sessions for a user"""
-    return DB_CONNECTION.get_sessions_for_user("JagCoaching", user_id)
+    return await DB_CONNECTION.get_sessions_for_user("JagCoaching", user_id)
 
-def terminate_session(session_id: str):
+async def terminate_session(session_id: str):
     """End a specific user session"""
-    return DB_CONNECTION.delete_session("JagCoaching", session_id)
+    return await DB_CONNECTION.delete_session("JagCoaching", session_id)
 
-def terminate_all_user_sessions(user_id: str):
+async def terminate_all_user_sessions(user_id: str):
     """End all sessions for a specific user"""
-    return DB_CONNECTION.delete_all_sessions_for_user("JagCoaching", user_id)
+    return await DB_CONNECTION.delete_all_sessions_for_user("JagCoaching", user_id)
 
 
-async def get_current_user(request: Request = None, token: str = Depends(oauth2_scheme)):
+async def get_current_user(request: Request = None, token: str = Depends(oauth2_scheme),
+                           db: AsyncCloudDBController = Depends(get_async_db)):
     """Get the current user from the token."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -149,18 +190,29 @@ async def get_current_user(request: Request = None, token: str = Depends(oauth2_
         user_agent = request.headers.get("user-agent")
     
     # Check if IP is rate limited
-    if check_rate_limit(ip_address):
+    if await check_rate_limit(ip_address):
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Too many failed attempts. Please try again later."
         )
     
+    if token is None:
+        raise credentials_exception
+    
+    # A token verified moments ago needs no database round trip, unless it has since been revoked
+    context = auth_cache.get(token)
+    if context is not None and revocation_filter.known_revoked(token):
+        auth_cache.invalidate_token(token)
+        context = None
+    if context is not None:
+        if request and (context.ip_address, context.user_agent) != (ip_address, user_agent):
+            security_monitor.observe(context.user_id, ip_address, user_agent)
+            context.ip_address, context.user_agent = ip_address, user_agent
+        return context.user
+    
     try:
-        if token is None:
-            raise credentials_exception
-            
-        # Check if token is revoked or blacklisted
-        revoked_entry = DB_CONNECTION.is_token_revoked("JagCoaching", token)
+        # Check if token is revoked or blacklisted; the database is only asked about filter hits
+        revoked_entry = await revocation_filter.lookup(db, token)
         if revoked_entry:
             reason = revoked_entry.get("reason", "revoked")
             token_type = revoked_entry.get("type", "revoked")
@@ -172,20 +224,21 @@ async def get_current_user(request: Request = None, token: str = Depends(oauth2_
         username: str = payload.get("sub")
         if username is None:
             print("username is none")
-            record_failed_attempt(ip_address)
+            await record_failed_attempt(ip_address)
             raise credentials_exception
         token_data = TokenData(username=username)
     except JWTError as exc:
         print("jwt error")
-        record_failed_attempt(ip_address)
+        await record_failed_attempt(ip_address)
         raise credentials_exception from exc
     
-    user = get_user(db=DB_CONNECTION, username=token_data.username)
+    user = await get_user(db=db, username=token_data.username)
     
-    # Check for suspicious activity
+    # Check for suspicious activity in the background; the request does not wait for it
     if user and request:
-        detect_suspicious_activity(str(user["_id"]), ip_address, user_agent)
+        security_monitor.observe(str(user["_id"]), ip_address, user_agent)
     
+    auth_cache.put(token, user, payload.get("exp"), ip_address, user_agent)
     return user
 
 
@@ -196,10 +249,16 @@ def get_current_active_user(current_user: Annotated[User, Depends(get_current_us
     return current_user
 
 
-def get_user(db: CloudDBController, username: str):
+def require_internal_access(x_internal_token: Optional[str] = Header(None)):
+    """Admit operational metrics requests that carry INTERNAL_METRICS_TOKEN in X-Internal-Token."""
+    if not (INTERNAL_METRICS_TOKEN and x_internal_token
+            and secrets.compare_digest(x_internal_token.encode(), INTERNAL_METRICS_TOKEN.encode())):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Internal endpoint")
+
+
+async def get_user(db: AsyncCloudDBController, username: str):
     """ Get the user from the database."""
-    db.connect()
-    user = db.find_document(db_name="JagCoaching", collection_name="users", filter_dict={"username": username})
+    user = await db.find_document(db_name="JagCoaching", collection_name="users", filter_dict={"username": username})
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -207,18 +266,20 @@ def get_user(db: CloudDBController, username: str):
         )
     return user
 
-def authenticate_user(db: CloudDBController, email: str, password: str):
+async def authenticate_user(db: AsyncCloudDBController, email: str, password: str):
     try:
-        user = db.find_document("JagCoaching", "users", {"email": email})
+        user = await db.find_document("JagCoaching", "users", {"email": email})
         if not user:
             print(f"User not found: {email}")
             return False
             
         print(f"Found user document: {user}")
         
-        if not verify_password(password, user.get('password', '')):
+        valid, new_hash = await verify_and_update_password(password, user.get('password', ''))
+        if not valid:
             print("Password verification failed")
             return False
+        await upgrade_password_hash(db, user, new_hash)
             
         return user
     except Exception as e:
@@ -226,101 +287,24 @@ def authenticate_user(db: CloudDBController, email: str, password: str):
         return False
 
 # Add this function for rate limiting
-def check_rate_limit(ip_address: str) -> bool:
+async def check_rate_limit(ip_address: str) -> bool:
     """
     Check if the IP address has exceeded the rate limit for failed attempts.
     Returns True if rate limited, False otherwise.
     """
-    current_time = time.time()
-    
-    # Clean up expired entries
-    expired = [ip for ip, data in failed_attempts.items() 
-               if current_time - data['first_attempt'] > RATE_LIMIT_WINDOW]
-    for ip in expired:
-        del failed_attempts[ip]
-    
-    # Check if IP is already rate limited
-    if ip_address in failed_attempts:
-        data = failed_attempts[ip_address]
-        # If window has expired, reset the counter
-        if current_time - data['first_attempt'] > RATE_LIMIT_WINDOW:
-            failed_attempts[ip_address] = {'count': 1, 'first_attempt': current_time}
-            return False
-        # If too many attempts, rate limit
-        if data['count'] >= MAX_FAILED_ATTEMPTS:
-            return True
-        # Otherwise increment the counter
-        data['count'] += 1
-        return False
-    else:
-        # First attempt from this IP
-        failed_attempts[ip_address] = {'count': 1, 'first_attempt': current_time}
-        return False
+    return await rate_limiter.is_limited(ip_address)
 
-def record_failed_attempt(ip_address: str):
+async def record_failed_attempt(ip_address: str):
     """Record a failed token attempt for rate limiting"""
-    current_time = time.time()
-    if ip_address in failed_attempts:
-        failed_attempts[ip_address]['count'] += 1
-    else:
-        failed_attempts[ip_address] = {'count': 1, 'first_attempt': current_time}
+    count = await rate_limiter.hit(ip_address)
     
     # Log suspicious activity if multiple failures
-    if failed_attempts[ip_address]['count'] >= 3:
+    if count >= 3:
         logger.warning(f"Multiple failed token attempts from IP: {ip_address}, " 
-                      f"count: {failed_attempts[ip_address]['count']}")
-
-# Add this function for suspicious activity detection
-def detect_suspicious_activity(user_id: str, ip_address: str, user_agent: str = None):
-    """
-    Detect suspicious token usage patterns and log them.
-    """
-    # Get user's recent sessions
-    recent_sessions = DB_CONNECTION.get_user_recent_sessions("JagCoaching", user_id, limit=5)
-    
-    suspicious = False
-    reason = []
-    
-    # Check for unusual IP address
-    known_ips = [session.get('ip_address') for session in recent_sessions 
-                if session.get('ip_address')]
-    
-    if known_ips and ip_address not in known_ips:
-        suspicious = True
-        reason.append(f"New IP address: {ip_address}")
-    
-    # Check for unusual user agent if provided
-    if user_agent:
-        known_agents = []
-        for session in recent_sessions:
-            device_info = session.get('device_info', {})
-            if device_info and 'user_agent' in device_info:
-                known_agents.append(device_info['user_agent'])
-        
-        if known_agents and user_agent not in known_agents:
-            suspicious = True
-            reason.append(f"New user agent: {user_agent}")
-    
-    # Check for rapid location changes (would require GeoIP lookup)
-    # This is a placeholder for more sophisticated checks
-    
-    # Log suspicious activity
-    if suspicious:
-        logger.warning(f"SUSPICIOUS TOKEN USAGE: User {user_id}, Reasons: {', '.join(reason)}")
-        
-        # Record the suspicious activity in the database
-        DB_CONNECTION.record_security_event("JagCoaching", {
-            "user_id": user_id,
-            "event_type": "suspicious_token_usage",
-            "ip_address": ip_address,
-            "user_agent": user_agent,
-            "reasons": reason,
-            "timestamp": datetime.now()
-        })
-    
-    return suspicious
+                      f"count: {count}")
 
-async def get_current_active_user_with_refresh(token: str = Depends(oauth2_scheme)):
+async def get_current_active_user_with_refresh(token: str = Depends(oauth2_scheme),
+                                               db: AsyncCloudDBController = Depends(get_async_db)):
     """
     Get the current active user with token refresh capability
     """
@@ -334,8 +318,7 @@ async def get_current_active_user_with_refresh(token: str = Depends(oauth2_schem
         exp = payload.get("exp")
         if exp and (datetime.fromtimestamp(exp) - datetime.utcnow()).total_seconds() < 300:
             # Token is about to expire, refresh it
-            DB_CONNECTION.connect()
-            user = DB_CONNECTION.find_document("JagCoaching", "users", {"_id": ObjectId(user_id)})
+            user = await db.find_document("JagCoaching", "users", {"_id": ObjectId(user_id)})
             if not user:
                 raise HTTPException(status_code=404, detail="User not found")
             
@@ -346,8 +329,7 @@ async def get_current_active_user_with_refresh(token: str = Depends(oauth2_schem
             return {"user": user, "new_token": access_token}
         
         # Token is still valid
-        DB_CONNECTION.connect()
-        user = DB_CONNECTION.find_document("JagCoaching", "users", {"_id": ObjectId(user_id)})
+        user = await db.find_document("JagCoaching", "users", {"_id": ObjectId(user_id)})
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -364,6 +346,3 @@ async def get_current_active_user_with_refresh(token: str = Depends(oauth2_schem
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    finally:
-        if DB_CONNECTION.client:
-            DB_CONNECTION.client.close()
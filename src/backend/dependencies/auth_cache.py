@@ -0,0 +1,109 @@
+import os
+import time
+import collections
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+from database.cloud_db_controller import token_digest
+
+# Auth cache configuration
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))       # seconds a verified token is trusted
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))    # tokens kept before the oldest is evicted
+
+
+@dataclass
+class AuthContext:
+    user: Dict
+    user_id: str
+    expires_at: float       # time.monotonic() deadline
+    ip_address: str
+    user_agent: Optional[str]
+
+
+class AuthContextCache:
+    """
+    Verified users by token digest, for a short TTL.
+
+    A hit skips the revocation lookup, the JWT decode and the user fetch, so an
+    authenticated request makes no database round trip. Entries never outlive
+    the token's own exp. Logout and blacklisting drop the token. A password change
+    drops every token of the user. Other workers see those changes when their
+    entries expire, at most AUTH_CACHE_TTL later.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_size: int = AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "collections.OrderedDict[str, AuthContext]" = collections.OrderedDict()
+        self._by_user: Dict[str, Set[str]] = collections.defaultdict(set)
+        self.metrics = collections.Counter()
+
+    def get(self, token: str) -> Optional[AuthContext]:
+        digest = token_digest(token)
+        context = self._entries.get(digest)
+        if context is None:
+            self.metrics["misses"] += 1
+            return None
+        if context.expires_at <= time.monotonic():
+            self._remove(digest)
+            self.metrics["expired"] += 1
+            self.metrics["misses"] += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.metrics["hits"] += 1
+        return context
+
+    def put(self, token: str, user: Dict, token_exp: Optional[float], ip_address: str,
+            user_agent: Optional[str] = None):
+        """Cache a user verified from token; token_exp is the JWT exp claim in epoch seconds"""
+        if self.ttl <= 0:
+            return
+        lifetime = self.ttl
+        if token_exp is not None:
+            lifetime = min(lifetime, token_exp - time.time())
+        if lifetime <= 0:
+            return
+        digest = token_digest(token)
+        user_id = str(user["_id"])
+        self._remove(digest)
+        self._entries[digest] = AuthContext(user, user_id, time.monotonic() + lifetime, ip_address, user_agent)
+        self._by_user[user_id].add(digest)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            self.metrics["evictions"] += 1
+
+    def _remove(self, digest: str) -> bool:
+        context = self._entries.pop(digest, None)
+        if context is None:
+            return False
+        digests = self._by_user.get(context.user_id)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_user[context.user_id]
+        return True
+
+    def invalidate_token(self, token: str):
+        """Forget one token, e.g. on logout or blacklisting"""
+        if self._remove(token_digest(token)):
+            self.metrics["invalidations"] += 1
+
+    def invalidate_user(self, user_id: str):
+        """Forget every token of a user, e.g. after a password change"""
+        for digest in list(self._by_user.get(str(user_id), ())):
+            if self._remove(digest):
+                self.metrics["invalidations"] += 1
+
+    def stats(self) -> Dict:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **dict(self.metrics),
+            "size": len(self._entries),
+            "users": len(self._by_user),
+            "ttl": self.ttl,
+            "hit_rate": round(self.metrics["hits"] / lookups, 3) if lookups else None,
+        }
+
+
+# Create global instance
+auth_cache = AuthContextCache()
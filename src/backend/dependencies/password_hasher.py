@@ -0,0 +1,122 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+# Password hashing configuration
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))     # hashes made with another cost are upgraded on login
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))   # queued and running operations
+WAIT_SAMPLES = 1000     # recent queue waits kept for percentiles
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when PASSWORD_HASH_MAX_PENDING operations are already queued or running"""
+
+
+class PasswordHasher:
+    """
+    bcrypt hashing and verification on a dedicated, size-limited thread pool.
+
+    A bcrypt call holds a core for about 100 ms at cost 12; run on the event loop
+    it stalls every WebSocket of the worker. Here it runs on at most `workers`
+    threads (bcrypt releases the GIL), and once max_pending operations are queued
+    or running new ones are refused instead of piling up. Queue wait is the time
+    an operation spent waiting for a free thread.
+    """
+
+    def __init__(self, context: CryptContext, workers: int = PASSWORD_HASH_WORKERS,
+                 max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.context = context
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._waits = collections.deque(maxlen=WAIT_SAMPLES)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+        self.metrics = collections.Counter()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created on first use so a forked worker never inherits its parent's threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _run(self, name: str, fn, *args):
+        if self._pending >= self.max_pending:
+            self.metrics["rejected"] += 1
+            raise PasswordHasherBusy(f"{self._pending} password operations pending")
+        self._pending += 1
+        submitted = time.monotonic()
+
+        def timed():
+            started = time.monotonic()
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    wait = started - submitted
+                    self._waits.append(wait)
+                    self._wait_total += wait
+                    self._wait_max = max(self._wait_max, wait)
+                    self._run_total += time.monotonic() - started
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), timed)
+        finally:
+            self._pending -= 1
+            self.metrics[name] += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hashes", self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run("verifications", self.context.verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Verify password; when the hash uses an outdated scheme or cost also return a replacement"""
+        return await self._run("verifications", self.context.verify_and_update, password, hashed)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            wait_total, wait_max, run_total = self._wait_total, self._wait_max, self._run_total
+        completed = self.metrics["hashes"] + self.metrics["verifications"]
+
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 2) if waits else None
+
+        return {
+            **dict(self.metrics),
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rounds": BCRYPT_ROUNDS,
+            "wait_ms": {
+                "avg": round(wait_total / completed * 1000, 2) if completed else None,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(wait_max * 1000, 2),
+            },
+            "run_ms_avg": round(run_total / completed * 1000, 2) if completed else None,
+        }
+
+
+# Create global instance
+password_hasher = PasswordHasher(CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS))
@@ -0,0 +1,197 @@
+""" Sliding-window limits on failed authentication attempts, per worker or shared between workers """
+
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+import collections
+from abc import ABC, abstractmethod
+from typing import Deque, Dict, Optional, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Rate limiting configuration
+MAX_FAILED_ATTEMPTS = 5
+RATE_LIMIT_WINDOW = 15 * 60  # 15 minutes in seconds
+RATE_LIMIT_MAX_KEYS = int(os.getenv("AUTH_RATE_LIMIT_MAX_KEYS", "100000"))   # clients tracked at once
+AUTH_RATE_LIMIT_STORE = os.getenv("AUTH_RATE_LIMIT_STORE", "memory")
+AUTH_RATE_LIMIT_DB = os.getenv("AUTH_RATE_LIMIT_DB", "rate_limits.db")
+
+
+class RateLimiter(ABC):
+    """
+    Failed attempts per key (a client IP) in a sliding window.
+
+    A key is limited once it has made limit attempts in the last window seconds;
+    it is free again as soon as its oldest counted attempt leaves the window.
+    """
+
+    def __init__(self, limit: int = MAX_FAILED_ATTEMPTS, window: float = RATE_LIMIT_WINDOW,
+                 max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.metrics = collections.Counter()
+
+    @abstractmethod
+    async def hit(self, key: str) -> int:
+        """Record an attempt; returns the attempts of key in the window, this one included"""
+
+    @abstractmethod
+    async def count(self, key: str) -> int:
+        """Attempts of key in the window"""
+
+    async def is_limited(self, key: str) -> bool:
+        limited = await self.count(key) >= self.limit
+        if limited:
+            self.metrics["rejected"] += 1
+        return limited
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict:
+        return {**dict(self.metrics), "limit": self.limit, "window": self.window}
+
+
+class InMemoryRateLimiter(RateLimiter):
+    """
+    Process-local limiter for a single worker.
+
+    Each key keeps at most limit timestamps, which is all a limit decision needs.
+    Keys are ordered by their latest attempt, so the key idle longest is always
+    first: expiry only touches keys that are due instead of scanning every key,
+    and past max_keys the key idle longest (the closest to expiry) is dropped.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._attempts: OrderedDict[str, Deque[float]] = collections.OrderedDict()
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        while self._attempts:
+            key, attempts = next(iter(self._attempts.items()))
+            if attempts[-1] > cutoff:
+                break
+            del self._attempts[key]
+            self.metrics["expired"] += 1
+
+    def _count(self, attempts: Deque[float], now: float) -> int:
+        cutoff = now - self.window
+        while attempts and attempts[0] <= cutoff:
+            attempts.popleft()
+        return len(attempts)
+
+    async def hit(self, key: str) -> int:
+        now = time.monotonic()
+        self._expire(now)
+        attempts = self._attempts.get(key)
+        if attempts is None:
+            attempts = self._attempts[key] = collections.deque(maxlen=self.limit)
+            while len(self._attempts) > self.max_keys:
+                self._attempts.popitem(last=False)
+                self.metrics["evictions"] += 1
+        else:
+            self._attempts.move_to_end(key)
+        attempts.append(now)
+        self.metrics["hits"] += 1
+        return self._count(attempts, now)
+
+    async def count(self, key: str) -> int:
+        now = time.monotonic()
+        self._expire(now)
+        attempts = self._attempts.get(key)
+        return self._count(attempts, now) if attempts else 0
+
+    def stats(self) -> Dict:
+        return {**super().stats(), "keys": len(self._attempts)}
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """
+    Limiter shared by every worker on a host through one SQLite file.
+
+    Stands in for Redis the way the live session store does: attempts are rows
+    keyed by client, counted over the window with an index range scan. Like the
+    in-memory limiter each key keeps only its newest limit rows. Rows leaving the
+    window are pruned once per prune interval, and past max_keys the clients idle
+    longest are dropped.
+    """
+
+    def __init__(self, path: str = AUTH_RATE_LIMIT_DB, *args, prune_interval: float = 60.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.path = path
+        self.prune_interval = prune_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened lazily so a forked worker never shares its parent's connection
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS attempts (key TEXT NOT NULL, at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS attempts_key_at ON attempts (key, at)")
+            self._conn = conn
+        return self._conn
+
+    def _count(self, conn: sqlite3.Connection, key: str, now: float) -> int:
+        return conn.execute("SELECT COUNT(*) FROM attempts WHERE key = ? AND at > ?",
+                            (key, now - self.window)).fetchone()[0]
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM attempts WHERE at <= ?", (now - self.window,))
+        conn.execute(
+            "DELETE FROM attempts WHERE key IN (SELECT key FROM attempts GROUP BY key "
+            "ORDER BY MAX(at) DESC LIMIT -1 OFFSET ?)",
+            (self.max_keys,),
+        )
+        self._pruned_at = now
+
+    def _hit(self, key: str) -> int:
+        # Wall-clock time, since the rows are compared between processes
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT INTO attempts (key, at) VALUES (?, ?)", (key, now))
+            conn.execute(
+                "DELETE FROM attempts WHERE key = ? AND rowid NOT IN "
+                "(SELECT rowid FROM attempts WHERE key = ? ORDER BY at DESC LIMIT ?)",
+                (key, key, self.limit),
+            )
+            if now - self._pruned_at >= self.prune_interval:
+                self._prune(conn, now)
+            return self._count(conn, key, now)
+
+    def _read(self, key: str) -> int:
+        with self._lock:
+            return self._count(self._connect(), key, time.time())
+
+    async def hit(self, key: str) -> int:
+        self.metrics["hits"] += 1
+        return await asyncio.to_thread(self._hit, key)
+
+    async def count(self, key: str) -> int:
+        return await asyncio.to_thread(self._read, key)
+
+    async def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _create_limiter() -> RateLimiter:
+    """AUTH_RATE_LIMIT_STORE=sqlite makes limits hold across the workers on one host"""
+    if AUTH_RATE_LIMIT_STORE.lower() == "sqlite":
+        return SQLiteRateLimiter(AUTH_RATE_LIMIT_DB)
+    return InMemoryRateLimiter()
+
+
+# Create global instance
+rate_limiter = _create_limiter()
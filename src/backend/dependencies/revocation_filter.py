@@ -0,0 +1,140 @@
+import os
+import time
+import asyncio
+import logging
+import collections
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from bson.objectid import ObjectId
+
+from database.cloud_db_controller import token_digest
+
+logger = logging.getLogger(__name__)
+
+# Revocation filter configuration
+REVOCATION_POLL_INTERVAL = float(os.getenv("REVOCATION_POLL_INTERVAL", "2"))   # seconds between delta polls
+REVOCATION_RESYNC_INTERVAL = 600    # seconds between full reloads, which drop entries the TTL index deleted
+WATERMARK_OVERLAP = 30              # seconds re-read behind the watermark, for inserts from other clocks
+
+
+class RevocationFilter:
+    """
+    In-process set of revoked token digests, mirrored from revoked_tokens.
+
+    Nearly every token checked is not revoked, so a digest missing from the set is
+    answered without a query; only digests in the set go to the database, which
+    still decides between revoked and blacklisted. A background task reads new
+    revocations past an ObjectId watermark every few seconds and reloads the whole
+    set now and then. Revocations made by this worker are added at once; those of
+    other workers appear within one poll. Until the first load finishes every
+    check goes to the database.
+    """
+
+    def __init__(self, db_name: str = "JagCoaching", poll_interval: float = REVOCATION_POLL_INTERVAL,
+                 resync_interval: float = REVOCATION_RESYNC_INTERVAL):
+        self.db_name = db_name
+        self.poll_interval = poll_interval
+        self.resync_interval = resync_interval
+        self._digests = set()
+        self._added_during_load: Optional[set] = None   # local adds a running full reload must keep
+        self._watermark: Optional[ObjectId] = None
+        self._loaded_at: Optional[float] = None
+        self._synced_at: Optional[float] = None
+        self._db = None
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = collections.Counter()
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded_at is not None
+
+    def might_be_revoked(self, token: str) -> bool:
+        """False only when the token is certainly not revoked"""
+        return not self.ready or token_digest(token) in self._digests
+
+    def known_revoked(self, token: str) -> bool:
+        """True when the token's digest has been seen revoked, whether or not the first load finished"""
+        return token_digest(token) in self._digests
+
+    def add(self, token: str):
+        """Record a revocation made by this worker without waiting for the next poll"""
+        digest = token_digest(token)
+        self._digests.add(digest)
+        if self._added_during_load is not None:
+            self._added_during_load.add(digest)
+
+    async def lookup(self, db, token: str) -> Optional[Dict]:
+        """The revoked_tokens entry of token, querying the database only on a filter hit"""
+        self.metrics["checks"] += 1
+        if not self.might_be_revoked(token):
+            self.metrics["negatives"] += 1
+            return None
+        entry = await db.is_token_revoked(self.db_name, token)
+        self.metrics["confirmed" if entry else "false_positives"] += 1
+        return entry
+
+    async def _load(self, db, since: Optional[ObjectId] = None):
+        if since is not None:
+            revocations = await db.find_revocations(self.db_name, since)
+            self._digests.update(digest for _, digest in revocations)
+            self.metrics["polls"] += 1
+        else:
+            # A full reload replaces the set; revocations this worker adds while the query runs are kept
+            self._added_during_load = set()
+            try:
+                revocations = await db.find_revocations(self.db_name)
+            finally:
+                added, self._added_during_load = self._added_during_load, None
+            self._digests = {digest for _, digest in revocations} | added
+            self._loaded_at = time.monotonic()
+            self.metrics["full_loads"] += 1
+        if revocations:
+            newest = max(_id for _id, _ in revocations)
+            if self._watermark is None or newest > self._watermark:
+                self._watermark = newest
+        self._synced_at = time.monotonic()
+
+    def _since(self) -> Optional[ObjectId]:
+        if self._watermark is None:
+            return None
+        return ObjectId.from_datetime(self._watermark.generation_time - timedelta(seconds=WATERMARK_OVERLAP))
+
+    async def _run(self):
+        while True:
+            try:
+                if not self.ready or time.monotonic() - self._loaded_at >= self.resync_interval:
+                    await self._load(self._db)
+                else:
+                    since = self._since() or ObjectId.from_datetime(datetime.utcnow() - timedelta(seconds=WATERMARK_OVERLAP))
+                    await self._load(self._db, since)
+            except Exception as e:
+                self.metrics["sync_errors"] += 1
+                logger.error(f"Revocation filter sync failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def start(self, db):
+        if self._task is None:
+            self._db = db
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            **dict(self.metrics),
+            "ready": self.ready,
+            "size": len(self._digests),
+            "sync_age": round(time.monotonic() - self._synced_at, 1) if self._synced_at else None,
+        }
+
+
+# Create global instance
+revocation_filter = RevocationFilter()
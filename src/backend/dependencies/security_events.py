@@ -0,0 +1,172 @@
+import os
+import time
+import asyncio
+import logging
+import collections
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Security pipeline configuration
+SECURITY_QUEUE_SIZE = int(os.getenv("SECURITY_QUEUE_SIZE", "10000"))   # observations held before new ones are dropped
+SECURITY_BATCH_SIZE = 100
+SECURITY_FLUSH_INTERVAL = 2.0       # seconds a partial batch of events waits for more
+KNOWN_CLIENTS_TTL = 600             # seconds a user's known IPs and agents are trusted before reloading
+KNOWN_CLIENTS_SIZE = 10000          # users whose known clients are kept
+RECENT_SESSIONS = 5                 # sessions the known clients are seeded from
+
+
+@dataclass
+class KnownClients:
+    ip_addresses: Set[str] = field(default_factory=set)
+    user_agents: Set[str] = field(default_factory=set)
+    loaded_at: float = field(default_factory=time.monotonic)
+
+
+class SecurityMonitor:
+    """
+    Suspicious-activity detection off the request path.
+
+    Requests only enqueue (user_id, ip, user agent); the queue is bounded and a
+    full queue drops the observation rather than delaying the request. One
+    background task compares each observation with the user's known IPs and user
+    agents, seeded from their recent sessions and cached, and writes suspicious
+    events in batches. A new client is reported once, then treated as known.
+    """
+
+    def __init__(self, db_name: str = "JagCoaching", queue_size: int = SECURITY_QUEUE_SIZE,
+                 batch_size: int = SECURITY_BATCH_SIZE, flush_interval: float = SECURITY_FLUSH_INTERVAL):
+        self.db_name = db_name
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._known: "collections.OrderedDict[str, KnownClients]" = collections.OrderedDict()
+        self._events: List[Dict] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._db = None
+        self.metrics = collections.Counter()
+
+    def observe(self, user_id: str, ip_address: str, user_agent: Optional[str] = None, trusted: bool = False):
+        """Queue a request's client for checking; trusted clients (a fresh login) are learned, not checked"""
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait((user_id, ip_address, user_agent, trusted))
+            self.metrics["observed"] += 1
+        except asyncio.QueueFull:
+            self.metrics["dropped"] += 1
+
+    async def _known_clients(self, user_id: str) -> KnownClients:
+        known = self._known.get(user_id)
+        if known is not None and time.monotonic() - known.loaded_at < KNOWN_CLIENTS_TTL:
+            self._known.move_to_end(user_id)
+            return known
+
+        sessions = await self._db.get_user_recent_sessions(self.db_name, user_id, limit=RECENT_SESSIONS)
+        self.metrics["loads"] += 1
+        known = KnownClients()
+        for session in sessions:
+            if session.get("ip_address"):
+                known.ip_addresses.add(session["ip_address"])
+            device_info = session.get("device_info") or {}
+            if device_info.get("user_agent"):
+                known.user_agents.add(device_info["user_agent"])
+        self._known[user_id] = known
+        while len(self._known) > KNOWN_CLIENTS_SIZE:
+            self._known.popitem(last=False)
+        return known
+
+    async def _check(self, user_id: str, ip_address: str, user_agent: Optional[str], trusted: bool):
+        known = await self._known_clients(user_id)
+        reason = []
+        if not trusted:
+            if known.ip_addresses and ip_address not in known.ip_addresses:
+                reason.append(f"New IP address: {ip_address}")
+            if user_agent and known.user_agents and user_agent not in known.user_agents:
+                reason.append(f"New user agent: {user_agent}")
+        known.ip_addresses.add(ip_address)
+        if user_agent:
+            known.user_agents.add(user_agent)
+
+        if reason:
+            logger.warning(f"SUSPICIOUS TOKEN USAGE: User {user_id}, Reasons: {', '.join(reason)}")
+            self.metrics["suspicious"] += 1
+            self._events.append({
+                "user_id": user_id,
+                "event_type": "suspicious_token_usage",
+                "ip_address": ip_address,
+                "user_agent": user_agent,
+                "reasons": reason,
+                "timestamp": datetime.now()
+            })
+
+    async def _flush(self):
+        if not self._events:
+            return
+        events, self._events = self._events, []
+        try:
+            await self._db.record_security_events(self.db_name, events)
+            self.metrics["batches"] += 1
+            self.metrics["written"] += len(events)
+        except Exception as e:
+            self.metrics["failed"] += len(events)
+            logger.error(f"Writing {len(events)} security events failed: {e}")
+
+    async def _run(self):
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                observation = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                observation = None
+            if observation is not None:
+                try:
+                    await self._check(*observation)
+                except Exception as e:
+                    self.metrics["errors"] += 1
+                    logger.error(f"Security check for user {observation[0]} failed: {e}")
+                finally:
+                    self._queue.task_done()
+                if self._events and deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if self._events and (len(self._events) >= self.batch_size or time.monotonic() >= deadline):
+                await self._flush()
+                deadline = None
+
+    async def start(self, db):
+        if self._task is None:
+            self._db = db
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float = 5.0):
+        """Check what is queued, write pending events, then stop the consumer"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopped security checks with {self._queue.qsize()} observations unchecked")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._flush()
+
+    def stats(self) -> Dict:
+        return {
+            **dict(self.metrics),
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "unwritten": len(self._events),
+            "known_users": len(self._known),
+        }
+
+
+# Create global instance
+security_monitor = SecurityMonitor()
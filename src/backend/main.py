@@ -3,16 +3,32 @@
 
 import sys
 import os
+import time
+STARTED = time.perf_counter()
 if sys.path.count(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))) == 0:
     sys.path.append(os.path.dirname(os.path.dirname(
         os.path.dirname(os.path.abspath(__file__)))))
 from config import settings
-from routers import auth_router, videos_router, users_router, live_router, presentations
+from scripts import plugins
+# Every project module is timed on its own as it is first imported, so the startup
+# report shows what each module itself costs
+with plugins.timed_imports(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))):
+    from database.cloud_db_controller import db_controller
+    from database.async_db_controller import async_db_controller
+    from database import indexes
+    from dependencies.revocation_filter import revocation_filter
+    from dependencies.security_events import security_monitor
+    from dependencies.rate_limiter import rate_limiter
+    from dependencies.password_hasher import password_hasher
+    from database.mongo_pool import pool_stats
+    from dependencies.auth import require_internal_access
+    from routers import auth_router, videos_router, users_router, live_router, presentations
 import uvicorn
-from fastapi import FastAPI, WebSocket
+from fastapi import Depends, FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 
 # Built-in imports
+import asyncio
 from contextlib import asynccontextmanager
 from pathlib import Path
 
@@ -49,9 +65,43 @@ async def lifespan(app: FastAPI):
             directory.mkdir(parents=True, exist_ok=True)
             logger.info(f"Created directory: {directory}")
         
+        # Pooled MongoDB clients: asyncio for request handlers, threaded for background writers
+        await async_db_controller.connect()
+        await asyncio.to_thread(db_controller.connect)
+        if indexes.ENSURE_INDEXES:
+            try:
+                await indexes.ensure_indexes(async_db_controller.get_database(indexes.DB_NAME))
+            except Exception as e:
+                logger.error(f"Index bootstrap failed: {str(e)}")
+        # Mirror revoked token digests so most revocation checks skip the database
+        await revocation_filter.start(async_db_controller)
+        # Suspicious-activity checks run behind a queue, off the auth path
+        await security_monitor.start(async_db_controller)
+        
+        # Receive stop requests for sessions held by this worker
+        await live_router.session_store.start(live_router.handle_session_event)
+        await live_router.session_archiver.start(db_controller)
+        
+        # ML stacks load on first use unless WARMUP_PLUGINS asks for them up front
+        warmup_task = asyncio.create_task(plugins.warm_up(plugins.configured_warmups()))
+        plugins.mark_ready(STARTED)
+        
         yield
         
+        warmup_task.cancel()
+        
         logger.info("Shutting down...")
+        await live_router.scheduler.shutdown()
+        live_router.llm_client.close()
+        await live_router.session_store.close()
+        # Write out sessions that ended just before shutdown
+        await live_router.session_archiver.close()
+        await revocation_filter.close()
+        await security_monitor.close()
+        await rate_limiter.close()
+        password_hasher.close()
+        await async_db_controller.close()
+        db_controller.close()
     except Exception as e:
         logger.error(f"Error in lifespan: {str(e)}")
         raise
@@ -76,12 +126,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Next-page cursor of the presentation list
+    expose_headers=["X-Next-Cursor"],
 )
 
 @app.get("/")
 async def index():
     return {"message": "Welcome to the JagCoaching API!"}
 
+@app.get("/api/startup/", response_description="Startup time report", dependencies=[Depends(require_internal_access)])
+async def startup_report():
+    """Time to ready, per-module import times and which ML plugins are loaded."""
+    return plugins.startup_report()
+
+@app.get("/api/db/pool/", response_description="MongoDB connection pool metrics", dependencies=[Depends(require_internal_access)])
+async def db_pool_metrics():
+    """Open and in-use connections, checkouts and checkout wait times of the asyncio and sync MongoDB pools."""
+    return pool_stats()
+
 @app.get("/api/", response_description="API index route")
 async def apiroutes():
     """Returns information about all available API endpoints."""
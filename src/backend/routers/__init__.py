@@ -1,7 +1,3 @@
-from .users import router as users_router
-from .auth import router as auth_router
-from .videos import router as videos_router
-
 """
 Routers module for JagCoaching backend application.
 
@@ -9,8 +5,25 @@ This module contains API routers that handle different endpoints:
 - users: User management endpoints
 - auth: Authentication related endpoints
 - videos: Video processing endpoints
+
+The routers are imported on first access rather than with the package, so
+main.py can time each router module's import on its own.
 """
 
+import importlib
+
+_ROUTERS = {
+    "users_router": ".users",
+    "auth_router": ".auth",
+    "videos_router": ".videos",
+}
+
+
+def __getattr__(name):
+    if name in _ROUTERS:
+        return importlib.import_module(_ROUTERS[name], __name__).router
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Export the routers to be included in the main FastAPI application
-__all__ = ["users_router", "auth_router", "videos_router"]
\ No newline at end of file
+__all__ = ["users_router", "auth_router", "videos_router"]
@@ -11,7 +11,8 @@ from dependencies.auth import (
     get_current_user,
     create_access_token,
     get_password_hash,
-    verify_password,
+    verify_and_update_password,
+    upgrade_password_hash,
     create_refresh_token,
     hash_refresh_token,
     save_refresh_token_to_db,
@@ -19,9 +20,15 @@ from dependencies.auth import (
     terminate_all_user_sessions,       # Phase 4
     oauth2_scheme,                     # Added for token dependency
     record_failed_attempt,             # Added for rate limiting
-    detect_suspicious_activity         # Added for suspicious activity detection
+    require_internal_access
 )
-from database.cloud_db_controller import CloudDBController
+from dependencies.auth_cache import auth_cache
+from dependencies.revocation_filter import revocation_filter
+from dependencies.security_events import security_monitor
+from dependencies.rate_limiter import rate_limiter
+from dependencies.password_hasher import password_hasher
+from database.async_db_controller import AsyncCloudDBController, get_async_db
+from database.cloud_db_controller import token_expiry
 from dotenv import load_dotenv
 from jose import jwt  # Using jose instead of jwt
 
@@ -37,17 +44,13 @@ router = APIRouter(
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES","30"))
-DB_CONNECTION = CloudDBController()
 
 @router.post("/register", response_model=dict)
-async def register(form: UserLogin):
+async def register(form: UserLogin, db: AsyncCloudDBController = Depends(get_async_db)):
     """ Register a new user account """
     try:
-        # Initialize the database controller
-        DB_CONNECTION.connect()
-        
         # Check if user already exists
-        existing_user = DB_CONNECTION.find_document(
+        existing_user = await db.find_document(
             "JagCoaching",
             "users",
             {"email": form.email}
@@ -61,7 +64,7 @@ async def register(form: UserLogin):
             )
 
         # Create new user document
-        hashed_password = get_password_hash(form.password)
+        hashed_password = await get_password_hash(form.password)
         user_document = {
             "username": form.email,  # Using email as username
             "email": form.email,
@@ -71,7 +74,7 @@ async def register(form: UserLogin):
         }
 
         # Add user to the database
-        result = DB_CONNECTION.add_document("JagCoaching", "users", user_document)
+        result = await db.add_document("JagCoaching", "users", user_document)
 
         # Check if user was successfully added
         if not result.acknowledged:
@@ -82,32 +85,32 @@ async def register(form: UserLogin):
 
         return {"status": "success", "message": "Registration successful!"}
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=422,
             detail=str(e)
         )
-    finally:
-        # Close the database connection
-        if DB_CONNECTION.client:
-            DB_CONNECTION.client.close()
 
 
 
 @router.post("/auth/token/", response_model=Token)
 async def login_for_access_token(
     request: Request,
-    form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    db: AsyncCloudDBController = Depends(get_async_db)
 ):
     try:
         print(f"Login attempt for user: {form_data.username}")
-        DB_CONNECTION.connect()
-        user = DB_CONNECTION.find_document("JagCoaching", "users", {"email": form_data.username})
+        user = await db.find_document("JagCoaching", "users", {"email": form_data.username})
 
-        if not user or not verify_password(form_data.password, user.get('password', '')):
+        valid, new_hash = (await verify_and_update_password(form_data.password, user.get('password', ''))
+                           if user else (False, None))
+        if not valid:
             # Record failed login attempt for rate limiting
             ip_address = request.client.host if request.client else "unknown"
-            record_failed_attempt(ip_address)
+            await record_failed_attempt(ip_address)
             
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -115,10 +118,13 @@ async def login_for_access_token(
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        # Hashes made with an older bcrypt cost are replaced while the plain password is at hand
+        await upgrade_password_hash(db, user, new_hash)
+
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(data={"sub": user["email"]}, expires_delta=access_token_expires)
         refresh_token = create_refresh_token()
-        save_refresh_token_to_db(user_id=str(user["_id"]), refresh_token=refresh_token)
+        await save_refresh_token_to_db(user_id=str(user["_id"]), refresh_token=refresh_token)
 
         # Enhanced session tracking
         ip_address = request.client.host if request.client else "unknown"
@@ -126,15 +132,15 @@ async def login_for_access_token(
         device_info = {"user_agent": user_agent}
         
         # Create user session - fixed to match the function signature
-        session_id = DB_CONNECTION.create_user_session(
+        session_id = await db.create_user_session(
             "JagCoaching", 
             str(user["_id"]), 
             ip_address, 
             device_info
         )
         
-        # Check for suspicious activity
-        detect_suspicious_activity(str(user["_id"]), ip_address, user_agent)
+        # The new session's client is known from now on
+        security_monitor.observe(str(user["_id"]), ip_address, user_agent, trusted=True)
 
         return {
             "access_token": access_token,
@@ -146,27 +152,23 @@ async def login_for_access_token(
     except Exception as e:
         print(f"Login error: {str(e)}")
         raise
-    finally:
-        if DB_CONNECTION.client:
-            DB_CONNECTION.client.close()
 
 
 @router.post("/auth/token/refresh", response_model=Token)
-async def refresh_token(request: RefreshRequest = Body(...)):
+async def refresh_token(request: RefreshRequest = Body(...), db: AsyncCloudDBController = Depends(get_async_db)):
     """Refresh an expired access token using a valid refresh token"""
     try:
-        DB_CONNECTION.connect()
         token_hash = hash_refresh_token(request.refresh_token)
-        stored = DB_CONNECTION.get_refresh_token("JagCoaching", token_hash)
+        stored = await db.get_refresh_token("JagCoaching", token_hash)
 
         if not stored or stored.get("expires_at") < datetime.utcnow():
             raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
 
         user_id = stored["user_id"]
-        DB_CONNECTION.delete_refresh_token("JagCoaching", token_hash)
+        await db.delete_refresh_token("JagCoaching", token_hash)
 
         new_refresh_token = create_refresh_token()
-        save_refresh_token_to_db(user_id=user_id, refresh_token=new_refresh_token)
+        await save_refresh_token_to_db(user_id=user_id, refresh_token=new_refresh_token)
 
         access_token = create_access_token(data={"sub": user_id})
 
@@ -179,22 +181,22 @@ async def refresh_token(request: RefreshRequest = Body(...)):
     except Exception as e:
         print(f"Refresh token error: {str(e)}")
         raise HTTPException(status_code=500, detail="Token refresh failed")
-    finally:
-        if DB_CONNECTION.client:
-            DB_CONNECTION.client.close()
 
 
 @router.post("/logout")
-async def logout(current_user: UserInDB = Depends(get_current_user), token: str = Depends(oauth2_scheme)):
+async def logout(current_user: UserInDB = Depends(get_current_user), token: str = Depends(oauth2_scheme),
+                 db: AsyncCloudDBController = Depends(get_async_db)):
     """Logout and revoke the current token"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         exp = payload.get("exp")
-        expires_at = datetime.fromtimestamp(exp)
-        DB_CONNECTION.revoke_token("JagCoaching", token=token, expires_at=expires_at, reason="user_logout")
+        expires_at = token_expiry(exp)
+        await db.revoke_token("JagCoaching", token=token, expires_at=expires_at, reason="user_logout")
+        revocation_filter.add(token)
+        auth_cache.invalidate_token(token)
 
         # Phase 4: End all active sessions for the user
-        terminate_all_user_sessions(str(current_user["_id"]))
+        await terminate_all_user_sessions(str(current_user["_id"]))
 
         return {"status": "success", "message": "Logout successful!"}
     except Exception as e:
@@ -203,13 +205,15 @@ async def logout(current_user: UserInDB = Depends(get_current_user), token: str
 
 # Phase 3: Admin route for manual blacklisting
 @router.post("/auth/token/blacklist")
-async def blacklist_token(request: BlacklistRequest = Body(...)):
+async def blacklist_token(request: BlacklistRequest = Body(...), db: AsyncCloudDBController = Depends(get_async_db)):
     """Blacklist a token for security purposes"""
     try:
         payload = jwt.decode(request.token, SECRET_KEY, algorithms=[ALGORITHM])
         exp = payload.get("exp")
-        expires_at = datetime.fromtimestamp(exp)
-        DB_CONNECTION.blacklist_token("JagCoaching", token=request.token, expires_at=expires_at, reason=request.reason)
+        expires_at = token_expiry(exp)
+        await db.blacklist_token("JagCoaching", token=request.token, expires_at=expires_at, reason=request.reason)
+        revocation_filter.add(request.token)
+        auth_cache.invalidate_token(request.token)
         return {"status": "success", "message": "Token has been blacklisted."}
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=400, detail="Token already expired.")
@@ -217,3 +221,31 @@ async def blacklist_token(request: BlacklistRequest = Body(...)):
         raise HTTPException(status_code=500, detail=f"Failed to blacklist token: {str(e)}")
 
 
+@router.get("/auth/cache/", response_description="Authentication cache metrics", dependencies=[Depends(require_internal_access)])
+async def auth_cache_metrics():
+    """Hits, misses, hit rate, evictions and invalidations of the verified-token cache."""
+    return auth_cache.stats()
+
+
+@router.get("/auth/revocations/", response_description="Revocation filter metrics", dependencies=[Depends(require_internal_access)])
+async def revocation_filter_metrics():
+    """Checks answered in-process, database confirmations and sync state of the revocation filter."""
+    return revocation_filter.stats()
+
+
+@router.get("/auth/security-events/", response_description="Security event pipeline metrics", dependencies=[Depends(require_internal_access)])
+async def security_event_metrics():
+    """Queued, dropped and suspicious observations and batched event writes of the security monitor."""
+    return security_monitor.stats()
+
+
+@router.get("/auth/rate-limits/", response_description="Failed attempt rate limiter metrics", dependencies=[Depends(require_internal_access)])
+async def rate_limiter_metrics():
+    """Recorded failures, rejected requests, expiries and evictions of the failed attempt limiter."""
+    return rate_limiter.stats()
+
+
+@router.get("/auth/password-hashing/", response_description="Password hashing pool metrics", dependencies=[Depends(require_internal_access)])
+async def password_hashing_metrics():
+    """Hashes, verifications, rejections, queue wait and run time of the password hashing pool."""
+    return password_hasher.stats()
@@ -1,5 +1,5 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
-from typing import Dict
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException
+from typing import Dict, Optional
 import json
 import cv2
 import numpy as np
@@ -7,18 +7,37 @@ import base64
 import uuid
 from datetime import datetime
 import asyncio
+import time
 import logging
-from src.backend.ws_manager.ws_manager import manager
-from scripts.live_pipeline.live_analysis_pipeline import run_analysis_once
-from scripts.live_pipeline.audio_analysis import transcribe_audio
-import sounddevice as sd
+from src.backend.ws_manager.ws_manager import manager, SessionLimitError
+from src.backend.ws_manager.session_store import session_store
+from src.backend.database.session_archiver import session_archiver
+from scripts.live_pipeline.live_analysis_pipeline import run_analysis_pipeline
+from scripts.live_pipeline.analysis_scheduler import scheduler
+from scripts.live_pipeline.audio_stream import AudioIngest
+from scripts.live_pipeline.streaming_asr import StreamingTranscriber, ASR_TIMEOUT
+from scripts.live_pipeline.feedback_service import feedback_service
+from scripts.live_pipeline.session_timeline import SessionTimeline, COLUMNS as TIMELINE_COLUMNS
+from scripts.live_pipeline.live_gemini import get_session_summary
+from scripts.llm_client import llm_client
+from dependencies.auth import require_internal_access
+from scripts.live_pipeline.change_detection import (
+    AdaptiveCadence, take_snapshot, CHECK_INTERVAL, MIN_FEEDBACK_INTERVAL
+)
 from starlette.websockets import WebSocketState
-import concurrent.futures
 
 logger = logging.getLogger(__name__)
 
-# Create a thread pool for running analysis
-thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+# Seconds of the session's decoded audio handed to each analysis
+AUDIO_ANALYSIS_WINDOW = 3.0
+# Seconds of VAD history summarized into speaking ratio and pauses
+SPEECH_ACTIVITY_WINDOW = 10.0
+# How often new speech is handed to the transcriber
+TRANSCRIPTION_STEP = 1.0
+# How long a stop request waits for another worker to release the session
+STOP_WAIT_TIMEOUT = 2.0
+# Most rows returned by the timeline endpoint
+TIMELINE_MAX_POINTS = 500
 
 router = APIRouter(
     prefix="/api/live",
@@ -30,10 +49,17 @@ class WSMessageType:
     VIDEO_FRAME = "video_frame"
     AUDIO_CHUNK = "audio_chunk"
     FEEDBACK = "feedback"
+    TRANSCRIPT = "transcript"
     ERROR = "error"
     PING = "ping"
     PONG = "pong"
 
+# Stages reported in FEEDBACK messages; face and audio arrive as partial results
+class FeedbackStage:
+    FACE = "face"
+    AUDIO = "audio"
+    COACHING = "coaching"
+
 @router.post("/session/start")
 async def start_session():
     """Initialize a new live analysis session"""
@@ -54,26 +80,39 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
         logger.info(f"WebSocket connection accepted for session {session_id}")
         
         # Initialize session data with metrics tracking
+        audio_ingest = AudioIngest(session_id)
         session_data = {
+            "started_at": datetime.now(),
             "last_ping": datetime.now(),
             "analysis_in_progress": False,
             "last_frame": None,
-            "last_audio": None,
+            "audio_ingest": audio_ingest,
+            "transcriber": StreamingTranscriber(session_id, audio_ingest),
+            "cadence": AdaptiveCadence(),
+            # One row per analysis; face, audio and pace aggregates come from here
+            "timeline": SessionTimeline(),
             "metrics": {
-                "eye_contact": {"yes": 0, "limited": 0, "total": 0},
-                "emotion": {"happy": 0, "neutral": 0, "sad": 0, "angry": 0, "surprise": 0, "total": 0},
-                "posture": {"good": 0, "poor": 0, "total": 0},
-                "audio_quality": {"excellent": 0, "good": 0, "moderate": 0, "low": 0, "none": 0, "total": 0}
+                "speech": {"word_count": 0, "wpm": 0.0, "filler_words": {}, "filler_total": 0}
             }
         }
         
-        # Register connection with manager
-        await manager.connect(session_id, websocket)
+        # Register connection with manager, and with the shared store so any worker can reach it
+        try:
+            await manager.connect(websocket, session_id, session_data)
+        except SessionLimitError as e:
+            logger.warning(f"Rejecting session {session_id}: {e}")
+            await websocket.send_json({"type": WSMessageType.ERROR, "data": {"error": str(e)}})
+            await websocket.close(code=1013)
+            return
+        await session_store.register(session_id)
         
         # Start periodic feedback task
         feedback_task = asyncio.create_task(
             periodic_feedback(websocket, session_id, session_data)
         )
+        transcription_task = asyncio.create_task(
+            live_transcription(websocket, session_id, session_data)
+        )
         
         # Process incoming messages
         try:
@@ -86,7 +125,7 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                 
                 # Process message based on type
                 if message["type"] == WSMessageType.PING:
-                    await websocket.send_json({"type": WSMessageType.PONG})
+                    manager.send(session_id, {"type": WSMessageType.PONG})
                 
                 elif message["type"] == WSMessageType.VIDEO_FRAME:
                     # Log only once per second instead of every frame
@@ -101,7 +140,8 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                 
                 elif message["type"] == WSMessageType.AUDIO_CHUNK:
                     logger.debug(f"Received audio chunk from session {session_id}")
-                    session_data["last_audio"] = message["data"]
+                    # Decoded incrementally into the session's ring buffer
+                    session_data["audio_ingest"].feed(message["data"])
                 
                 else:
                     logger.warning(f"Received unknown message type from session {session_id}: {message['type']}")
@@ -111,29 +151,80 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
         except asyncio.TimeoutError:
             logger.warning(f"WebSocket timeout for session {session_id}")
         finally:
-            # Cancel feedback task
-            feedback_task.cancel()
-            try:
-                await feedback_task
-            except asyncio.CancelledError:
-                pass
+            # Cancel feedback and transcription tasks
+            for task in (feedback_task, transcription_task):
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
             
-            # Disconnect from manager
-            await manager.disconnect(session_id)
+            # After a reconnect the session id belongs to the new socket, which also archives it; leave it alone
+            replaced = manager.replaced(session_id, websocket)
+
+            # Drop any analysis still waiting for a worker
+            if not replaced:
+                scheduler.release(session_id)
+            await session_data["audio_ingest"].close()
+
+            # Disconnect from manager; the final metrics stay readable from the store
+            await manager.disconnect(session_id, websocket=websocket)
+            if not replaced:
+                await save_session_metrics(session_id, session_data)
+                await session_store.unregister(session_id)
+                archive_session(session_id, session_data)
             logger.info(f"Session {session_id} disconnected and cleanup complete")
     
     except Exception as e:
         logger.error(f"Error in WebSocket endpoint for session {session_id}: {e}", exc_info=True)
         try:
-            await manager.disconnect(session_id)
+            if not manager.replaced(session_id, websocket):
+                await session_store.unregister(session_id)
+            await manager.disconnect(session_id, websocket=websocket)
         except:
             pass
 
+def session_metrics(session_data: Dict) -> Dict:
+    """Session-wide aggregates from the timeline plus speech and cadence stats"""
+    return {**session_data["timeline"].aggregate(), **session_data["metrics"]}
+
+def archive_session(session_id: str, session_data: Dict):
+    """Queue the finished session's compressed timeline and summary for the batched archive write"""
+    timeline = session_data["timeline"]
+    if timeline.count == 0:
+        return
+    try:
+        metrics = session_metrics(session_data)
+        session_archiver.archive({
+            "session_id": session_id,
+            "started_at": session_data["started_at"],
+            "ended_at": datetime.now(),
+            "metrics": metrics,
+            "summary": get_session_summary(metrics),
+            "timeline": timeline.compressed()
+        })
+    except Exception as e:
+        logger.error(f"Failed to archive session {session_id}: {e}")
+
+async def save_session_metrics(session_id: str, session_data: Dict):
+    """Publish the session's metrics to the shared store"""
+    try:
+        await session_store.save_metrics(session_id, session_metrics(session_data))
+    except Exception as e:
+        logger.error(f"Failed to save metrics for session {session_id}: {e}")
+
+async def handle_session_event(event: Dict):
+    """Act on events published by any worker for sessions held by this one"""
+    session_id = event.get("session_id")
+    if event.get("type") == "stop" and session_id in manager.active_connections:
+        logger.info(f"Stopping session {session_id} on request from another worker")
+        await manager.disconnect(session_id)
+
 # ADDED: New function to send initial feedback
-async def send_initial_feedback(websocket, session_id):
+async def send_initial_feedback(session_id):
     """Send initial feedback immediately after connection"""
     try:
-        await websocket.send_json({
+        manager.send(session_id, {
             "type": WSMessageType.FEEDBACK,
             "data": {
                 "timestamp": datetime.now().isoformat(),
@@ -154,10 +245,10 @@ async def send_initial_feedback(websocket, session_id):
         logger.error(f"Error sending initial feedback for session {session_id}: {e}")
 
 # ADDED: New function to send dummy feedback
-async def send_dummy_feedback(websocket, session_id):
+async def send_dummy_feedback(session_id):
     """Send dummy feedback for testing"""
     try:
-        await websocket.send_json({
+        manager.send(session_id, {
             "type": WSMessageType.FEEDBACK,
             "data": {
                 "timestamp": datetime.now().isoformat(),
@@ -177,10 +268,10 @@ async def send_dummy_feedback(websocket, session_id):
     except Exception as e:
         logger.error(f"Error sending dummy feedback for session {session_id}: {e}")
 
-async def send_fallback_feedback(websocket, session_id, error_message):
+async def send_fallback_feedback(session_id, error_message):
     """Send fallback feedback when analysis fails"""
     try:
-        await websocket.send_json({
+        manager.send(session_id, {
             "type": WSMessageType.FEEDBACK,
             "data": {
                 "error": error_message,
@@ -216,7 +307,7 @@ async def keep_alive(websocket: WebSocket, session_id: str):
                 
             logger.debug(f"Sending PING to session {session_id}")
             try:
-                await websocket.send_json({"type": WSMessageType.PING})
+                manager.send(session_id, {"type": WSMessageType.PING})
                 
                 # Check last ping time
                 session_data = manager.get_session_data(session_id)
@@ -236,13 +327,73 @@ async def keep_alive(websocket: WebSocket, session_id: str):
         except:
             pass
 
+def stage_runner(session_id: str):
+    """Run face/audio stages on the scheduler's process pool and the LLM stage in a thread"""
+    async def run_stage(stage, fn, *args):
+        if stage == FeedbackStage.COACHING:
+            # The Gemini call is network-bound; don't hold a pool worker for it
+            deadline = time.time() + scheduler.timeout
+            return await asyncio.wait_for(
+                asyncio.to_thread(fn, *args, deadline=deadline),
+                timeout=scheduler.timeout
+            )
+        return await scheduler.submit(session_id, fn, *args, timeout=scheduler.timeout, kind=stage)
+    return run_stage
+
+def feedback_emitter(session_id: str, session_data: Dict):
+    """Send each stage result as a FEEDBACK message and record the analysis on the session timeline"""
+    stages = {}
+
+    async def emit(stage, data):
+        if stage == FeedbackStage.COACHING:
+            # Stages that failed or timed out are recorded as missing, not as their defaults
+            session_data["timeline"].record(
+                stages.get(FeedbackStage.FACE), stages.get(FeedbackStage.AUDIO),
+                wpm=session_data["metrics"]["speech"].get("wpm")
+            )
+        else:
+            stages[stage] = data
+        manager.send(session_id, {
+            "type": WSMessageType.FEEDBACK,
+            "data": {**data, "stage": stage, "partial": stage != FeedbackStage.COACHING}
+        })
+    return emit
+
+async def live_transcription(websocket: WebSocket, session_id: str, session_data: Dict):
+    """Stream partial and final transcript segments as the session's speech is decoded"""
+    transcriber = session_data["transcriber"]
+
+    async def run(fn, audio):
+        return await scheduler.submit(session_id, fn, audio, timeout=ASR_TIMEOUT, kind="asr")
+
+    try:
+        while True:
+            await asyncio.sleep(TRANSCRIPTION_STEP)
+            if websocket.client_state == WebSocketState.DISCONNECTED:
+                break
+            segments = await transcriber.step(run)
+            if not segments:
+                continue
+            if any(segment["final"] for segment in segments):
+                stats = transcriber.stats()
+                stats.pop("recent_text")
+                session_data["metrics"]["speech"] = stats
+                await save_session_metrics(session_id, session_data)
+            for segment in segments:
+                manager.send(session_id, {"type": WSMessageType.TRANSCRIPT, "data": segment})
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Live transcription error for session {session_id}: {e}", exc_info=True)
+
 # Update periodic feedback to track metrics
 async def periodic_feedback(websocket: WebSocket, session_id: str, session_data: Dict):
-    """Send periodic feedback based on latest frame and audio"""
+    """Send feedback based on latest frame and audio whenever the scene changes or the cadence timer expires"""
     try:
+        cadence = session_data["cadence"]
         while True:
-            # Wait for next feedback interval
-            await asyncio.sleep(10)  # Send feedback every 10 seconds
+            # Cheap change checks run often; full analyses only when warranted
+            await asyncio.sleep(CHECK_INTERVAL)
             
             # Check if websocket is still connected
             if websocket.client_state == WebSocketState.DISCONNECTED:
@@ -252,18 +403,30 @@ async def periodic_feedback(websocket: WebSocket, session_id: str, session_data:
             # Check if we have data to analyze
             try:
                 has_frame = session_data["last_frame"] is not None
-                has_audio = session_data["last_audio"] is not None
-                
-                # Only log once that we're generating feedback
-                logger.info(f"Generating periodic feedback for session {session_id}")
-                
-                # Skip detailed logging about frame/audio presence
                 
                 # If analysis is already in progress, skip this round
                 if session_data["analysis_in_progress"]:
                     logger.debug(f"Analysis already in progress for session {session_id}, skipping")
                     continue
                 
+                # Decide from frame difference, audio level and face movement whether anything changed;
+                # under load the scheduler's stretched interval is the minimum gap between analyses
+                # VAD state is only read on the loop; the frame work goes to a thread
+                audio_ingest = session_data["audio_ingest"]
+                speech_ratio = audio_ingest.activity(CHECK_INTERVAL)["speech_ratio"] if audio_ingest else 0.0
+                snapshot = await asyncio.to_thread(
+                    take_snapshot, session_data["last_frame"], audio_ingest, speech_ratio
+                )
+                min_interval = (scheduler.next_interval(session_id) if scheduler.load_factor() > 1.0
+                                else MIN_FEEDBACK_INTERVAL)
+                analyze = cadence.should_analyze(snapshot, min_interval)
+                session_data["metrics"]["cadence"] = cadence.stats()
+                if not analyze:
+                    continue
+                
+                # Only log once that we're generating feedback
+                logger.info(f"Generating periodic feedback for session {session_id}")
+                
                 # Mark analysis as in progress
                 session_data["analysis_in_progress"] = True
                 
@@ -271,67 +434,38 @@ async def periodic_feedback(websocket: WebSocket, session_id: str, session_data:
                 if has_frame:
                     # Get the frame data
                     frame = session_data["last_frame"]
-                    audio_data = session_data["last_audio"]
+                    audio_ingest = session_data["audio_ingest"]
+                    audio_data = audio_ingest.latest(AUDIO_ANALYSIS_WINDOW)
                     
                     try:
-                        # Run analysis with timeout
-                        result = await asyncio.wait_for(
-                            asyncio.to_thread(run_analysis_once, frame, audio_data),
-                            timeout=5.0  # 5 second timeout
+                        # Push each stage to the client as soon as it completes
+                        result = await run_analysis_pipeline(
+                            frame, audio_data,
+                            run_stage=stage_runner(session_id),
+                            emit=feedback_emitter(session_id, session_data),
+                            speech_activity={
+                                **audio_ingest.activity(SPEECH_ACTIVITY_WINDOW),
+                                **session_data["transcriber"].stats()
+                            }
                         )
-                        
-                        # Update metrics with the result
-                        if result:
-                            metrics = session_data["metrics"]
-                            
-                            # Update eye contact metrics
-                            if "eye_contact" in result:
-                                eye_contact = result["eye_contact"]
-                                metrics["eye_contact"]["total"] += 1
-                                if eye_contact in metrics["eye_contact"]:
-                                    metrics["eye_contact"][eye_contact] += 1
-                            
-                            # Update emotion metrics
-                            if "emotion" in result:
-                                emotion = result["emotion"]
-                                metrics["emotion"]["total"] += 1
-                                if emotion in metrics["emotion"]:
-                                    metrics["emotion"][emotion] += 1
-                            
-                            # Update posture metrics
-                            if "posture" in result:
-                                posture = result["posture"]
-                                metrics["posture"]["total"] += 1
-                                if posture in metrics["posture"]:
-                                    metrics["posture"][posture] += 1
-                            
-                            # Update audio quality metrics
-                            if "audio_quality" in result:
-                                audio_quality = result["audio_quality"]
-                                metrics["audio_quality"]["total"] += 1
-                                if audio_quality in metrics["audio_quality"]:
-                                    metrics["audio_quality"][audio_quality] += 1
-                        
-                        # Send feedback to client
-                        await websocket.send_json({
-                            "type": WSMessageType.FEEDBACK,
-                            "data": result
-                        })
-                        
+                        cadence.on_result(result)
+                        await save_session_metrics(session_id, session_data)
                         logger.info(f"Sent feedback to session {session_id}")
-                    except asyncio.TimeoutError:
-                        logger.warning(f"Analysis timed out for session {session_id}")
-                        await send_fallback_feedback(websocket, session_id, "Analysis is taking longer than expected")
+                    except asyncio.TimeoutError as e:
+                        # A face or audio stage timed out, so no coaching was generated this tick
+                        logger.warning(f"Analysis timed out for session {session_id}: {e}")
+                        await send_fallback_feedback(session_id, "Analysis is taking longer than expected")
                     except Exception as e:
                         logger.error(f"Error in analysis for session {session_id}: {e}")
-                        await send_fallback_feedback(websocket, session_id, "Analysis encountered an error")
+                        await send_fallback_feedback(session_id, "Analysis encountered an error")
                     finally:
                         # Mark analysis as complete
                         session_data["analysis_in_progress"] = False
                 else:
                     logger.warning(f"No frame data available for session {session_id}")
+                    session_data["analysis_in_progress"] = False
                     # Send placeholder feedback
-                    await websocket.send_json({
+                    manager.send(session_id, {
                         "type": WSMessageType.FEEDBACK,
                         "data": {
                             "timestamp": datetime.now().isoformat(),
@@ -351,28 +485,53 @@ async def periodic_feedback(websocket: WebSocket, session_id: str, session_data:
             except Exception as e:
                 logger.error(f"Error generating feedback for session {session_id}: {e}")
                 try:
-                    await send_fallback_feedback(websocket, session_id, "Error generating feedback")
+                    await send_fallback_feedback(session_id, "Error generating feedback")
                 except:
                     pass
                 
     except Exception as e:
         logger.error(f"Periodic feedback error for session {session_id}: {e}")
 
+@router.get("/scheduler/metrics", dependencies=[Depends(require_internal_access)])
+async def get_scheduler_metrics():
+    """Get load and throughput metrics for the live analysis process pool, LLM feedback and client connections"""
+    return {**scheduler.stats(), "feedback": feedback_service.stats(), "llm": llm_client.stats(),
+            "connections": manager.stats(), "archive": session_archiver.stats()}
+
 # Add a new endpoint to get session metrics
 @router.get("/session/{session_id}/metrics")
 async def get_session_metrics(session_id: str):
-    """Get metrics for a session"""
+    """Get metrics for a session held by any worker"""
     try:
-        # Get session data from manager
+        # Live data when this worker holds the socket, otherwise the last published metrics
         session_data = manager.get_session_data(session_id)
-        if not session_data or "metrics" not in session_data:
+        metrics = session_metrics(session_data) if session_data else await session_store.get_metrics(session_id)
+        if not metrics:
             raise HTTPException(status_code=404, detail="Session metrics not found")
         
-        return {"session_id": session_id, "metrics": session_data["metrics"]}
+        return {"session_id": session_id, "metrics": metrics}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to get metrics for session {session_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to get session metrics")
 
+@router.get("/session/{session_id}/timeline")
+async def get_session_timeline(session_id: str, window: Optional[float] = None,
+                               max_points: int = TIMELINE_MAX_POINTS):
+    """Get the per-analysis time series of a session held by this worker, optionally the last window seconds"""
+    session_data = manager.get_session_data(session_id)
+    if not session_data or "timeline" not in session_data:
+        raise HTTPException(status_code=404, detail="Session timeline not found")
+    
+    timeline = session_data["timeline"]
+    return {
+        "session_id": session_id,
+        "columns": list(TIMELINE_COLUMNS),
+        "rows": timeline.rows(window, min(max_points, TIMELINE_MAX_POINTS)),
+        "aggregate": timeline.aggregate(window)
+    }
+
 # Update stop_session to include metrics
 @router.post("/session/{session_id}/stop")
 async def stop_session(session_id: str):
@@ -380,17 +539,22 @@ async def stop_session(session_id: str):
     try:
         logger.info(f"Stopping session {session_id}")
         
-        # Get session metrics before disconnecting
         session_data = manager.get_session_data(session_id)
-        metrics = session_data.get("metrics", {}) if session_data else {}
-        
-        # Disconnect the session
-        await manager.disconnect(session_id)
+        if session_data:
+            # Held by this worker; get session metrics before disconnecting
+            metrics = session_metrics(session_data)
+            await manager.disconnect(session_id)
+        else:
+            # Ask the worker holding the socket to stop it and wait for its final metrics
+            await session_store.publish({"type": "stop", "session_id": session_id})
+            await session_store.wait_released(session_id, STOP_WAIT_TIMEOUT)
+            metrics = await session_store.get_metrics(session_id) or {}
         
         return {
             "status": "stopped", 
             "session_id": session_id,
-            "metrics": metrics
+            "metrics": metrics,
+            "summary": get_session_summary(metrics) if metrics else None
         }
     except Exception as e:
         logger.error(f"Failed to stop session {session_id}: {e}", exc_info=True)
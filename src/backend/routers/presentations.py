@@ -9,11 +9,14 @@ from bson import ObjectId
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from models.user_models import UserResponse as User
-from database.cloud_db_controller import CloudDBController
+from database.async_db_controller import AsyncCloudDBController, get_async_db
 from dependencies.auth import get_current_active_user
 from models import FileName
 from models.schemas import UploadResponse
-from scripts.powerpoint_analysis.pptx_analysis import analyze_presentation
+from scripts.plugins import lazy_attr
+
+# Loaded on the first analysis rather than at import
+analyze_presentation = lazy_attr("scripts.powerpoint_analysis.pptx_analysis", "analyze_presentation")
 
 router = APIRouter(
     prefix="/api/presentations",
@@ -25,14 +28,13 @@ router = APIRouter(
 UPLOAD_DIR = Path("uploads/presentations")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-DB_CONNECTION = CloudDBController()
-
 logger = logging.getLogger(__name__)
 
 @router.post("/upload/", response_model=UploadResponse, response_description="Upload PowerPoint presentation")
 async def upload_presentation(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncCloudDBController = Depends(get_async_db)
 ):
     """Handles PowerPoint presentation upload and saves it to the server."""
     logger.info(f"Upload request received from user: {current_user}")
@@ -73,9 +75,7 @@ async def upload_presentation(
         }
 
         # Save to database
-        logger.info("Connecting to database")
-        DB_CONNECTION.connect()
-        presentation_result = DB_CONNECTION.add_document("JagCoaching", "presentations_files", presentation_doc)
+        presentation_result = await db.add_document("JagCoaching", "presentations_files", presentation_doc)
         logger.info(f"Presentation saved to database with ID: {presentation_result.inserted_id}")
 
         return {"filename": unique_filename, "status": "uploaded"}
@@ -83,14 +83,12 @@ async def upload_presentation(
     except Exception as e:
         logger.error(f"Error during upload: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if DB_CONNECTION.client:
-            DB_CONNECTION.client.close()
 
 @router.post("/analyze/", response_description="Analyze PowerPoint presentation")
 async def analyze_ppt(
     file_name: FileName,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncCloudDBController = Depends(get_async_db)
 ):
     """Analyzes a PowerPoint presentation"""
     logger.info(f"Starting presentation analysis for file: {file_name.file_name}")
@@ -102,20 +100,17 @@ async def analyze_ppt(
         if not presentation_path.exists():
             # If not found, try to find the most recent presentation uploaded by this user
             logger.info(f"Presentation not found at {presentation_path}, looking for recent uploads")
-            DB_CONNECTION.connect()
             user_id = str(current_user["_id"])
             
-            # Get all presentations for this user
-            presentations = list(DB_CONNECTION.find_documents(
+            # Get the newest presentation for this user
+            presentation = await db.find_latest_by_owner(
                 "JagCoaching", 
                 "presentations_files", 
-                {"user_id": user_id}
-            ))
+                user_id,
+                projection={"file_path": 1}
+            )
             
-            # Sort manually by upload_date (newest first)
-            if presentations:
-                presentations.sort(key=lambda x: x.get("upload_date", datetime.min), reverse=True)
-                presentation = presentations[0]
+            if presentation:
                 presentation_id = str(presentation["_id"])
                 stored_path = presentation.get("file_path")
                 if stored_path:
@@ -131,7 +126,7 @@ async def analyze_ppt(
         
         # Analyze presentation
         logger.info("Starting presentation analysis...")
-        analysis_result = analyze_presentation(str(presentation_path))
+        analysis_result = await analyze_presentation(str(presentation_path))
         logger.info("Presentation analysis completed")
         
         # Add feedback_type to identify this as presentation feedback
@@ -139,7 +134,6 @@ async def analyze_ppt(
         
         # Update database with analysis results
         logger.info("Updating database with analysis results...")
-        DB_CONNECTION.connect()
         
         # Create a presentation analysis record
         presentation_analysis = {
@@ -152,7 +146,7 @@ async def analyze_ppt(
         }
         
         # Insert the presentation analysis record
-        analysis_result_db = DB_CONNECTION.add_document("JagCoaching", "presentations_analysis", presentation_analysis)
+        analysis_result_db = await db.add_document("JagCoaching", "presentations_analysis", presentation_analysis)
         analysis_id = str(analysis_result_db.inserted_id)
         
         # Add analysis_id to the response
@@ -164,27 +158,24 @@ async def analyze_ppt(
     except Exception as e:
         logger.error(f"Error analyzing presentation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
-    finally:
-        if DB_CONNECTION.client:
-            DB_CONNECTION.client.close()
 
 @router.get("/analysis/", response_description="Get all PowerPoint presentation analyses for the current user")
 async def get_presentation_analyses(
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncCloudDBController = Depends(get_async_db)
 ):
     """Retrieves all PowerPoint presentation analyses for the current user."""
     logger.info(f"Fetching presentation analyses for user: {current_user}")
     
     try:
-        DB_CONNECTION.connect()
         user_id = str(current_user["_id"])
         
         # Get all presentation analyses for this user
-        analyses = list(DB_CONNECTION.find_documents(
+        analyses = await db.find_documents(
             "JagCoaching", 
             "presentations_analysis", 
             {"user_id": user_id}
-        ))
+        )
         
         # Convert ObjectId to string for JSON serialization
         for analysis in analyses:
@@ -197,7 +188,4 @@ async def get_presentation_analyses(
         
     except Exception as e:
         logger.error(f"Error fetching presentation analyses: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Failed to fetch analyses: {str(e)}")
-    finally:
-        if DB_CONNECTION.client:
-            DB_CONNECTION.client.close() 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to fetch analyses: {str(e)}")
\ No newline at end of file
@@ -4,9 +4,8 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status, Path, Body  # Added Path and Body
 
 
-from database.cloud_db_controller import CloudDBController
+from database.async_db_controller import AsyncCloudDBController, get_async_db
 from dependencies.auth import (
-    CloudDBController, 
     get_current_active_user, 
     get_current_user, 
     oauth2_scheme, 
@@ -19,6 +18,7 @@ from dependencies.auth import (
 
 from models.user_models import  UserCreate, UserUpdate, UserInDB, UserResponse, User , UserInDB
 from dependencies.auth import get_password_hash
+from dependencies.auth_cache import auth_cache
 from dotenv import load_dotenv
 from datetime import datetime
 from bson.objectid import ObjectId
@@ -33,7 +33,6 @@ SECRET_KEY = os.getenv("SECRET_KEY", "YOUR_SECRET_KEY_HERE")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
-DB_CONNECTION = CloudDBController()
 
 router = APIRouter(
     prefix="/api/users",
@@ -64,7 +63,7 @@ async def list_user_sessions(current_user: dict = Depends(get_current_user)):
     """Returns all active sessions for the current user."""
     try:
         user_id = str(current_user["_id"])
-        sessions = get_user_sessions(user_id)
+        sessions = await get_user_sessions(user_id)
         return {"status": "success", "sessions": sessions}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve sessions: {str(e)}")
@@ -77,7 +76,7 @@ async def terminate_user_session(
 ):
     """Terminates a specific session for the current user."""
     try:
-        result = terminate_session(session_id)
+        result = await terminate_session(session_id)
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Session not found or already terminated.")
         return {"status": "success", "message": f"Session {session_id} terminated."}
@@ -147,20 +146,21 @@ async def terminate_user_session(
 async def change_password(
     current_password: str = Body(...),
     new_password: str = Body(...),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncCloudDBController = Depends(get_async_db)
 ):
     try:
         user_id = str(current_user["_id"])
         
         # Verify current password
-        if not verify_password(current_password, current_user.get("password", "")):
+        if not await verify_password(current_password, current_user.get("password", "")):
             raise HTTPException(status_code=400, detail="Current password is incorrect")
         
         # Hash new password
-        hashed_password = get_password_hash(new_password)
+        hashed_password = await get_password_hash(new_password)
         
         # Update password in database
-        DB_CONNECTION.update_document(
+        await db.update_document(
             "JagCoaching", 
             "users", 
             {"_id": ObjectId(user_id)}, 
@@ -168,26 +168,31 @@ async def change_password(
         )
         
         # Cascade revocation - revoke all refresh tokens
-        tokens_revoked = DB_CONNECTION.revoke_all_user_tokens(
+        tokens_revoked = await db.revoke_all_user_tokens(
             "JagCoaching", 
             user_id, 
             reason="password_change"
         )
+        # Tokens verified before the change must be checked again
+        auth_cache.invalidate_user(user_id)
         
         return {
             "status": "success", 
             "message": "Password changed successfully. All sessions have been terminated.",
             "tokens_revoked": tokens_revoked
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to change password: {str(e)}")
 
 # Add this endpoint for session analytics
 @router.get("/sessions/analytics", response_description="Get detailed session analytics")
-async def get_session_analytics(current_user: dict = Depends(get_current_user)):
+async def get_session_analytics(current_user: dict = Depends(get_current_user),
+                                db: AsyncCloudDBController = Depends(get_async_db)):
     try:
         user_id = str(current_user["_id"])
-        analytics = DB_CONNECTION.get_user_session_analytics("JagCoaching", user_id)
+        analytics = await db.get_user_session_analytics("JagCoaching", user_id)
         
         return {
             "status": "success",
@@ -8,15 +8,18 @@ from bson import ObjectId
 import logging
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Query, Response
 from models.user_models import UserResponse as User
-from database.cloud_db_controller import CloudDBController
+from database.async_db_controller import AsyncCloudDBController, get_async_db
 from dependencies.auth import get_current_user , get_current_active_user
 from models import FileName, VideoCreate
 from models.video_models import Video
 from models.schemas import UploadResponse
 from utils import extract_audio, analyze_audio
-from scripts.SpeechAnalysisObject import SpeechAnalysisObject as SpeechAnalyzer
+from scripts.plugins import lazy_attr
+
+# Loaded on the first analysis rather than at import
+SpeechAnalyzer = lazy_attr("scripts.SpeechAnalysisObject", "SpeechAnalysisObject")
 
 router = APIRouter(
     prefix="/api/videos",  # Changed from "/videos" to "/api/upload"
@@ -28,8 +31,6 @@ router = APIRouter(
 UPLOAD_DIR = Path("uploads/videos")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-DB_CONNECTION = CloudDBController()
-
 logger = logging.getLogger(__name__)
 
 # FIXME: Add authentication back to make it work for uploads
@@ -46,7 +47,8 @@ logger = logging.getLogger(__name__)
 @router.post("/upload/", response_model=UploadResponse, response_description="File upload to server & extracts audio")
 async def upload_video(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncCloudDBController = Depends(get_async_db)
 ):
     """Handles video upload and saves it to the server."""
     logger.info(f"Upload request received from user: {current_user}")
@@ -87,9 +89,7 @@ async def upload_video(
         }
 
         # Save to database
-        logger.info("Connecting to database")
-        DB_CONNECTION.connect()
-        video_result = DB_CONNECTION.add_document("JagCoaching", "videos", video_doc)
+        video_result = await db.add_document("JagCoaching", "videos", video_doc)
         logger.info(f"Video saved to database with ID: {video_result.inserted_id}")
 
         return {"filename": unique_filename, "status": "uploaded"}
@@ -97,9 +97,6 @@ async def upload_video(
     except Exception as e:
         logger.error(f"Error during upload: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if DB_CONNECTION.client:
-            DB_CONNECTION.client.close()
 
 
 
@@ -107,7 +104,8 @@ async def upload_video(
 @router.post("/process-audio/", response_description="Analyze speech from uploaded video")
 async def process_audio(
     file_name: FileName,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncCloudDBController = Depends(get_async_db)
 ):
     """Extracts and analyzes speech from uploaded video"""
     logger.info(f"Starting audio processing for file: {file_name.file_name}")
@@ -119,20 +117,17 @@ async def process_audio(
         if not video_path.exists():
             # If not found, try to find the most recent video uploaded by this user
             logger.info(f"Video not found at {video_path}, looking for recent uploads")
-            DB_CONNECTION.connect()
             user_id = str(current_user["_id"])
             
-            # Get all videos for this user
-            videos = list(DB_CONNECTION.find_documents(
+            # Get the newest video for this user
+            video = await db.find_latest_by_owner(
                 "JagCoaching", 
                 "videos", 
-                {"user_id": user_id}
-            ))
+                user_id,
+                projection={"file_path": 1}
+            )
             
-            # Sort manually by upload_date (newest first)
-            if videos:
-                videos.sort(key=lambda x: x.get("upload_date", datetime.min), reverse=True)
-                video = videos[0]
+            if video:
                 video_id = str(video["_id"])
                 stored_path = video.get("file_path")
                 if stored_path:
@@ -190,7 +185,6 @@ async def process_audio(
 
         # Update database with analysis results and associate with user
         logger.info("Updating database with analysis results...")
-        DB_CONNECTION.connect()
         
         # Create a presentation record with more metadata
         presentation_data = {
@@ -205,11 +199,11 @@ async def process_audio(
         }
         
         # Insert the presentation record
-        presentation_result = DB_CONNECTION.add_document("JagCoaching", "presentations", presentation_data)
+        presentation_result = await db.add_document("JagCoaching", "presentations", presentation_data)
         presentation_id = str(presentation_result.inserted_id)
         
         # Also update the video document
-        DB_CONNECTION.update_document(
+        await db.update_document(
             "JagCoaching", 
             "videos", 
             {"_id": ObjectId(video_id)}, 
@@ -228,9 +222,6 @@ async def process_audio(
     except Exception as e:
         logger.error(f"Error processing audio: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
-    finally:
-        if DB_CONNECTION.client:
-            DB_CONNECTION.client.close()
 
 # Helper functions for presentation data
 def calculate_overall_score(feedback_data):
@@ -358,18 +349,25 @@ def run_video_analysis(video_id: str):
 
 @router.get("/presentations/", response_model=List[Dict[str, Any]])
 async def get_user_presentations(
+    response: Response,
     limit: int = Query(10, ge=0),
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
     sort_by: Optional[str] = Query(None),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncCloudDBController = Depends(get_async_db)
 ):
-    """Get all presentations for the current user"""
+    """
+    Summaries of the current user's presentations, one page at a time.
+
+    Each item carries the title, date, score, summary and the feedback scores the
+    progress charts use; GET /presentations/{id} returns the full feedback. When
+    more pages exist the X-Next-Cursor header holds the cursor for the next one.
+    """
     try:
-        DB_CONNECTION.connect()
         user_id = str(current_user["_id"])
         
         # Determine sort option
-        sort_option = None
+        sort_option = ("created_at", -1)
         if sort_by == "date-desc":
             sort_option = ("created_at", -1)
         elif sort_by == "date-asc":
@@ -380,13 +378,18 @@ async def get_user_presentations(
             sort_option = ("score", 1)
         
         # Retrieve presentations for this user
-        presentations = DB_CONNECTION.get_user_presentations(
-            "JagCoaching", 
-            user_id, 
-            limit=limit,
-            skip=skip,
-            sort_by=sort_option
-        )
+        try:
+            presentations, next_cursor = await db.list_user_presentations(
+                "JagCoaching", 
+                user_id, 
+                limit=limit,
+                sort_by=sort_option,
+                cursor=cursor
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         
         # Convert ObjectId to string for JSON serialization
         for presentation in presentations:
@@ -394,25 +397,24 @@ async def get_user_presentations(
                 presentation["_id"] = str(presentation["_id"])
         
         return presentations
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving presentations: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to retrieve presentations: {str(e)}")
-    finally:
-        if DB_CONNECTION.client:
-            DB_CONNECTION.client.close()
 
 @router.get("/presentations/{presentation_id}", response_model=Dict[str, Any])
 async def get_presentation(
     presentation_id: str,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncCloudDBController = Depends(get_async_db)
 ):
     """Get a specific presentation by ID"""
     try:
-        DB_CONNECTION.connect()
         user_id = str(current_user["_id"])
         
         # Retrieve the presentation
-        presentation = DB_CONNECTION.get_presentation_by_id("JagCoaching", presentation_id)
+        presentation = await db.get_presentation_by_id("JagCoaching", presentation_id)
         
         if not presentation:
             raise HTTPException(status_code=404, detail="Presentation not found")
@@ -431,6 +433,3 @@ async def get_presentation(
     except Exception as e:
         logger.error(f"Error retrieving presentation: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to retrieve presentation: {str(e)}")
-    finally:
-        if DB_CONNECTION.client:
-            DB_CONNECTION.client.close()
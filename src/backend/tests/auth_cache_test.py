@@ -0,0 +1,86 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dependencies import auth_cache as auth_cache_module
+from dependencies.auth_cache import AuthContextCache
+
+
+class FakeClock:
+    """Stands in for the time module; monotonic() and time() advance together"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(auth_cache_module, "time", fake)
+    return fake
+
+
+def _user(user_id):
+    return {"_id": user_id, "email": f"{user_id}@example.com"}
+
+
+def test_entry_lives_for_the_ttl(clock):
+    cache = AuthContextCache(ttl=60)
+    cache.put("token", _user("u1"), clock.now + 3600, "127.0.0.1")
+    clock.now += 59
+    assert cache.get("token").user_id == "u1"
+    clock.now += 1
+    assert cache.get("token") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_entry_never_outlives_the_token(clock):
+    cache = AuthContextCache(ttl=60)
+    cache.put("token", _user("u1"), clock.now + 10, "127.0.0.1")
+    clock.now += 10
+    assert cache.get("token") is None
+    cache.put("expired", _user("u1"), clock.now - 1, "127.0.0.1")
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_user_drops_every_token_of_the_user(clock):
+    cache = AuthContextCache(ttl=60)
+    cache.put("phone", _user("u1"), None, "127.0.0.1")
+    cache.put("laptop", _user("u1"), None, "127.0.0.1")
+    cache.put("other", _user("u2"), None, "127.0.0.1")
+    cache.invalidate_user("u1")
+    assert cache.get("phone") is None
+    assert cache.get("laptop") is None
+    assert cache.get("other").user_id == "u2"
+    assert cache.stats()["users"] == 1
+
+
+def test_invalidate_token_drops_only_that_token(clock):
+    cache = AuthContextCache(ttl=60)
+    cache.put("phone", _user("u1"), None, "127.0.0.1")
+    cache.put("laptop", _user("u1"), None, "127.0.0.1")
+    cache.invalidate_token("phone")
+    assert cache.get("phone") is None
+    assert cache.get("laptop") is not None
+
+
+def test_least_recently_used_token_is_evicted(clock):
+    cache = AuthContextCache(ttl=60, max_size=2)
+    cache.put("a", _user("u1"), None, "127.0.0.1")
+    cache.put("b", _user("u2"), None, "127.0.0.1")
+    assert cache.get("a") is not None
+    cache.put("c", _user("u3"), None, "127.0.0.1")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["users"] == 2
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import indexes
+from database.async_db_controller import AsyncCloudDBController
+from database.cloud_db_controller import token_expiry
+
+
+
+async def _collection_scans():
+    controller = AsyncCloudDBController()
+    try:
+        database = controller.get_database(indexes.DB_NAME)
+        await indexes.ensure_indexes(database)
+        return await indexes.collection_scans(database)
+    finally:
+        await controller.close()
+
+
+# Runs against a real deployment only, e.g. MONGO_URI=mongodb://localhost:27017 pytest
+@pytest.mark.skipif(not os.getenv("MONGO_URI"), reason="MONGO_URI not set")
+def test_hot_queries_use_indexes():
+    assert asyncio.run(_collection_scans()) == []
+
+
+def test_plan_stages_finds_nested_collscan():
+    plan = {"stage": "SORT", "inputStage": {"stage": "OR", "inputStages": [
+        {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}},
+        {"stage": "COLLSCAN"},
+    ]}}
+    assert indexes.plan_stages(plan) == ["SORT", "OR", "FETCH", "IXSCAN", "COLLSCAN"]
+
+
+@pytest.fixture
+def west_of_utc(monkeypatch):
+    # A host clock where a naive local time is hours behind UTC
+    monkeypatch.setenv("TZ", "America/Los_Angeles")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_revocation_outlives_the_ttl_monitor_until_token_exp(west_of_utc):
+    exp = int(time.time()) + 30 * 60   # JWT exp is whole seconds
+    expires_at = token_expiry(exp)
+    # The TTL index compares expires_at with the server's UTC clock
+    assert expires_at.utcoffset().total_seconds() == 0
+    assert expires_at.timestamp() == exp
+    assert expires_at > datetime.now(timezone.utc)
@@ -0,0 +1,124 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.pagination import decode_cursor, encode_cursor, keyset_query
+
+
+def _matches(document, filter_dict):
+    """Enough of MongoDB's query semantics for keyset_query's filters; null also matches a missing field"""
+    for key, condition in filter_dict.items():
+        if key == "$or":
+            if not any(_matches(document, clause) for clause in condition):
+                return False
+            continue
+        value = document.get(key)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for operator, operand in condition.items():
+            if operator == "$ne" and value == operand:
+                return False
+            # Range operators never match null
+            if operator in ("$gt", "$lt") and value is None:
+                return False
+            if operator == "$gt" and not value > operand:
+                return False
+            if operator == "$lt" and not value < operand:
+                return False
+    return True
+
+
+def _sort_key(document, field):
+    # Null sorts before every value, as in MongoDB
+    value = document.get(field)
+    return (value is not None, value if value is not None else 0, document["_id"])
+
+
+def _walk(documents, field, direction, page_size=2):
+    """Every document reached by following cursors page by page"""
+    seen, cursor = [], None
+    while True:
+        filter_dict, sort = keyset_query({"user_id": "u1"}, field, direction, cursor)
+        assert sort == [(field, direction), ("_id", direction)]
+        page = sorted((d for d in documents if _matches(d, filter_dict)),
+                      key=lambda d: _sort_key(d, field), reverse=direction < 0)[:page_size]
+        if not page:
+            return seen
+        seen.extend(d["_id"] for d in page)
+        cursor = encode_cursor(page[-1], field, direction)
+
+
+# Ties on score and documents without one, owned by one user, plus another user's document
+DOCUMENTS = [
+    {"_id": 1, "user_id": "u1", "score": 70},
+    {"_id": 2, "user_id": "u1", "score": 85},
+    {"_id": 3, "user_id": "u1", "score": 70},
+    {"_id": 4, "user_id": "u1"},
+    {"_id": 5, "user_id": "u1", "score": None},
+    {"_id": 6, "user_id": "u1", "score": 85},
+    {"_id": 7, "user_id": "u1", "score": 70},
+    {"_id": 8, "user_id": "u2", "score": 90},
+]
+
+
+def test_first_page_has_no_range():
+    assert keyset_query({"user_id": "u1"}, "score", -1) == (
+        {"user_id": "u1"}, [("score", -1), ("_id", -1)])
+
+
+def test_ascending_cursor_on_value():
+    cursor = encode_cursor({"_id": 3, "score": 70}, "score", 1)
+    filter_dict, _ = keyset_query({"user_id": "u1"}, "score", 1, cursor)
+    assert filter_dict == {"user_id": "u1", "$or": [
+        {"score": {"$gt": 70}},
+        {"score": 70, "_id": {"$gt": 3}},
+    ]}
+
+
+def test_descending_cursor_on_value_keeps_nulls_after():
+    cursor = encode_cursor({"_id": 3, "score": 70}, "score", -1)
+    filter_dict, _ = keyset_query({"user_id": "u1"}, "score", -1, cursor)
+    assert filter_dict == {"user_id": "u1", "$or": [
+        {"score": {"$lt": 70}},
+        {"score": 70, "_id": {"$lt": 3}},
+        {"score": None},
+    ]}
+
+
+def test_ascending_cursor_on_null_continues_into_values():
+    cursor = encode_cursor({"_id": 4}, "score", 1)
+    filter_dict, _ = keyset_query({"user_id": "u1"}, "score", 1, cursor)
+    assert filter_dict == {"user_id": "u1", "$or": [
+        {"score": None, "_id": {"$gt": 4}},
+        {"score": {"$ne": None}},
+    ]}
+
+
+def test_descending_cursor_on_null_stays_in_nulls():
+    cursor = encode_cursor({"_id": 5, "score": None}, "score", -1)
+    filter_dict, _ = keyset_query({"user_id": "u1"}, "score", -1, cursor)
+    assert filter_dict == {"user_id": "u1", "$or": [
+        {"score": None, "_id": {"$lt": 5}},
+    ]}
+
+
+@pytest.mark.parametrize("direction, expected", [
+    (1, [4, 5, 1, 3, 7, 2, 6]),
+    (-1, [6, 2, 7, 3, 1, 5, 4]),
+])
+def test_pages_visit_ties_and_nulls_once_in_order(direction, expected):
+    assert _walk(DOCUMENTS, "score", direction) == expected
+
+
+def test_cursor_for_another_sort_is_rejected():
+    cursor = encode_cursor({"_id": 1, "score": 70}, "score", 1)
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "score", -1)
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "created_at", 1)
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor", "score", 1)
@@ -0,0 +1,111 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dependencies import rate_limiter as rate_limiter_module
+from dependencies.rate_limiter import InMemoryRateLimiter, SQLiteRateLimiter
+
+
+class FakeClock:
+    """Stands in for the time module; both limiters read only monotonic() or time()"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter_module, "time", fake)
+    return fake
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_limiter(request, tmp_path):
+    limiters = []
+
+    def make(**kwargs):
+        if request.param == "sqlite":
+            limiter = SQLiteRateLimiter(str(tmp_path / "rate_limits.db"), prune_interval=0, **kwargs)
+        else:
+            limiter = InMemoryRateLimiter(**kwargs)
+        limiters.append(limiter)
+        return limiter
+
+    yield make
+    for limiter in limiters:
+        asyncio.run(limiter.close())
+
+
+def _hits(limiter, key, n):
+    async def run():
+        return [await limiter.hit(key) for _ in range(n)]
+    return asyncio.run(run())
+
+
+def test_limit_is_reached_within_the_window(clock, make_limiter):
+    limiter = make_limiter(limit=3, window=60)
+    assert _hits(limiter, "ip", 2) == [1, 2]
+    assert not asyncio.run(limiter.is_limited("ip"))
+    _hits(limiter, "ip", 1)
+    assert asyncio.run(limiter.is_limited("ip"))
+    assert not asyncio.run(limiter.is_limited("other"))
+
+
+def test_window_slides_as_the_oldest_attempt_leaves(clock, make_limiter):
+    limiter = make_limiter(limit=3, window=60)
+    _hits(limiter, "ip", 1)
+    clock.now += 30
+    _hits(limiter, "ip", 2)
+    assert asyncio.run(limiter.is_limited("ip"))
+    # Only the first attempt has left the window
+    clock.now += 31
+    assert asyncio.run(limiter.count("ip")) == 2
+    assert not asyncio.run(limiter.is_limited("ip"))
+
+
+def test_only_the_newest_attempts_are_kept(clock, make_limiter):
+    limiter = make_limiter(limit=3, window=60)
+    assert _hits(limiter, "ip", 10)[-1] == 3
+    clock.now += 30
+    _hits(limiter, "ip", 1)
+    clock.now += 31
+    assert asyncio.run(limiter.count("ip")) == 1
+
+
+def test_idle_keys_expire(clock):
+    limiter = InMemoryRateLimiter(limit=3, window=60)
+    _hits(limiter, "a", 1)
+    clock.now += 30
+    _hits(limiter, "b", 1)
+    clock.now += 31
+    assert asyncio.run(limiter.count("a")) == 0
+    assert limiter.stats()["keys"] == 1
+    clock.now += 30
+    assert asyncio.run(limiter.count("b")) == 0
+    assert limiter.stats()["keys"] == 0
+    assert limiter.stats()["expired"] == 2
+
+
+def test_key_cap_evicts_the_key_idle_longest(clock, make_limiter):
+    limiter = make_limiter(limit=3, window=60, max_keys=2)
+    _hits(limiter, "first", 1)
+    clock.now += 1
+    _hits(limiter, "second", 1)
+    clock.now += 1
+    # first was seen before second but is the most recently active
+    _hits(limiter, "first", 1)
+    clock.now += 1
+    _hits(limiter, "third", 1)
+    assert asyncio.run(limiter.count("first")) == 2
+    assert asyncio.run(limiter.count("second")) == 0
+    assert asyncio.run(limiter.count("third")) == 1
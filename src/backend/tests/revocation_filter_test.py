@@ -0,0 +1,103 @@
+import os
+import sys
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from bson.objectid import ObjectId
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.cloud_db_controller import token_digest
+from dependencies.revocation_filter import WATERMARK_OVERLAP, RevocationFilter
+
+NOW = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+
+
+class FakeRevocations:
+    """revoked_tokens as the async controller reads it, with an optional gate to hold a query open"""
+
+    def __init__(self):
+        self.entries = []   # (ObjectId, digest)
+        self.queries = []
+        self.gate = None
+
+    def revoke(self, token, at=NOW):
+        self.entries.append((ObjectId.from_datetime(at), token_digest(token)))
+
+    async def find_revocations(self, db_name, since_id=None):
+        self.queries.append(since_id)
+        if self.gate is not None:
+            await self.gate.wait()
+        return [(_id, digest) for _id, digest in self.entries if since_id is None or _id >= since_id]
+
+    async def is_token_revoked(self, db_name, token):
+        digest = token_digest(token)
+        return next(({"token_hash": d} for _, d in self.entries if d == digest), None)
+
+
+def test_every_check_queries_until_the_first_load():
+    db = FakeRevocations()
+    revocations = RevocationFilter()
+    assert revocations.might_be_revoked("token")
+    assert asyncio.run(revocations.lookup(db, "token")) is None
+    assert revocations.stats()["false_positives"] == 1
+
+
+def test_loaded_filter_answers_negatives_without_a_query():
+    db = FakeRevocations()
+    db.revoke("revoked")
+    revocations = RevocationFilter()
+    asyncio.run(revocations._load(db))
+    queries = len(db.queries)
+    assert asyncio.run(revocations.lookup(db, "valid")) is None
+    assert asyncio.run(revocations.lookup(db, "revoked")) == {"token_hash": token_digest("revoked")}
+    assert len(db.queries) == queries
+    assert revocations.stats()["negatives"] == 1
+    assert revocations.stats()["confirmed"] == 1
+
+
+def test_poll_rereads_the_overlap_behind_the_watermark():
+    db = FakeRevocations()
+    db.revoke("first")
+    revocations = RevocationFilter()
+    asyncio.run(revocations._load(db))
+    since = revocations._since()
+    assert since.generation_time == NOW - timedelta(seconds=WATERMARK_OVERLAP)
+    # Written later by a worker whose clock runs behind
+    db.revoke("late", at=NOW - timedelta(seconds=WATERMARK_OVERLAP // 2))
+    asyncio.run(revocations._load(db, since))
+    assert revocations.known_revoked("late")
+    assert revocations._since() == since
+
+
+def test_watermark_follows_the_newest_revocation():
+    db = FakeRevocations()
+    db.revoke("first")
+    revocations = RevocationFilter()
+    asyncio.run(revocations._load(db))
+    db.revoke("second", at=NOW + timedelta(minutes=5))
+    asyncio.run(revocations._load(db, revocations._since()))
+    assert revocations._since().generation_time == NOW + timedelta(minutes=5, seconds=-WATERMARK_OVERLAP)
+
+
+def test_full_reload_keeps_local_adds_and_drops_deleted_entries():
+    db = FakeRevocations()
+    db.revoke("expired")
+    revocations = RevocationFilter()
+    asyncio.run(revocations._load(db))
+    # The TTL index removed the entry; a reload should forget it
+    db.entries.clear()
+    db.revoke("other")
+
+    async def reload_with_a_local_revocation():
+        db.gate = asyncio.Event()
+        reload = asyncio.create_task(revocations._load(db))
+        await asyncio.sleep(0)
+        revocations.add("logged_out")
+        db.gate.set()
+        await reload
+
+    asyncio.run(reload_with_a_local_revocation())
+    assert revocations.known_revoked("logged_out")
+    assert revocations.known_revoked("other")
+    assert not revocations.known_revoked("expired")
+    assert revocations._added_during_load is None
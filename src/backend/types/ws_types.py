@@ -6,4 +6,10 @@ class WSMessageType(str, Enum):
     VIDEO_FRAME = "video_frame"
     AUDIO_CHUNK = "audio_chunk"
     FEEDBACK = "feedback"
-    ERROR = "error" 
\ No newline at end of file
+    TRANSCRIPT = "transcript"
+    ERROR = "error"
+
+class FeedbackStage(str, Enum):
+    FACE = "face"
+    AUDIO = "audio"
+    COACHING = "coaching"
@@ -1,8 +1,11 @@
 from pathlib import Path
 import logging
 from pydub import AudioSegment
-from scripts import speech_analysis
-from scripts.SpeechAnalysisObject import SpeechAnalysisObject as SpeechAnalyzer
+from scripts.plugins import lazy, lazy_attr
+
+# The speech stack (torch, transformers, librosa) loads on the first analysis
+speech_analysis = lazy("scripts.speech_analysis")
+SpeechAnalyzer = lazy_attr("scripts.SpeechAnalysisObject", "SpeechAnalysisObject")
 
 logger = logging.getLogger(__name__)
 
@@ -0,0 +1,252 @@
+""" Session state shared between workers, so any worker can read metrics or stop a session """
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Store configuration
+LIVE_SESSION_STORE = os.getenv("LIVE_SESSION_STORE", "memory")
+LIVE_SESSION_DB = os.getenv("LIVE_SESSION_DB", "live_sessions.db")
+EVENT_POLL_INTERVAL = 0.25      # seconds between checks for events from other workers
+EVENT_RETENTION = 60.0          # published events older than this are pruned
+SESSION_RETENTION = 3600.0      # metrics of finished sessions are kept this long
+
+# Identifies the process holding a session's WebSocket
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+EventHandler = Callable[[Dict], Awaitable[None]]
+
+
+class SessionStore(ABC):
+    """
+    Session state backend.
+
+    The worker holding a session's WebSocket registers it and saves its metrics as
+    they change; any worker can read them. Events such as a stop request are
+    published on a channel every worker subscribes to, and the owning worker acts
+    on them.
+    """
+
+    def __init__(self):
+        self._handlers: List[EventHandler] = []
+
+    @abstractmethod
+    async def register(self, session_id: str):
+        ...
+
+    @abstractmethod
+    async def unregister(self, session_id: str):
+        """Mark the session as no longer held by a worker; its metrics stay readable"""
+        ...
+
+    @abstractmethod
+    async def owner(self, session_id: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def save_metrics(self, session_id: str, metrics: Dict):
+        ...
+
+    @abstractmethod
+    async def get_metrics(self, session_id: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def publish(self, event: Dict):
+        ...
+
+    async def start(self, handler: EventHandler):
+        """Deliver published events to handler"""
+        self._handlers.append(handler)
+
+    async def close(self):
+        self._handlers.clear()
+
+    async def wait_released(self, session_id: str, timeout: float) -> bool:
+        """Wait until no worker holds the session"""
+        deadline = time.monotonic() + timeout
+        while await self.owner(session_id) is not None:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+        return True
+
+    async def _dispatch(self, event: Dict):
+        for handler in list(self._handlers):
+            try:
+                await handler(event)
+            except Exception as e:
+                logger.error(f"Error handling session event {event.get('type')}: {e}", exc_info=True)
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store for a single worker"""
+
+    def __init__(self):
+        super().__init__()
+        self._owners: Dict[str, str] = {}
+        self._metrics: Dict[str, Tuple[float, Dict]] = {}
+
+    async def register(self, session_id: str):
+        self._owners[session_id] = WORKER_ID
+
+    async def unregister(self, session_id: str):
+        self._owners.pop(session_id, None)
+        cutoff = time.time() - SESSION_RETENTION
+        for stale in [sid for sid, (updated, _) in self._metrics.items()
+                      if updated < cutoff and sid not in self._owners]:
+            del self._metrics[stale]
+
+    async def owner(self, session_id: str) -> Optional[str]:
+        return self._owners.get(session_id)
+
+    async def save_metrics(self, session_id: str, metrics: Dict):
+        # Stored as JSON so readers get the same snapshot semantics as the shared store
+        self._metrics[session_id] = (time.time(), json.loads(json.dumps(metrics, default=str)))
+
+    async def get_metrics(self, session_id: str) -> Optional[Dict]:
+        entry = self._metrics.get(session_id)
+        return entry[1] if entry else None
+
+    async def publish(self, event: Dict):
+        await self._dispatch(event)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Store shared by every worker on a host through one SQLite file.
+
+    Stands in for Redis: sessions are rows keyed by id, and pub/sub is an
+    append-only events table each worker polls past the last id it has seen.
+    """
+
+    def __init__(self, path: str = LIVE_SESSION_DB, poll_interval: float = EVENT_POLL_INTERVAL):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_event_id = 0
+        self._poll_task: Optional[asyncio.Task] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened lazily so a forked worker never shares its parent's connection
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, worker TEXT, metrics TEXT, updated_at REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql: str, params=()) -> List[tuple]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    async def _run(self, sql: str, params=()) -> List[tuple]:
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    async def register(self, session_id: str):
+        await self._run(
+            "INSERT INTO sessions (session_id, worker, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET worker = excluded.worker, updated_at = excluded.updated_at",
+            (session_id, WORKER_ID, time.time()),
+        )
+
+    async def unregister(self, session_id: str):
+        await self._run(
+            "UPDATE sessions SET worker = NULL, updated_at = ? WHERE session_id = ? AND worker = ?",
+            (time.time(), session_id, WORKER_ID),
+        )
+
+    async def owner(self, session_id: str) -> Optional[str]:
+        rows = await self._run("SELECT worker FROM sessions WHERE session_id = ?", (session_id,))
+        return rows[0][0] if rows else None
+
+    async def save_metrics(self, session_id: str, metrics: Dict):
+        await self._run(
+            "UPDATE sessions SET metrics = ?, updated_at = ? WHERE session_id = ?",
+            (json.dumps(metrics, default=str), time.time(), session_id),
+        )
+
+    async def get_metrics(self, session_id: str) -> Optional[Dict]:
+        rows = await self._run("SELECT metrics FROM sessions WHERE session_id = ?", (session_id,))
+        if not rows or rows[0][0] is None:
+            return None
+        return json.loads(rows[0][0])
+
+    async def publish(self, event: Dict):
+        await self._run("INSERT INTO events (payload, created_at) VALUES (?, ?)",
+                        (json.dumps(event, default=str), time.time()))
+
+    async def start(self, handler: EventHandler):
+        await super().start(handler)
+        if self._poll_task is None:
+            # Only events published from now on are delivered
+            rows = await self._run("SELECT COALESCE(MAX(id), 0) FROM events")
+            self._last_event_id = rows[0][0]
+            self._poll_task = asyncio.create_task(self._poll_events())
+            logger.info(f"Session store {self.path} subscribed as worker {WORKER_ID}")
+
+    async def close(self):
+        await super().close()
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def _poll_events(self):
+        last_prune = time.monotonic()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                rows = await self._run("SELECT id, payload FROM events WHERE id > ? ORDER BY id",
+                                       (self._last_event_id,))
+                for event_id, payload in rows:
+                    self._last_event_id = event_id
+                    await self._dispatch(json.loads(payload))
+
+                if time.monotonic() - last_prune > EVENT_RETENTION:
+                    last_prune = time.monotonic()
+                    now = time.time()
+                    await self._run("DELETE FROM events WHERE created_at < ?", (now - EVENT_RETENTION,))
+                    await self._run("DELETE FROM sessions WHERE worker IS NULL AND updated_at < ?",
+                                    (now - SESSION_RETENTION,))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error polling session events: {e}")
+
+
+def _create_store() -> SessionStore:
+    """LIVE_SESSION_STORE=sqlite shares sessions between workers on one host"""
+    if LIVE_SESSION_STORE.lower() == "sqlite":
+        return SQLiteSessionStore(LIVE_SESSION_DB)
+    return InMemorySessionStore()
+
+
+# Create global instance
+session_store = _create_store()
@@ -1,86 +1,220 @@
 from fastapi import WebSocket
-from typing import Dict, Set
+from typing import Deque, Dict, Optional
+import os
+import time
 import logging
-import json
 import asyncio
-from datetime import datetime
+import collections
 
 logger = logging.getLogger(__name__)
 
+# Connection limits
+MAX_SESSIONS = int(os.getenv("LIVE_MAX_SESSIONS", "50"))
+SEND_QUEUE_SIZE = 32            # messages buffered per connection before stale ones are dropped
+SEND_TIMEOUT = 5.0              # a single send slower than this closes the connection
+STALE_FEEDBACK_SECONDS = 10.0   # queued feedback older than this is not worth sending
+
+
+class SessionLimitError(Exception):
+    """Raised when the server already holds MAX_SESSIONS connections"""
+
+
+def merge_key(message: dict) -> Optional[str]:
+    """
+    Messages with the same key supersede each other while queued: feedback per
+    stage, transcript partials, and pings. Final transcript segments and errors
+    have no key and are always delivered.
+    """
+    message_type = message.get("type")
+    data = message.get("data") or {}
+    if message_type == "feedback":
+        return f"feedback:{data.get('stage', 'coaching')}"
+    if message_type == "transcript" and not data.get("final", True):
+        return "transcript:partial"
+    if message_type in ("ping", "pong"):
+        return message_type
+    return None
+
+
+class Connection:
+    """One client socket with a bounded send queue drained by its own writer task"""
+
+    def __init__(self, websocket: WebSocket, session_id: str, data: dict, queue_size: int = SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.data = data
+        self.queue_size = queue_size
+        # Entries are [merge key, message, enqueue time]
+        self._queue: Deque[list] = collections.deque()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+        self.connected_at = time.monotonic()
+        self.metrics = collections.Counter()
+        self._latencies: Deque[float] = collections.deque(maxlen=200)
+
+    def start(self, on_failure):
+        self._writer = asyncio.create_task(self._write_loop(on_failure))
+
+    def enqueue(self, message: dict) -> bool:
+        """Queue a message without waiting; returns False if the connection is closed"""
+        if self.closed:
+            return False
+        key = merge_key(message)
+        now = time.monotonic()
+        if key is not None:
+            for entry in self._queue:
+                if entry[0] == key:
+                    # Replace the stale message in place so ordering relative to others is kept
+                    entry[1], entry[2] = message, now
+                    self.metrics["merged"] += 1
+                    return True
+        if len(self._queue) >= self.queue_size:
+            self._drop_one()
+        self._queue.append([key, message, now])
+        self._ready.set()
+        return True
+
+    def _drop_one(self):
+        """Make room by dropping the oldest replaceable message, or the oldest message"""
+        for entry in self._queue:
+            if entry[0] is not None:
+                self._queue.remove(entry)
+                break
+        else:
+            self._queue.popleft()
+        self.metrics["dropped"] += 1
+
+    async def _write_loop(self, on_failure):
+        try:
+            while not self.closed:
+                if not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                key, message, queued_at = self._queue.popleft()
+                if key and key.startswith("feedback") and time.monotonic() - queued_at > STALE_FEEDBACK_SECONDS:
+                    self.metrics["dropped_stale"] += 1
+                    continue
+                await asyncio.wait_for(self.websocket.send_json(message), timeout=SEND_TIMEOUT)
+                self.metrics["sent"] += 1
+                self._latencies.append(time.monotonic() - queued_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Send to session {self.session_id} failed ({e!r}); closing connection")
+            self.metrics["send_errors"] += 1
+            await on_failure(self)
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
+        try:
+            await self.websocket.close(code=code)
+        except Exception as e:
+            logger.debug(f"Error closing WebSocket for session {self.session_id}: {e}")
+
+    def stats(self) -> dict:
+        ordered = sorted(self._latencies)
+        return {
+            **dict(self.metrics),
+            "queue_depth": len(self._queue),
+            "connected_for": round(time.monotonic() - self.connected_at, 1),
+            "send_latency_p50": round(ordered[len(ordered) // 2], 4) if ordered else None,
+            "send_latency_p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4) if ordered else None,
+        }
+
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.session_data: Dict[str, dict] = {}
-        
+    """
+    Holds every live WebSocket in this worker.
+
+    Sends never block the caller: each connection has a bounded queue drained by
+    its own writer task, so a slow client only delays itself. While a client lags,
+    newer feedback replaces queued feedback of the same stage, and broadcast just
+    enqueues to every connection.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self.connections: Dict[str, Connection] = {}
+        self.rejected = 0
+
+    @property
+    def active_connections(self) -> Dict[str, WebSocket]:
+        return {session_id: conn.websocket for session_id, conn in self.connections.items()}
+
     async def connect(self, websocket: WebSocket, session_id: str, initial_data: dict = None):
         """Connect a new client and initialize its session data"""
-        self.active_connections[session_id] = websocket
-        self.session_data[session_id] = initial_data or {}
-        logger.info(f"Client connected to session {session_id}")
+        if session_id in self.connections:
+            # A reconnect replaces the old socket
+            await self.disconnect(session_id)
+        elif len(self.connections) >= self.max_sessions:
+            self.rejected += 1
+            raise SessionLimitError(f"Server is at its limit of {self.max_sessions} live sessions")
+        conn = Connection(websocket, session_id, initial_data if initial_data is not None else {})
+        self.connections[session_id] = conn
+        conn.start(self._on_send_failure)
+        logger.info(f"Client connected to session {session_id} ({len(self.connections)} active)")
 
     def update_session_data(self, session_id: str, data: dict):
         """Update session data with new values"""
-        if session_id in self.session_data:
-            self.session_data[session_id].update(data)
-            
+        if session_id in self.connections:
+            self.connections[session_id].data.update(data)
+
     def get_session_data(self, session_id: str) -> dict:
-        """Get session data, creating empty dict if needed"""
-        return self.session_data.get(session_id, {})
+        """Get session data, or an empty dict if the session is not held here"""
+        conn = self.connections.get(session_id)
+        return conn.data if conn else {}
 
-    async def disconnect(self, session_id: str):
-        """Disconnect a client and clean up its data"""
-        if session_id in self.active_connections:
-            try:
-                websocket = self.active_connections[session_id]
-                await websocket.close()
-            except Exception as e:
-                logger.error(f"Error closing WebSocket for session {session_id}: {e}")
-            finally:
-                del self.active_connections[session_id]
-                self.session_data.pop(session_id, None)
-                logger.info(f"Client disconnected from session {session_id}")
+    def replaced(self, session_id: str, websocket: WebSocket) -> bool:
+        """True when a reconnect has given the session to another socket"""
+        conn = self.connections.get(session_id)
+        return conn is not None and conn.websocket is not websocket
+
+    async def disconnect(self, session_id: str, code: int = 1000, websocket: Optional[WebSocket] = None):
+        """Disconnect a client and clean up its data; with websocket, only if it is still that socket"""
+        conn = self.connections.get(session_id)
+        if conn is None or (websocket is not None and conn.websocket is not websocket):
+            return
+        del self.connections[session_id]
+        await conn.close(code)
+        logger.info(f"Client disconnected from session {session_id}")
+
+    async def _on_send_failure(self, conn: Connection):
+        await self.disconnect(conn.session_id, code=1011, websocket=conn.websocket)
+
+    def send(self, session_id: str, message: dict) -> bool:
+        """Queue a message for one session; returns False if it is not connected"""
+        conn = self.connections.get(session_id)
+        return conn.enqueue(message) if conn else False
 
     async def send_feedback(self, session_id: str, message: dict):
-        if session_id in self.active_connections:
-            try:
-                await self.active_connections[session_id].send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending feedback to session {session_id}: {e}")
-                await self.disconnect(session_id)
+        self.send(session_id, message)
+
+    async def broadcast(self, message: dict) -> int:
+        """Queue a message for every session; returns how many accepted it"""
+        return sum(conn.enqueue(message) for conn in list(self.connections.values()))
+
+    def stats(self) -> dict:
+        per_connection = {session_id: conn.stats() for session_id, conn in list(self.connections.items())}
+        totals = collections.Counter()
+        for conn in self.connections.values():
+            totals.update(conn.metrics)
+        return {
+            "active": len(per_connection),
+            "max_sessions": self.max_sessions,
+            "rejected": self.rejected,
+            "queued": sum(s["queue_depth"] for s in per_connection.values()),
+            **dict(totals),
+            "connections": per_connection,
+        }
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections.values():
-            await connection.send_json(message)
 
 # Create global instance
-manager = ConnectionManager() 
-
-# Add session data storage to WebSocketManager
-class WebSocketManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.session_data: Dict[str, Dict] = {}
-    
-    async def connect(self, session_id: str, websocket: WebSocket):
-        self.active_connections[session_id] = websocket
-        # Initialize session data if not exists
-        if session_id not in self.session_data:
-            self.session_data[session_id] = {}
-    
-    async def disconnect(self, session_id: str):
-        if session_id in self.active_connections:
-            del self.active_connections[session_id]
-        # Keep session data for potential retrieval after disconnect
-    
-    def get_session_data(self, session_id: str) -> Dict:
-        return self.session_data.get(session_id, {})
-    
-    def update_session_data(self, session_id: str, data: Dict):
-        if session_id in self.session_data:
-            self.session_data[session_id].update(data)
-        else:
-            self.session_data[session_id] = data
-    
-    async def send_message(self, session_id: str, message: Dict):
-        if session_id in self.active_connections:
-            await self.active_connections[session_id].send_json(message) 
\ No newline at end of file
+manager = ConnectionManager()
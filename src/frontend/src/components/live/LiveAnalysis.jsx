@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import CameraStream from './CameraStream';
 import backgroundImg from '../../assets/background.jpg';
 import { useLiveSession } from '../../contexts/LiveSessionContext';
@@ -23,6 +23,8 @@ const LiveAnalysis = () => {
     voice: "neutral"
   });
   const [lastUpdateTime, setLastUpdateTime] = useState('');
+  // Committed transcript text plus the current partial hypothesis
+  const [liveTranscript, setLiveTranscript] = useState({ final: '', partial: '' });
   
   // WebSocket connection
   const {
@@ -52,15 +54,22 @@ const LiveAnalysis = () => {
     });
   }, [isConnected, sessionId, state.status, state.feedback]);
 
+  // Latest combined feedback; partial stage results are merged into it
+  const lastFeedbackRef = useRef({});
+
   // Handle WebSocket feedback
-  const handleFeedback = useCallback((data) => {
-    console.log("🔍 Received feedback data:", data);
+  const handleFeedback = useCallback((incoming) => {
+    console.log("🔍 Received feedback data:", incoming);
     
-    if (!data) {
+    if (!incoming) {
       console.warn("Received empty feedback data");
       return;
     }
     
+    // Face and audio results arrive before the coaching text; merge them
+    const data = { ...lastFeedbackRef.current, ...incoming };
+    lastFeedbackRef.current = data;
+    
     // Update session feedback state with real data
     actions.updateFeedback({
       speech_rate: {
@@ -141,8 +150,8 @@ const LiveAnalysis = () => {
              data.audio_quality === "low" ? "warning" : "negative"
     };
     
-    // Track metrics for session summary
-    setSessionMetrics(prev => {
+    // Track metrics for session summary once per analysis, not per partial result
+    if (!incoming.partial) setSessionMetrics(prev => {
       // Update eye contact metrics
       const eyeContact = {...prev.eyeContact};
       if (data.eye_contact === "yes") eyeContact.good++;
@@ -180,9 +189,17 @@ const LiveAnalysis = () => {
     
   }, [actions]);
 
+  // Handle streaming transcript segments
+  const handleTranscript = useCallback((segment) => {
+    setLiveTranscript(prev => segment.final
+      ? { final: `${prev.final} ${segment.text}`.trim().split(' ').slice(-60).join(' '), partial: '' }
+      : { ...prev, partial: segment.text });
+  }, []);
+
   // Register WebSocket handlers
   useEffect(() => {
     registerHandler(WSMessageType.FEEDBACK, handleFeedback);
+    registerHandler(WSMessageType.TRANSCRIPT, handleTranscript);
     registerHandler(WSMessageType.ERROR, (data) => {
       actions.setError(data.error || 'Unknown error');
     });
@@ -190,7 +207,7 @@ const LiveAnalysis = () => {
     return () => {
       // No need to unregister as the WebSocket service handles this
     };
-  }, [registerHandler, handleFeedback, actions]);
+  }, [registerHandler, handleFeedback, handleTranscript, actions]);
 
   // Update connection status in context
   useEffect(() => {
@@ -497,6 +514,14 @@ const LiveAnalysis = () => {
                 <p>{liveFeedbackText.voice}</p>
               </div>
               
+              <div className="col-span-1 md:col-span-2 p-4 rounded-lg bg-gray-100">
+                <h3 className="font-semibold mb-2">🗣️ Transcript</h3>
+                <p>
+                  {liveTranscript.final || (!liveTranscript.partial && 'Waiting for speech...')}
+                  {liveTranscript.partial && <span className="text-gray-500"> {liveTranscript.partial}</span>}
+                </p>
+              </div>
+              
               <div className="col-span-1 md:col-span-2 text-xs text-gray-500 text-right">
                 Last updated: {lastUpdateTime || 'Not yet'}
               </div>
@@ -49,12 +49,30 @@ export default function ProgressPage({ setCurrentPage, setFeedbackData }) {
  const [skillsData, setSkillsData] = useState([])
  const [activeTab, setActiveTab] = useState('videos')
   // Check if setFeedbackData is available
- const handleViewPresentation = (presentation) => {
+ const handleViewPresentation = async (presentation) => {
    console.log("Viewing presentation:", presentation._id);
-  
+
    // Check if setFeedbackData exists before calling it
    if (typeof setFeedbackData === 'function') {
-     setFeedbackData(presentation.feedback_data);
+     // The video list only carries summary scores; load the full feedback for this one
+     if (presentation.type === 'video') {
+       try {
+         const response = await fetch(`${import.meta.env.VITE_API_URL || 'http://localhost:8000'}/api/videos/presentations/${presentation._id}`, {
+           headers: { "Authorization": `Bearer ${localStorage.getItem("accessToken")}` }
+         })
+         if (!response.ok) {
+           throw new Error(`Failed to fetch presentation: ${response.status}`)
+         }
+         const fullPresentation = await response.json()
+         setFeedbackData(fullPresentation.feedback_data);
+       } catch (err) {
+         console.error("Error fetching presentation:", err)
+         setError(err.message)
+         return
+       }
+     } else {
+       setFeedbackData(presentation.feedback_data);
+     }
      setCurrentPage("feedback");
    } else {
      console.error("setFeedbackData is not a function. Cannot view presentation details.");
@@ -5,5 +5,13 @@ export const WSMessageType = {
   VIDEO_FRAME: "video_frame",
   AUDIO_CHUNK: "audio_chunk",
   FEEDBACK: "feedback",
+  TRANSCRIPT: "transcript",
   ERROR: "error"
-}; 
\ No newline at end of file
+};
+
+// Stages reported in FEEDBACK messages; face and audio arrive as partial results
+export const FeedbackStage = {
+  FACE: "face",
+  AUDIO: "audio",
+  COACHING: "coaching"
+};
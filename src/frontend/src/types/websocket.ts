@@ -2,11 +2,18 @@ export enum WSMessageType {
   VIDEO_FRAME = "video_frame",
   AUDIO_CHUNK = "audio_chunk",
   FEEDBACK = "feedback",
+  TRANSCRIPT = "transcript",
   ERROR = "error",
   PING = "ping",
   PONG = "pong"
 }
 
+export enum FeedbackStage {
+  FACE = "face",
+  AUDIO = "audio",
+  COACHING = "coaching"
+}
+
 export interface WSMessage {
   type: WSMessageType;
   data?: any;
@@ -17,8 +24,25 @@ export interface FeedbackData {
   emotion: string;
   eye_contact: string;
   transcript: string;
-  gemini_feedback: any;
+  gemini_feedback?: any;
   timestamp: string;
+  stage?: FeedbackStage;
+  partial?: boolean;
+}
+
+export interface TranscriptWord {
+  word: string;
+  start: number;
+  end: number;
+}
+
+// Partial segments are replaced by later ones; final segments are committed
+export interface TranscriptSegment {
+  text: string;
+  start: number;
+  end: number;
+  final: boolean;
+  words: TranscriptWord[];
 }
 
 export interface SessionStatus {